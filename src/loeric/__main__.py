@@ -1,16 +1,21 @@
+from __future__ import annotations
+
 import argparse
 import mido
 import threading
 import time
 import os
 import faulthandler
+from typing import TYPE_CHECKING
 
 
-from . import tune as tu
-from . import groover as gr
-from . import player as pl
 from . import loeric_utils as lu
-from .server.server import start_server
+
+# the performance engine and the server pull in heavy dependencies (music21, muspy, scipy, bottle...)
+# and are imported only when needed, so that e.g. --list-ports starts fast
+if TYPE_CHECKING:
+    from . import groover as gr
+    from . import tune as tu
 
 
 faulthandler.enable()
@@ -23,6 +28,29 @@ playback_resumed = threading.Condition()
 groover_lock = threading.Lock()
 
 
+def output_path(loeric_id: str, **kwargs) -> str:
+    """
+    Return the path of the generated performance, creating the output directory if needed.
+
+    :param loeric_id: the id of the current LOERIC istance
+    :param kwargs: the performance arguments
+
+    :return: the path to the output midi file.
+    """
+    name = os.path.splitext(os.path.basename(kwargs["source"]))[0]
+    if kwargs["output_dir"] is None:
+        dirname = os.path.dirname(kwargs["source"])
+    else:
+        if not os.path.isdir(kwargs["output_dir"]):
+            os.makedirs(kwargs["output_dir"])
+        dirname = kwargs["output_dir"]
+
+    filename = kwargs["filename"]
+    if filename is None:
+        filename = f"generated_{name}_{kwargs['seed']}_{loeric_id}.mid"
+    return f"{dirname}/{filename}"
+
+
 # play midi file
 def play(
     loeric_id: str,
@@ -33,6 +61,11 @@ def play(
     **kwargs,
 ) -> None:
     global received_start
+    from . import latency as lt
+    from . import lookahead as lk
+    from . import player as pl
+    from . import render as rd
+
     try:
         """
         Play the given tune with the given groover.
@@ -43,6 +76,18 @@ def play(
         :param sync_port_out: the MIDI port for synchronization
         :param kwargs: the performance arguments
         """
+        # nothing to play, render offline
+        if kwargs["save"] and out is None:
+            renderer = rd.OfflineRenderer(groover, tune)
+            renderer.render(end_note=not kwargs["no_end_note"])
+            renderer.save(output_path(loeric_id, **kwargs))
+            return
+
+        # record how late messages are sent
+        latency = None
+        if kwargs["latency_log"] is not None or kwargs["latency_summary"] > 0:
+            latency = lt.LatencyRecorder(summary_interval=kwargs["latency_summary"])
+
         # create player
         player = pl.Player(
             tempo=groover.tempo,
@@ -51,12 +96,20 @@ def play(
             save=kwargs["save"],
             verbose=kwargs["verbose"],
             midi_out=out,
+            scheduler=pl.get_scheduler(kwargs["scheduler"], kwargs["spin"] / 1000),
+            latency=latency,
         )
 
         # wait for start
         if kwargs["sync"]:
             received_start.acquire()
 
+        # perform events ahead of playback
+        lookahead = lk.Lookahead(groover, kwargs["lookahead"])
+        lookahead.start()
+        if latency is not None:
+            latency.start()
+
         player.init_playback()
 
         # repeat as specified
@@ -67,26 +120,24 @@ def play(
                 with playback_resumed:
                     playback_resumed.wait()
                 player.init_playback()
-            message = groover.next_event()
-            if message is None:
+            performed = lookahead.next()
+            if performed is None:
                 break
+            # the groover already performed the message
+            message, new_messages = performed
 
             if message.type == "sysex":
                 print(f"Repetition {message.data[0]+1}/{kwargs['repeat']}")
                 continue
-            # perform notes
-            elif lu.is_note(message):
-                # make the groover play the messages
-                new_messages = groover.perform(message)
             # keep meta messages intact
-            else:
+            elif not lu.is_note(message):
                 if message.type == "songpos":
                     if sync_port_out is not None:
                         sync_port_out.send(message)
                         print(f"{loeric_id} SENT {message.pos} ({time.time()})")
-                new_messages = groover.perform(message)
             # play
             player.play(new_messages)
+        lookahead.stop()
 
         # play an end note
         if not kwargs["no_end_note"]:
@@ -94,19 +145,19 @@ def play(
             groover.advance_contours()
             player.play(groover.get_end_notes())
 
-        if kwargs["save"]:
-            name = os.path.splitext(os.path.basename(kwargs["source"]))[0]
-            if kwargs["output_dir"] is None:
-                dirname = os.path.dirname(kwargs["source"])
-            else:
-                if not os.path.isdir(kwargs["output_dir"]):
-                    os.makedirs(kwargs["output_dir"])
-                dirname = kwargs["output_dir"]
+        print(
+            f"Suppressed {groover.suppressed_messages} unchanged control and tempo messages."
+        )
 
-            filename = kwargs["filename"]
-            if filename is None:
-                filename = f"generated_{name}_{kwargs['seed']}_{loeric_id}.mid"
-            player.save(f"{dirname}/{filename}")
+        if latency is not None:
+            latency.stop()
+            print(latency.summary())
+            if kwargs["latency_log"] is not None:
+                latency.dump(kwargs["latency_log"])
+                print(f"Saved message lateness to {kwargs['latency_log']}")
+
+        if kwargs["save"]:
+            player.save(output_path(loeric_id, **kwargs))
 
         done_playing.set()
         print("Player thread terminated.")
@@ -168,6 +219,12 @@ def main():
         help="Start local web server",
         action="store_true",
     )
+    parser.add_argument(
+        "--server-backend",
+        help="the web server backend: 'threaded' handles each request in its own thread. Other names are passed to bottle (e.g. 'cheroot', 'aiohttp'), which must handle concurrent requests and stream responses without buffering them.",
+        type=str,
+        default="threaded",
+    )
     parser.add_argument(
         "--list-ports",
         help="list available input and output MIDI ports and exit.",
@@ -275,6 +332,54 @@ def main():
         type=str,
         default=f"{dir_path}/loeric_config/performance/config.json",
     )
+    parser.add_argument(
+        "--contour-cache",
+        help="the directory of the persistent contour cache. Pass 'default' to use the default cache directory. If omitted, contours are always computed.",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--tune-cache",
+        help="the directory of the persistent cache of parsed tunes. Pass 'default' to use the default cache directory. If omitted, tunes are always parsed.",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--streaming",
+        help="compute contours one repetition at a time while performing, so that memory and setup time do not depend on the number of repetitions.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--scheduler",
+        help="how messages are timed: 'sleep' sleeps against the wall clock, 'deadline' uses absolute deadlines on a monotonic clock, sleeping then spinning before each message.",
+        type=str,
+        choices=["sleep", "deadline"],
+        default="sleep",
+    )
+    parser.add_argument(
+        "--spin",
+        help="with the deadline scheduler, how many milliseconds before each message to stop sleeping and start spinning. Higher values are more precise but use more CPU.",
+        type=float,
+        default=2,
+    )
+    parser.add_argument(
+        "--latency-log",
+        help="the path of a CSV or JSON file where the scheduled time, send time and lateness of every message sent to the output port are saved at the end of the performance.",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--latency-summary",
+        help="how often to print the percentiles of message lateness by message type, in seconds. 0 only prints them at the end of the performance if --latency-log is given.",
+        type=float,
+        default=0,
+    )
+    parser.add_argument(
+        "--lookahead",
+        help="how many tune events to perform ahead of playback in a separate thread, so that slow computations do not delay playback. Control changes and jumps discard the queued events, so the performance is the same as without lookahead. 0 performs each event right before playing it.",
+        type=int,
+        default=0,
+    )
     parser.add_argument(
         "--verbose",
         help="whether to write generated messages to terminal or not",
@@ -345,7 +450,9 @@ def main():
         loeric_id = args["name"]
 
     if args["server"]:
-        start_server()
+        from .server.server import start_server
+
+        start_server(args["server_backend"])
         return
 
     if args["create_in"]:
@@ -422,10 +529,18 @@ def main():
     if not args["sync"] and not args["no_prompt"]:
         input("Press any key to start playback:")
 
+    from . import cache as cc
+    from . import groover as gr
+    from . import tune as tu
+
     # start the player thread
     try:
         # load a tune
-        tune = tu.Tune(args["source"], args["repeat"])
+        tune = tu.Tune(
+            args["source"],
+            args["repeat"],
+            cc.get_cache(args["tune_cache"], cc.TuneCache),
+        )
 
         # check seed
         if args["seed"] is None:
@@ -441,10 +556,12 @@ def main():
             random_weight=0.2,
             human_impact=args["human_impact"],
             seed=args["seed"],
-            config_file=args["config"],
+            config_files=[args["config"]],
             intensity_control=args["intensity_control"],
             human_impact_control=args["human_impact_control"],
             syncing=args["sync"],
+            contour_cache=cc.get_cache(args["contour_cache"]),
+            streaming=args["streaming"],
         )
 
         # set input callback
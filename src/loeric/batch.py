@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import functools
+import io
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING
+
+from . import cache as cc
+
+# the performance engine is only needed by the workers
+if TYPE_CHECKING:
+    from . import tune as tu
+
+filetypes = [".mid", ".abc"]
+
+# number of parsed tunes kept by each worker, jobs are sorted by tune so that a worker rarely needs older ones
+TUNE_CACHE_SIZE = 8
+
+
+def list_tunes(sources: list[str]) -> list[str]:
+    """
+    Collect the tunes to render from a list of files and directories.
+    Directories are not searched recursively.
+
+    :param sources: the paths to tune files or directories containing tunes.
+
+    :return: the sorted list of tune paths.
+    """
+    tunes = []
+    for source in sources:
+        if os.path.isdir(source):
+            for f in os.listdir(source):
+                path = os.path.join(source, f)
+                if (
+                    os.path.isfile(path)
+                    and os.path.splitext(f)[1].casefold() in filetypes
+                ):
+                    tunes.append(path)
+        else:
+            tunes.append(source)
+    return sorted(set(tunes))
+
+
+def config_ids(configs: list[str]) -> list[str]:
+    """
+    Return a unique id for each configuration file, based on its name.
+
+    :param configs: the paths to the configuration files.
+
+    :return: the id of each configuration, used in output filenames.
+    """
+    names = [os.path.splitext(os.path.basename(c))[0] for c in configs]
+    return [
+        name if names.count(name) == 1 else f"{name}{i}" for i, name in enumerate(names)
+    ]
+
+
+@functools.lru_cache(maxsize=TUNE_CACHE_SIZE)
+def _get_tune(path: str, repeats: int, tune_cache: str = None) -> tu.Tune:
+    """
+    Return the given tune, keeping the most recently used tunes of the worker instead of parsing them again.
+
+    :param path: the path to the tune.
+    :param repeats: how many times the tune should be repeated.
+    :param tune_cache: the directory of the persistent cache of parsed tunes, "default" for the default directory or None to disable it.
+
+    :return: the tune.
+    """
+    from . import tune as tu
+
+    return tu.Tune(path, repeats, cc.get_cache(tune_cache, cc.TuneCache))
+
+
+def render_job(job: dict) -> dict:
+    """
+    Render a single tune, seed and configuration combination.
+
+    :param job: the job description, holding the tune, seed, configuration, output path and performance arguments.
+
+    :return: the job description together with its timing statistics in seconds, or the error if the job failed.
+    """
+    from . import groover as gr
+    from . import render as rd
+
+    result = dict(job)
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            tune = _get_tune(job["tune"], job["repeat"], job["tune_cache"])
+            loaded = time.perf_counter()
+
+            groover = gr.Groover(
+                tune,
+                bpm=job["bpm"],
+                midi_channel=job["midi_channel"],
+                transpose=job["transpose"],
+                diatonic_errors=job["diatonic"],
+                random_weight=job["random_weight"],
+                human_impact=job["human_impact"],
+                seed=job["seed"],
+                config_files=None if job["config"] is None else [job["config"]],
+                contour_cache=cc.get_cache(job["contour_cache"]),
+            )
+            instantiated = time.perf_counter()
+
+            renderer = rd.OfflineRenderer(groover, tune)
+            events = renderer.render(end_note=not job["no_end_note"])
+            renderer.save(job["output"])
+            rendered = time.perf_counter()
+
+        result["events"] = len(events)
+        result["load_time"] = loaded - start
+        result["groover_time"] = instantiated - loaded
+        result["render_time"] = rendered - instantiated
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["total_time"] = time.perf_counter() - start
+    result["worker"] = os.getpid()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render every combination of tunes, seeds and configurations to midi files."
+    )
+    parser.add_argument(
+        "sources", help="the midi/abc files or directories to render.", nargs="+"
+    )
+    parser.add_argument(
+        "--seed-start",
+        help="the first random seed to render.",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--seed-end",
+        help="the last random seed to render (included).",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--config",
+        help="the configuration files to render with. Each file is a separate combination.",
+        type=str,
+        nargs="*",
+        default=[],
+    )
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        help="how many times each tune should be repeated",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "-bpm",
+        help="the tempo of the performance. If None, defaults to the original file's tempo.",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "-mc",
+        "--midi-channel",
+        help="the output MIDI channel for the performance.",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "-t",
+        "--transpose",
+        help="the number of semitones to transpose the tune of",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "-d",
+        "--diatonic",
+        help="whether or not error generation should be quantized to the tune's mode",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-hi",
+        "--human-impact",
+        help="the initial percentage of human impact over the performance (0: only generated, 1: only human).",
+        type=float,
+        default=0,
+    )
+    parser.add_argument(
+        "--random-weight",
+        help="the weight of the random component in contour generation.",
+        type=float,
+        default=0.2,
+    )
+    parser.add_argument(
+        "--no-end-note",
+        help="removes the generation of a final note at the end of all repetitions",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--output-dir",
+        help="the output directory for generated performances. Defaults to each tune's directory.",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--manifest",
+        help="the path of the job manifest. Defaults to manifest.json in the output directory.",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--contour-cache",
+        help="the directory of the persistent contour cache. Pass 'default' to use the default cache directory. If omitted, contours are always computed.",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--tune-cache",
+        help="the directory of the persistent cache of parsed tunes. Pass 'default' to use the default cache directory. If omitted, tunes are always parsed.",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="the number of worker processes. Defaults to the number of CPUs.",
+        type=int,
+        default=None,
+    )
+    args = vars(parser.parse_args())
+
+    tunes = list_tunes(args["sources"])
+    configs = args["config"] if len(args["config"]) > 0 else [None]
+    ids = config_ids(configs) if configs != [None] else ["base"]
+
+    if args["output_dir"] is not None and not os.path.isdir(args["output_dir"]):
+        os.makedirs(args["output_dir"])
+
+    # jobs are sorted by tune so that each worker gets the same tune in a row
+    jobs = []
+    for tune in tunes:
+        name = os.path.splitext(os.path.basename(tune))[0]
+        dirname = args["output_dir"]
+        if dirname is None:
+            dirname = os.path.dirname(tune)
+        for seed in range(args["seed_start"], args["seed_end"] + 1):
+            for config, loeric_id in zip(configs, ids):
+                jobs.append(
+                    {
+                        "tune": tune,
+                        "seed": seed,
+                        "config": config,
+                        "output": os.path.join(
+                            dirname, f"generated_{name}_{seed}_{loeric_id}.mid"
+                        ),
+                        "repeat": args["repeat"],
+                        "bpm": args["bpm"],
+                        # consistency with MIDI spec and mido
+                        "midi_channel": args["midi_channel"] - 1,
+                        "transpose": args["transpose"],
+                        "diatonic": args["diatonic"],
+                        "human_impact": args["human_impact"],
+                        "random_weight": args["random_weight"],
+                        "no_end_note": args["no_end_note"],
+                        "contour_cache": args["contour_cache"],
+                        "tune_cache": args["tune_cache"],
+                    }
+                )
+
+    workers = args["jobs"] if args["jobs"] is not None else os.cpu_count()
+    chunksize = max(1, len(jobs) // (4 * workers))
+    print(f"Rendering {len(jobs)} jobs on {workers} workers.")
+
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(render_job, jobs, chunksize=chunksize):
+            results.append(result)
+            if "error" in result:
+                print(
+                    f"[{len(results)}/{len(jobs)}] FAILED {result['output']}: {result['error']}"
+                )
+            else:
+                print(
+                    f"[{len(results)}/{len(jobs)}] {result['output']} ({result['total_time']:.2f}s)"
+                )
+    wall_time = time.perf_counter() - start
+
+    # timing stats
+    done = [r for r in results if "error" not in r]
+    summary = {
+        "jobs": len(results),
+        "failed": len(results) - len(done),
+        "workers": workers,
+        "wall_time": wall_time,
+    }
+    for key in ["load_time", "groover_time", "render_time", "total_time"]:
+        values = [r[key] for r in done]
+        if len(values) == 0:
+            continue
+        summary[key] = {
+            "mean": statistics.mean(values),
+            "median": statistics.median(values),
+            "max": max(values),
+            "sum": sum(values),
+        }
+
+    manifest = args["manifest"]
+    if manifest is None:
+        dirname = args["output_dir"] if args["output_dir"] is not None else "."
+        manifest = os.path.join(dirname, "manifest.json")
+    with open(manifest, "w") as f:
+        json.dump({"summary": summary, "jobs": results}, f, indent=4)
+    print(f"Saved manifest to {manifest}")
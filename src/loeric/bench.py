@@ -0,0 +1,581 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from importlib import metadata
+
+from . import __version__
+
+# dependencies that should only be imported by the features needing them
+HEAVY_MODULES = [
+    "music21",
+    "muspy",
+    "scipy",
+    "pandas",
+    "bottle",
+    "tinysoundfont",
+    "pyaudio",
+    "pythonosc",
+]
+
+# run in a fresh interpreter to time the import of a module
+_IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"import_time": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def console_scripts() -> dict[str, str]:
+    """
+    Return the console scripts of the package, from the installed metadata or from the source tree's pyproject.toml.
+
+    :return: the entry point (module:function) of each console script, by name.
+    """
+    scripts = {}
+    try:
+        for ep in metadata.distribution("loeric").entry_points:
+            if ep.group == "console_scripts":
+                scripts[ep.name] = ep.value
+    except metadata.PackageNotFoundError:
+        pass
+    if len(scripts) > 0:
+        return scripts
+
+    # not installed, fall back to the source tree
+    import tomllib
+
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    with open(os.path.join(dir_path, "..", "..", "pyproject.toml"), "rb") as f:
+        project = tomllib.load(f)
+    return dict(project["project"]["scripts"])
+
+
+def time_startup(module: str, runs: int = 5) -> dict:
+    """
+    Measure how long it takes to start a console script, i.e. to import its module in a new interpreter.
+
+    :param module: the module of the console script.
+    :param runs: how many times the measurement is repeated.
+
+    :return: the median import time and process time in seconds, together with the heavy dependencies the module loads.
+    """
+    import_times = []
+    process_times = []
+    loaded = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        out = subprocess.run(
+            [sys.executable, "-c", _IMPORT_PROBE.format(module=module)],
+            capture_output=True,
+            text=True,
+        )
+        process_times.append(time.perf_counter() - start)
+        if out.returncode != 0:
+            return {"error": out.stderr.strip().splitlines()[-1]}
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        import_times.append(result["import_time"])
+        loaded = [m for m in HEAVY_MODULES if m in result["modules"]]
+
+    return {
+        "import_time": statistics.median(import_times),
+        "process_time": statistics.median(process_times),
+        "heavy_modules": loaded,
+    }
+
+
+def startup(args: dict) -> dict:
+    """
+    Run the startup benchmark for every console script.
+
+    :param args: the command line arguments.
+
+    :return: the results by console script.
+    """
+    results = {}
+    for name, entry_point in sorted(console_scripts().items()):
+        module = entry_point.split(":")[0].strip()
+        results[name] = {"module": module}
+        results[name].update(time_startup(module, args["runs"]))
+
+        if "error" in results[name]:
+            print(f"{name:24} FAILED: {results[name]['error']}")
+        else:
+            heavy = ", ".join(results[name]["heavy_modules"]) or "-"
+            print(
+                f"{name:24} import {results[name]['import_time'] * 1000:8.1f} ms"
+                f"   process {results[name]['process_time'] * 1000:8.1f} ms"
+                f"   heavy: {heavy}"
+            )
+    return results
+
+
+# synthetic tune types: meter and eighth notes per bar
+TUNE_TYPES = {"reel": ("4/4", 8), "jig": ("6/8", 6), "polka": ("2/4", 4)}
+
+# bars of a synthetic tune, longer performances repeat it
+TUNE_BARS = 32
+
+# notes of the synthetic tunes (D major, two octaves)
+_SCALE = "DEFGABcdefga"
+
+_CONFIG_DIR = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "loeric_config", "performance"
+)
+
+# configurations of the perform benchmark, merged over the default configuration in order
+# files are relative to the performance configuration directory
+PERFORM_VARIANTS = {
+    "plain": [],
+    "ornaments": ["ornament/full.json"],
+    "drones": ["drone/on.json"],
+    "cc": [{"contour_2_control": {"velocity": 20, "tempo": 21}}],
+    "all": [
+        "ornament/full.json",
+        "drone/on.json",
+        {"contour_2_control": {"velocity": 20, "tempo": 21}},
+    ],
+}
+
+
+def synthetic_abc(tune_type: str, bars: int, seed: int = 1) -> str:
+    """
+    Generate a tune as a random walk on the scale, mostly in eighth notes.
+    The same arguments always generate the same tune.
+
+    :param tune_type: the type of tune, one of `TUNE_TYPES`.
+    :param bars: the number of bars of the tune.
+    :param seed: the random seed of the tune.
+
+    :return: the tune in ABC notation.
+    """
+    meter, eighths = TUNE_TYPES[tune_type]
+    rng = random.Random(f"{tune_type}{bars}{seed}")
+    pitch = len(_SCALE) // 2
+    measures = []
+    for _ in range(bars):
+        notes = ""
+        left = eighths
+        while left > 0:
+            pitch = min(len(_SCALE) - 1, max(0, pitch + rng.randint(-2, 2)))
+            if left >= 2 and rng.random() < 0.15:
+                notes += f"{_SCALE[pitch]}2"
+                left -= 2
+            else:
+                notes += _SCALE[pitch]
+                left -= 1
+        measures.append(notes)
+    lines = ["|".join(measures[i : i + 4]) for i in range(0, bars, 4)]
+    header = f"X:1\nT:Synthetic {tune_type}\nR:{tune_type}\nM:{meter}\nL:1/8\nQ:1/4=120\nK:D\n"
+    return header + "|\n".join(lines) + "|]\n"
+
+
+def write_corpus(
+    directory: str, tune_types: list[str], sizes: list[int], seed: int = 1
+) -> dict[tuple[str, int], dict]:
+    """
+    Write the synthetic corpus as .abc and .mid files.
+    Performances longer than `TUNE_BARS` repeat a tune of `TUNE_BARS` bars.
+
+    :param directory: the directory where the tunes are written.
+    :param tune_types: the types of tune, from `TUNE_TYPES`.
+    :param sizes: the number of bars of each performance.
+    :param seed: the random seed of the tunes.
+
+    :return: the path of each format and the number of repetitions, by tune type and performance size.
+    """
+    import muspy as mp
+
+    corpus = {}
+    for tune_type in tune_types:
+        for size in sizes:
+            bars = min(size, TUNE_BARS)
+            path = os.path.join(directory, f"{tune_type}_{bars}")
+            if not os.path.isfile(f"{path}.abc"):
+                with open(f"{path}.abc", "w") as f:
+                    f.write(synthetic_abc(tune_type, bars, seed))
+                mp.read_abc(f"{path}.abc").write_midi(f"{path}.mid")
+            corpus[(tune_type, size)] = {
+                "abc": f"{path}.abc",
+                "mid": f"{path}.mid",
+                "repeats": -(-size // bars),
+            }
+    return corpus
+
+
+class _CallTimer:
+    """
+    Accumulate the time spent in a method of a class while the context is active.
+    """
+
+    def __init__(self, cls: type, name: str):
+        """
+        Initialize the class.
+
+        :param cls: the class defining the method.
+        :param name: the name of the method.
+        """
+        self._cls = cls
+        self._name = name
+        self._original = cls.__dict__[name]
+        self.calls = 0
+        self.time = 0.0
+
+    def __enter__(self) -> "_CallTimer":
+        original = self._original
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.time += time.perf_counter() - start
+                self.calls += 1
+
+        setattr(self._cls, self._name, timed)
+        return self
+
+    def __exit__(self, *args) -> None:
+        setattr(self._cls, self._name, self._original)
+
+
+def _load_configs(variant: list[str | dict]) -> list[dict]:
+    """
+    :return: the configurations of a perform benchmark variant, loading the ones given as files.
+    """
+    configs = []
+    for config in variant:
+        if isinstance(config, str):
+            with open(os.path.join(_CONFIG_DIR, config), "r") as f:
+                config = json.load(f)
+        configs.append(config)
+    return configs
+
+
+def time_load(path: str, repeats: int, runs: int) -> float:
+    """
+    Measure how long it takes to load a tune.
+
+    :param path: the path to the tune.
+    :param repeats: how many times the tune is repeated.
+    :param runs: how many times the measurement is repeated.
+
+    :return: the median load time in seconds.
+    """
+    from . import tune as tu
+
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        tu.Tune(path, repeats)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def time_instantiate(tune, seed: int, runs: int) -> dict:
+    """
+    Measure how long it takes to instantiate a groover, and how long each contour type takes to calculate.
+
+    :param tune: the tune to perform.
+    :param seed: the random seed of the performance.
+    :param runs: how many times the measurement is repeated.
+
+    :return: the median instantiation time and median calculation time of each contour type in seconds.
+    """
+    from . import contour as cnt
+    from . import groover as gr
+
+    groover = gr.Groover(tune, seed=seed, random_weight=0.2)
+    contour_types = [
+        c
+        for c in vars(cnt).values()
+        if isinstance(c, type) and issubclass(c, cnt.Contour) and "calculate" in vars(c)
+    ]
+    times = []
+    contour_times = {c.__name__: [] for c in contour_types}
+    for _ in range(runs):
+        with contextlib.ExitStack() as stack:
+            timers = [
+                stack.enter_context(_CallTimer(c, "calculate")) for c in contour_types
+            ]
+            start = time.perf_counter()
+            groover._instantiate()
+            times.append(time.perf_counter() - start)
+        for c, timer in zip(contour_types, timers):
+            if timer.calls > 0:
+                contour_times[c.__name__].append(timer.time)
+
+    return {
+        "time": statistics.median(times),
+        "contours": {
+            name: statistics.median(t)
+            for name, t in contour_times.items()
+            if len(t) > 0
+        },
+    }
+
+
+def time_perform(tune, configs: list[dict], seed: int, events: int) -> dict:
+    """
+    Measure the throughput of `Groover.perform()` and the time spent choosing ornaments.
+
+    :param tune: the tune to perform.
+    :param configs: the configurations merged over the default configuration of the groover.
+    :param seed: the random seed of the performance.
+    :param events: the maximum number of tune events to perform.
+
+    :return: the number of tune events performed and of events generated, the time spent performing and choosing ornaments, and the generated events.
+    """
+    import jsonmerge
+
+    from . import groover as gr
+
+    groover = gr.Groover(tune, seed=seed, random_weight=0.2)
+    if len(configs) > 0:
+        for config in configs:
+            groover._config = jsonmerge.merge(groover._config, config)
+        groover._instantiate()
+    performed = []
+    messages = 0
+    with _CallTimer(gr.Groover, "choose_ornament") as ornaments:
+        start = time.perf_counter()
+        while messages < events:
+            message = groover.next_event()
+            if message is None:
+                break
+            if message.type == "sysex":
+                continue
+            performed.extend(groover.perform(message))
+            messages += 1
+        elapsed = time.perf_counter() - start
+
+    return {
+        "events": messages,
+        "generated": len(performed),
+        "time": elapsed,
+        "events_per_second": messages / elapsed if elapsed > 0 else None,
+        "choose_ornament": {"calls": ornaments.calls, "time": ornaments.time},
+        "performed": performed,
+    }
+
+
+def time_player(events: list, runs: int) -> dict:
+    """
+    Measure the overhead of the player for each message sent to a port that discards them, without waiting between messages.
+
+    :param events: the events to play.
+    :param runs: how many times the measurement is repeated.
+
+    :return: the median time per message in seconds, without and with lateness recording.
+    """
+    from . import latency as lt
+    from . import player as pl
+
+    class NullPort:
+        def send(self, message) -> None:
+            pass
+
+        def send_bytes(self, data) -> None:
+            pass
+
+        def reset(self) -> None:
+            pass
+
+    class NoWaitScheduler(pl.SleepScheduler):
+        def wait(self, deadline: float) -> None:
+            pass
+
+    results = {"messages": len(events)}
+    for name, latency in [
+        ("time_per_message", False),
+        ("latency_time_per_message", True),
+    ]:
+        times = []
+        for _ in range(runs):
+            player = pl.Player(
+                tempo=500000,
+                key_signature=None,
+                time_signature=None,
+                save=False,
+                midi_out=NullPort(),
+                scheduler=NoWaitScheduler(),
+                latency=lt.LatencyRecorder() if latency else None,
+            )
+            player.init_playback()
+            start = time.perf_counter()
+            player.play(events)
+            times.append((time.perf_counter() - start) / max(1, len(events)))
+        results[name] = statistics.median(times)
+    return results
+
+
+def engine(args: dict) -> dict:
+    """
+    Run the benchmarks of the performance engine on a synthetic corpus.
+
+    :param args: the command line arguments.
+
+    :return: the environment and the results by tune type and size.
+    """
+    import numpy as np
+
+    from . import tune as tu
+
+    results = {
+        "environment": {
+            "loeric": __version__,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "seed": args["seed"],
+            "runs": args["runs"],
+            "events": args["events"],
+        },
+        "tunes": {},
+    }
+
+    with contextlib.ExitStack() as stack:
+        directory = args["corpus"]
+        if directory is None:
+            directory = stack.enter_context(tempfile.TemporaryDirectory())
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            corpus = write_corpus(directory, args["types"], args["bars"], args["seed"])
+        variants = {
+            name: _load_configs(configs) for name, configs in PERFORM_VARIANTS.items()
+        }
+
+        for (tune_type, size), entry in corpus.items():
+            name = f"{tune_type}_{size}"
+            result = {"bars": size, "repeats": entry["repeats"]}
+            results["tunes"][name] = result
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result["load"] = {
+                        f: time_load(entry[f], entry["repeats"], args["runs"])
+                        for f in ["abc", "mid"]
+                    }
+                    tune = tu.Tune(entry["abc"], entry["repeats"])
+                    result["events"] = len(tune)
+                    result["instantiate"] = time_instantiate(
+                        tune, args["seed"], args["runs"]
+                    )
+                    result["perform"] = {}
+                    for variant, configs in variants.items():
+                        result["perform"][variant] = time_perform(
+                            tune, configs, args["seed"], args["events"]
+                        )
+                    performed = result["perform"]["all"].pop("performed")
+                    for r in result["perform"].values():
+                        r.pop("performed", None)
+                    result["player"] = time_player(performed, args["runs"])
+            except Exception as e:
+                result["error"] = f"{type(e).__name__}: {e}"
+                print(f"{name:16} FAILED: {result['error']}")
+                continue
+
+            throughput = ", ".join(
+                f"{v} {r['events_per_second']:.0f}/s"
+                for v, r in result["perform"].items()
+            )
+            print(
+                f"{name:16} load abc {result['load']['abc'] * 1000:8.1f} ms"
+                f"   mid {result['load']['mid'] * 1000:8.1f} ms"
+                f"   instantiate {result['instantiate']['time'] * 1000:8.1f} ms"
+                f"   player {result['player']['time_per_message'] * 1e6:5.1f} us/msg"
+            )
+            print(f"{'':16} perform {throughput}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LOERIC benchmarks.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    # options shared by all benchmarks
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "--json",
+        help="the path of a JSON file where results are saved.",
+        type=str,
+        default=None,
+    )
+
+    startup_parser = subparsers.add_parser(
+        "startup",
+        help="measure the startup time of every console script.",
+        parents=[common],
+    )
+    startup_parser.add_argument(
+        "--runs",
+        help="how many times each measurement is repeated.",
+        type=int,
+        default=5,
+    )
+    startup_parser.set_defaults(run=startup)
+
+    engine_parser = subparsers.add_parser(
+        "engine",
+        help="measure the hot paths of the performance engine on a synthetic corpus of reels, jigs and polkas.",
+        parents=[common],
+    )
+    engine_parser.add_argument(
+        "--bars",
+        help=f"the number of bars of each performance. Performances longer than {TUNE_BARS} bars repeat a tune of {TUNE_BARS} bars.",
+        type=int,
+        nargs="+",
+        default=[8, 32, 256, 4096],
+    )
+    engine_parser.add_argument(
+        "--types",
+        help="the types of tune in the corpus.",
+        type=str,
+        nargs="+",
+        choices=list(TUNE_TYPES),
+        default=list(TUNE_TYPES),
+    )
+    engine_parser.add_argument(
+        "--events",
+        help="the maximum number of tune events performed by each throughput measurement.",
+        type=int,
+        default=2000,
+    )
+    engine_parser.add_argument(
+        "--runs",
+        help="how many times each timing measurement is repeated.",
+        type=int,
+        default=3,
+    )
+    engine_parser.add_argument(
+        "--seed",
+        help="the random seed of the corpus and of the performances.",
+        type=int,
+        default=1,
+    )
+    engine_parser.add_argument(
+        "--corpus",
+        help="the directory where the synthetic corpus is written. Defaults to a temporary directory.",
+        type=str,
+        default=None,
+    )
+    engine_parser.set_defaults(run=engine)
+
+    args = vars(parser.parse_args())
+
+    results = args["run"](args)
+    if args["json"] is not None:
+        with open(args["json"], "w") as f:
+            json.dump({args["benchmark"]: results}, f, indent=4)
+        print(f"Saved results to {args['json']}")
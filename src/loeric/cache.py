@@ -0,0 +1,360 @@
+import hashlib
+import json
+import os
+import tempfile
+from collections.abc import Callable
+from typing import TYPE_CHECKING, BinaryIO
+
+import mido
+import numpy as np
+
+from . import __version__
+
+if TYPE_CHECKING:
+    from . import tune as tu
+
+# configuration sections affecting the contours
+CONTOUR_SECTIONS = ["velocity", "tempo", "ornament", "values", "harmony"]
+
+# formats of the cached data, part of the cache keys
+# increase them whenever computing the contours or parsing the tunes changes, so that entries of older code are not reused
+CONTOUR_FORMAT = 8
+TUNE_FORMAT = 3
+
+# name of the array holding the state of the random generator
+_RANDOM_STATE = "__rng_state__"
+
+
+def default_cache_dir() -> str:
+    """
+    :return: the default directory for LOERIC's caches, following the XDG convention.
+    """
+    base = os.environ.get(
+        "XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")
+    )
+    return os.path.join(base, "loeric")
+
+
+class _FileCache:
+    """
+    A directory of cache entries, one file per key.
+    Files are written atomically and the least recently used entries are evicted when the cache exceeds its maximum size.
+    """
+
+    def __init__(self, directory: str, max_size: int, suffix: str):
+        """
+        Initialize the class.
+
+        :param directory: the directory holding the cache.
+        :param max_size: the maximum size of the cache in bytes.
+        :param suffix: the extension of the cache files.
+        """
+        self._directory = directory
+        self._max_size = max_size
+        self._suffix = suffix
+        os.makedirs(self._directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, f"{key}{self._suffix}")
+
+    def _write(self, key: str, write: Callable[[BinaryIO], None]) -> None:
+        """
+        Atomically write an entry, then evict old entries if needed.
+
+        :param key: the cache key.
+        :param write: the function writing the entry to an open binary file.
+        """
+        # write atomically, other processes may be reading
+        fd, tmp = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp, self._path(key))
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+
+        self.evict()
+
+    def _touch(self, key: str) -> None:
+        """
+        Mark an entry as recently used.
+
+        :param key: the cache key.
+        """
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+
+    def evict(self) -> None:
+        """
+        Remove the least recently used entries until the cache fits its maximum size.
+        """
+        entries = []
+        for f in os.listdir(self._directory):
+            if not f.endswith(self._suffix):
+                continue
+            try:
+                stat = os.stat(os.path.join(self._directory, f))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, f))
+
+        size = sum(e[1] for e in entries)
+        for _, entry_size, f in sorted(entries):
+            if size <= self._max_size:
+                break
+            try:
+                os.remove(os.path.join(self._directory, f))
+            except OSError:
+                pass
+            size -= entry_size
+
+
+class ContourCache(_FileCache):
+    """
+    A persistent cache for computed contours, stored as .npz files.
+    Entries are keyed by the tune's content and repetitions, the configuration sections affecting the contours and the seed.
+    The least recently used entries are evicted when the cache exceeds its maximum size.
+    """
+
+    def __init__(self, directory: str = None, max_size: int = 256 * 2**20):
+        """
+        Initialize the class.
+
+        :param directory: the directory holding the cache. If None, the default cache directory is used.
+        :param max_size: the maximum size of the cache in bytes.
+        """
+        if directory is None:
+            directory = os.path.join(default_cache_dir(), "contours")
+        super().__init__(directory, max_size, ".npz")
+
+    def key(self, tune: "tu.Tune", config: dict) -> str:
+        """
+        Compute the cache key for the given tune and configuration.
+
+        :param tune: the tune the contours are computed for.
+        :param config: the merged configuration of the groover (seed included).
+
+        :return: the cache key.
+        """
+        sections = {s: config.get(s) for s in CONTOUR_SECTIONS}
+        h = hashlib.sha1()
+        h.update(__version__.encode())
+        h.update(str(CONTOUR_FORMAT).encode())
+        h.update(tune.digest.encode())
+        h.update(str(tune.repeats).encode())
+        h.update(json.dumps(sections, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    def load(
+        self, key: str, generator: np.random.Generator
+    ) -> dict[str, np.ndarray] | None:
+        """
+        Load the contours stored with the given key and restore the state of the random generator that followed their computation.
+
+        :param key: the cache key.
+        :param generator: the random generator of the performance.
+
+        :return: the contour arrays by name, or None if they are not cached.
+        """
+        try:
+            with np.load(self._path(key)) as data:
+                arrays = {name: data[name] for name in data.files}
+            state = json.loads(str(arrays.pop(_RANDOM_STATE)))
+        except (OSError, ValueError, KeyError):
+            return None
+        self._touch(key)
+
+        generator.bit_generator.state = state
+        return arrays
+
+    def store(
+        self, key: str, contours: dict[str, np.ndarray], generator: np.random.Generator
+    ) -> None:
+        """
+        Store the given contours together with the state of the random generator, then evict old entries if needed.
+
+        :param key: the cache key.
+        :param contours: the contour arrays by name.
+        :param generator: the random generator of the performance, after computing the contours.
+        """
+        arrays = dict(contours)
+        arrays[_RANDOM_STATE] = np.array(json.dumps(generator.bit_generator.state))
+        self._write(key, lambda f: np.savez(f, **arrays))
+
+
+class TuneCache(_FileCache):
+    """
+    A persistent cache for parsed tunes, stored as memory-mappable binary files.
+    Each file starts with a magic string and the length of a JSON header, followed by the header itself and by the raw arrays it describes.
+    The header holds the tune's metadata and the dtype, shape and offset of every array.
+    """
+
+    MAGIC = b"LOERICT1"
+
+    def __init__(self, directory: str = None, max_size: int = 64 * 2**20):
+        """
+        Initialize the class.
+
+        :param directory: the directory holding the cache. If None, the default cache directory is used.
+        :param max_size: the maximum size of the cache in bytes.
+        """
+        if directory is None:
+            directory = os.path.join(default_cache_dir(), "tunes")
+        super().__init__(directory, max_size, ".bin")
+
+    def key(self, digest: str) -> str:
+        """
+        Compute the cache key for the given tune file.
+        Entries do not depend on the number of repetitions: the stored repetitions are computed again when a tune repeats differently.
+
+        :param digest: the SHA-1 digest of the tune's file content.
+
+        :return: the cache key.
+        """
+        h = hashlib.sha1()
+        h.update(__version__.encode())
+        h.update(str(TUNE_FORMAT).encode())
+        h.update(digest.encode())
+        return h.hexdigest()
+
+    def load(self, key: str) -> tuple[dict, dict[str, np.ndarray]] | None:
+        """
+        Memory-map the entry stored with the given key.
+
+        :param key: the cache key.
+
+        :return: the metadata and the (read-only) arrays of the entry, or None if it is not cached.
+        """
+        try:
+            data = np.memmap(self._path(key), dtype=np.uint8, mode="r")
+            if bytes(data[: len(self.MAGIC)]) != self.MAGIC:
+                return None
+            start = len(self.MAGIC) + 8
+            header_size = int.from_bytes(data[len(self.MAGIC) : start], "little")
+            header = json.loads(bytes(data[start : start + header_size]))
+            arrays = {}
+            for name, (dtype, shape, offset) in header["arrays"].items():
+                dtype = np.dtype(dtype)
+                count = int(np.prod(shape))
+                arrays[name] = np.frombuffer(
+                    data, dtype=dtype, count=count, offset=offset
+                ).reshape(shape)
+        except (OSError, ValueError, KeyError):
+            return None
+        self._touch(key)
+        return header["metadata"], arrays
+
+    def store(self, key: str, metadata: dict, arrays: dict[str, np.ndarray]) -> None:
+        """
+        Store the given metadata and arrays, then evict old entries if needed.
+
+        :param key: the cache key.
+        :param metadata: the JSON-serializable metadata of the tune.
+        :param arrays: the arrays of the tune by name.
+        """
+        arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items()}
+
+        # the header size depends on the offsets, which depend on the header size
+        layout = {}
+        header = b""
+        while True:
+            offset = _align(len(self.MAGIC) + 8 + len(header))
+            new_layout = {}
+            for name, a in arrays.items():
+                new_layout[name] = (a.dtype.str, list(a.shape), offset)
+                offset = _align(offset + a.nbytes)
+            new_header = json.dumps(
+                {"metadata": metadata, "arrays": new_layout}
+            ).encode()
+            if new_layout == layout and new_header == header:
+                break
+            layout, header = new_layout, new_header
+
+        def write(f: BinaryIO) -> None:
+            f.write(self.MAGIC)
+            f.write(len(header).to_bytes(8, "little"))
+            f.write(header)
+            for name, a in arrays.items():
+                f.write(b"\0" * (layout[name][2] - f.tell()))
+                f.write(a.tobytes())
+
+        self._write(key, write)
+
+
+def _align(offset: int, alignment: int = 8) -> int:
+    """
+    :return: the smallest multiple of the alignment not lower than the given offset.
+    """
+    return -(-offset // alignment) * alignment
+
+
+def encode_messages(
+    messages: list[mido.Message | mido.MetaMessage],
+) -> dict[str, np.ndarray]:
+    """
+    Encode a list of midi messages as flat arrays.
+
+    :param messages: the messages to encode.
+
+    :return: the delta time of each message, the offset of each message in the data array and the concatenated bytes of all messages.
+    """
+    times = np.fromiter((m.time for m in messages), dtype=np.float64)
+    encoded = [m.bytes() for m in messages]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    data = np.fromiter(
+        (b for e in encoded for b in e), dtype=np.uint8, count=int(offsets[-1])
+    )
+    return {"times": times, "offsets": offsets, "data": data}
+
+
+def decode_messages(
+    times: np.ndarray,
+    offsets: np.ndarray,
+    data: np.ndarray,
+    integer_zeros: bool = False,
+) -> list[mido.Message | mido.MetaMessage]:
+    """
+    Decode a list of midi messages encoded by `encode_messages()`.
+
+    :param times: the delta time of each message.
+    :param offsets: the offset of each message in the data array.
+    :param data: the concatenated bytes of all messages.
+    :param integer_zeros: whether or not null delta times are integers, as in messages read by mido from a midi file.
+
+    :return: the decoded messages.
+    """
+    data = data.tobytes()
+    offsets = offsets.tolist()
+    messages = []
+    for i, t in enumerate(times.tolist()):
+        raw = data[offsets[i] : offsets[i + 1]]
+        if raw[0] == 0xFF:
+            msg = mido.MetaMessage.from_bytes(raw)
+        else:
+            msg = mido.Message.from_bytes(raw)
+        msg.time = 0 if integer_zeros and t == 0 else t
+        messages.append(msg)
+    return messages
+
+
+def get_cache(
+    directory: str | None, cache_type: type[_FileCache] = ContourCache
+) -> _FileCache | None:
+    """
+    Create a cache from a command line option.
+
+    :param directory: the cache directory, "default" for the default directory or None to disable caching.
+    :param cache_type: the type of cache to create.
+
+    :return: the cache, or None if caching is disabled.
+    """
+    if directory is None:
+        return None
+    if directory == "default":
+        return cache_type()
+    return cache_type(directory)
@@ -1,6 +1,8 @@
+from collections.abc import Callable
+
 import mido
 import numpy as np
-from scipy.signal import savgol_filter
+from scipy.signal import savgol_coeffs, savgol_filter
 
 from . import tune
 from . import loeric_utils as lu
@@ -91,6 +93,20 @@ class Contour:
         """
         self._index = -1
 
+    def get_state(self):
+        """
+        :return: the iteration state of the contour, to be restored with `set_state()`.
+        """
+        return self._index
+
+    def set_state(self, state) -> None:
+        """
+        Restore the iteration state of the contour.
+
+        :param state: a state returned by `get_state()`.
+        """
+        self._index = state
+
     def scale_and_savgol(
         self, array: np.ndarray, savgol: bool = True, shift: bool = False, scale=False
     ) -> np.ndarray:
@@ -146,87 +162,110 @@ class HarmonicContour(Contour):
         allowed_chords: np.array = np.zeros(12),
         transpose: int = 0,
     ) -> None:
-        # retrieve pitch and time info
-        # note_events = [msg for msg in midi if "note" in msg.type]
-        note_events = midi.filter(lambda x: "note" in x.type)
-        timings = np.array([msg.time for msg in note_events])
-        pitches = np.array([msg.note for msg in note_events if lu.is_note_on(msg)])
-
-        # cumulative time
-        note_ons = np.array([lu.is_note_on(msg) for msg in note_events])
-        note_offs = np.array([not lu.is_note_on(msg) for msg in note_events])
-        summed_timings = np.cumsum(timings)
-        summed_timings -= midi.offset
-        summed_timings = summed_timings[note_ons]
-
-        notes = pitches % 12
-
-        # message length
-        lengths = timings[note_offs] - timings[note_ons]
-        lengths /= midi.bar_duration
-        lengths = np.interp(lengths, (0, lengths.max()), (0, 1))
-
-        # estimate chord for each bar
-        harmony = np.zeros(len(note_events))
-
-        t = summed_timings.min()
-        while t < summed_timings.max():
-            start = t
-            stop = t + midi.bar_duration / chords_per_bar
-            if t < 0:
-                stop = 0
-
-            # select bar range
-            indexes = np.where((summed_timings >= start) & (summed_timings < stop))
-            bar_notes = notes[indexes]
-            bar_lengths = lengths[indexes]
-
-            # init counts
-            chords = np.zeros(12)
-
-            # add chord score for each note
-            for i, n in enumerate(bar_notes):
-                chords += np.roll(chord_score, n)  # * bar_lengths[i]
-
-            # filter out chords that are not allowed
-            root_chord = np.multiply(
-                chords,
-                np.roll(allowed_chords, midi.root),
-            )
-            # choose the chord with the highest score
-            root = np.random.choice(np.argwhere(root_chord == root_chord.max())[0])
+        """
+        Estimate a chord for every window of the tune (see `harmonies()`).
 
-            # check if the selected chord should be major according to the mode
-            chord_quality = np.roll(lu.chord_quality, midi.major_root)[root]
+        :param midi: the input tune.
+        :param chord_score: the score each note gives to the chords rooted on each interval above it.
+        :param chords_per_bar: the number of windows in each bar.
+        :param allowed_chords: the chord roots that can be chosen, relative to the tune's root.
+        """
+        self._contour = harmonies(midi, chord_score, [chords_per_bar], allowed_chords)[
+            chords_per_bar
+        ]
 
-            harmony_value = root
 
-            # check if the note score suggests minor chord
-            # (e.g. minor IV etc, minor V, etc)
-            if chords[(root + 3) % 12] > chords[(root + 4) % 12]:
-                # if not diminished already
-                if chord_quality != 2:
-                    # make it minor
-                    chord_quality = 1
+def _window_boundaries(onsets: np.ndarray, window: float) -> np.ndarray:
+    """
+    Split the time span of a tune in consecutive windows.
+    The first window goes from the first onset to the end of the pickup bar, if there is any.
 
-            # check if the note score suggests diminished chord
-            if chords[(root + 6) % 12] > chords[(root + 7) % 12]:
-                chord_quality = 2
+    :param onsets: the cumulative onset of each note.
+    :param window: the duration of a window in seconds.
 
-            """
-            # check if the note score suggests augmented chord
-            if chords[(root + 8) % 12] > chords[(root + 7) % 12]:
-                chord_quality = 3
-            """
+    :return: the start of each window, followed by the end of the last one.
+    """
+    t = onsets.min()
+    boundaries = [t]
+    while t < onsets.max():
+        t = 0 if t < 0 else t + window
+        boundaries.append(t)
+    return np.array(boundaries)
+
+
+def harmonies(
+    midi: tune.Tune,
+    chord_score: np.array,
+    chords_per_bar: list[int],
+    allowed_chords: np.array = np.zeros(12),
+) -> dict[int, np.ndarray]:
+    """
+    Estimate a chord for every window of the tune, for several window sizes in one pass.
+    Each note adds the chord score (rolled to the note's pitch class) to its window, which amounts to multiplying a window by pitch class count matrix by the circulant matrix of the chord score.
+    The allowed chord with the highest score is chosen, then made minor or diminished if the scores suggest it.
 
-            harmony_value = root + 12 * chord_quality
+    :param midi: the input tune.
+    :param chord_score: the score each note gives to the chords rooted on each interval above it.
+    :param chords_per_bar: the numbers of windows in each bar to compute the harmony for.
+    :param allowed_chords: the chord roots that can be chosen, relative to the tune's root.
 
-            # assign chord to notes in bar interval
-            harmony[indexes] = harmony_value
+    :return: the harmony contour (root + 12 * chord quality for each note) for each number of windows per bar.
+    """
+    table = midi.note_table
+    onsets = table.onsets
+    notes = table.pitch_classes
+
+    # row n holds the score of every chord for pitch class n
+    score_matrix = np.stack([np.roll(chord_score, n) for n in range(12)]).astype(float)
+    allowed = np.roll(allowed_chords, midi.root)
+    qualities = np.roll(lu.chord_quality, midi.major_root)
+
+    results = {}
+    for n_chords in chords_per_bar:
+        boundaries = _window_boundaries(onsets, midi.bar_duration / n_chords)
+        n_windows = len(boundaries) - 1
+        windows = np.searchsorted(boundaries, onsets, side="right") - 1
+        # notes past the last window are not assigned a chord
+        in_window = (windows >= 0) & (windows < n_windows)
+
+        # pitch class counts for every window
+        counts = np.bincount(
+            windows[in_window] * 12 + notes[in_window], minlength=12 * n_windows
+        ).reshape(n_windows, 12)
+        chords = counts @ score_matrix
+
+        # filter out chords that are not allowed and choose the chord with the highest score
+        # (the first one in case of ties)
+        roots = np.argmax(chords * allowed, axis=1)
+        rows = np.arange(n_windows)
+
+        # check if the selected chord should be major according to the mode
+        chord_quality = qualities[roots]
+
+        # check if the note score suggests minor chord
+        # (e.g. minor IV etc, minor V, etc)
+        minor = chords[rows, (roots + 3) % 12] > chords[rows, (roots + 4) % 12]
+        # if not diminished already, make it minor
+        chord_quality = np.where(minor & (chord_quality != 2), 1, chord_quality)
+
+        # check if the note score suggests diminished chord
+        diminished = chords[rows, (roots + 6) % 12] > chords[rows, (roots + 7) % 12]
+        chord_quality = np.where(diminished, 2, chord_quality)
 
-            t = stop
+        """
+        # check if the note score suggests augmented chord
+        augmented = chords[rows, (roots + 8) % 12] > chords[rows, (roots + 7) % 12]
+        chord_quality = np.where(augmented, 3, chord_quality)
+        """
+
+        # assign chord to notes in each window
+        harmony = np.zeros(len(table.timings))
+        harmony[: len(table)][in_window] = (roots + 12 * chord_quality)[
+            windows[in_window]
+        ]
+        results[n_chords] = harmony
 
-        self._contour = harmony
+    return results
 
 
 class RandomContour(Contour):
@@ -235,18 +274,25 @@ class RandomContour(Contour):
     def __init__(self):
         super().__init__()
 
-    def calculate(self, midi: tune.Tune, extremes: tuple[float, float] = None) -> None:
+    def calculate(
+        self,
+        midi: tune.Tune,
+        extremes: tuple[float, float] = None,
+        rng: np.random.Generator = None,
+    ) -> None:
         """
         Compute a random contour following a uniform distribution in the specified range, by default between 0 and 1.
 
         :param midi: the input tune.
         :param extremes: the upper and lower bound for the random contour. If None, the range will be (0, 1).
+        :param rng: the random generator. If None, the global numpy random state is used.
         """
-        note_events = midi.filter(lambda x: lu.is_note_on(x))
-        size = len(note_events)
+        size = len(midi.note_table)
         if extremes is None:
             extremes = (0, 1)
-        self._contour = np.random.uniform(*extremes, size=size)
+        if rng is None:
+            rng = np.random
+        self._contour = rng.uniform(*extremes, size=size)
 
 
 class PhraseContour(Contour):
@@ -261,17 +307,8 @@ class PhraseContour(Contour):
 
         :param midi: the input tune.
         """
-        # retrieve pitch and time info
-        note_events = midi.filter(lambda x: "note" in x.type)
-        timings = np.array([msg.time for msg in note_events])
-        pitches = np.array([msg.note for msg in note_events if lu.is_note_on(msg)])
-
-        # cumulative time
-        note_ons = np.array([lu.is_note_on(msg) for msg in note_events])
-        note_offs = np.array([not lu.is_note_on(msg) for msg in note_events])
-        summed_timings = np.cumsum(timings)
-        summed_timings -= midi.offset
-        summed_timings = summed_timings[note_ons]
+        # retrieve time info
+        summed_timings = midi.note_table.onsets
 
         bar_length = midi.bar_duration
 
@@ -299,6 +336,7 @@ class IntensityContour(Contour):
         savgol: bool = True,
         shift: bool = False,
         scale: bool = False,
+        rng: np.random.Generator = None,
     ) -> None:
         """
         Compute the contour as the weighted sum of O'Canainn component.
@@ -309,34 +347,15 @@ class IntensityContour(Contour):
         :param random_weight: the weight of the random component over the sum of the weighted O'Canainn scores. If None, the components will be averaged together.
         :param savgol: whether or not to apply a final savgol filtering step (recommended).
         :param shift: whether or not to apply a final shifting step to bring the mean of the array close to 0.5.
+        :param rng: the random generator. If None, the global numpy random state is used.
         """
 
-        weights = weights.astype(float)
-
-        # calculate the components
-        components = self.ocanainn_scores(midi)
-        # stack them
-        stacked_components = np.stack(components, axis=0)
-        size = stacked_components.shape[0]
-
-        if weights is None:
-            weights = np.ones((size, 1)) / size
-        else:
-            if weights.shape != (size, 1):
-                weights = weights.reshape(size, 1)
-            weights /= weights.sum()
-
-        # weight them
-        stacked_components = np.multiply(stacked_components, weights)
-        # sum them
-        stacked_components = stacked_components.sum(axis=0)
-
         # add the random contour
-        self._contour = stacked_components
+        self._contour = weighted_scores(self.ocanainn_scores(midi), weights)
         if random_weight != 0:
             self._contour *= 1 - random_weight
             random_contour = RandomContour()
-            random_contour.calculate(midi, extremes=(0, 1))
+            random_contour.calculate(midi, extremes=(0, 1), rng=rng)
             self._contour += random_contour._contour * random_weight
 
         # savgol filtering
@@ -360,77 +379,118 @@ class IntensityContour(Contour):
 
         :return: the frequency score, the beat score, the ambitus score, the leap score and the length score.
         """
-        # retrieve pitch and time info
-        note_events = midi.filter(lambda x: "note" in x.type)
-        timings = np.array([msg.time for msg in note_events])
-        pitches = np.array([msg.note for msg in note_events if lu.is_note_on(msg)])
-
-        # cumulative time
-        note_ons = np.array([lu.is_note_on(msg) for msg in note_events])
-        note_offs = np.array([not lu.is_note_on(msg) for msg in note_events])
-        summed_timings = np.cumsum(timings)
-        summed_timings -= midi.offset
-        summed_timings = summed_timings[note_ons]
-
-        # o canainn score
-        notes = pitches % 12
-
-        # frequency score
-        values, counts = np.unique(notes, return_counts=True)
-        frequency_score = np.array(
-            [counts[np.where(values == n)] for n in notes]
-        ).astype(float)
-        frequency_score = frequency_score.reshape(-1)
-        frequency_score = np.interp(
-            frequency_score, (frequency_score.min(), frequency_score.max()), (0, 1)
-        )
+        return ocanainn_scores([midi])[0]
+
+
+def weighted_scores(
+    components: tuple[np.array, np.array, np.array, np.array, np.array],
+    weights: np.array = None,
+) -> np.ndarray:
+    """
+    Compute the weighted sum of O'Canainn components (see `ocanainn_scores()`).
+
+    :param components: the frequency score, the beat score, the ambitus score, the leap score and the length score.
+    :param weights: the weights for the components. If None, the components will be averaged together.
+
+    :return: the weighted sum of the components.
+    """
+    weights = weights.astype(float)
+
+    # stack them
+    stacked_components = np.stack(components, axis=0)
+    size = stacked_components.shape[0]
+
+    if weights is None:
+        weights = np.ones((size, 1)) / size
+    else:
+        if weights.shape != (size, 1):
+            weights = weights.reshape(size, 1)
+        weights /= weights.sum()
+
+    # weight them
+    stacked_components = np.multiply(stacked_components, weights)
+    # sum them
+    return stacked_components.sum(axis=0)
+
+
+def _count_classes(
+    classes: np.ndarray, tune_ids: np.ndarray, n_tunes: int
+) -> np.ndarray:
+    """
+    Count how many times each pitch class appears in its tune.
+
+    :param classes: the pitch class of each note (0 to 11), or -1 for notes that are not counted.
+    :param tune_ids: the index of the tune each note belongs to.
+    :param n_tunes: the number of tunes.
+
+    :return: for each note, the number of notes with the same class in the same tune.
+    """
+    keys = tune_ids * 13 + classes + 1
+    return np.bincount(keys, minlength=13 * n_tunes)[keys].astype(float)
 
-        # strong beat
-        beat_position = (summed_timings % midi.bar_duration) / midi.beat_duration
-        beat_position = abs(beat_position - np.round(beat_position))
-        trigger_delta = lu.TRIGGER_DELTA
-        beats = -np.ones(notes.shape)
-        indexes = np.where(beat_position <= trigger_delta)
-        beats[indexes] = notes[indexes]
-        values, counts = np.unique(beats, return_counts=True)
-        beat_score = np.array([counts[np.where(values == n)] for n in beats]).astype(
-            float
-        )
-        beat_score = beat_score.reshape(-1)
-        beat_score[np.where(beats == -1)] = 0
-        beat_score = beat_score.reshape(-1)
-        beat_score = np.interp(beat_score, (beat_score.min(), beat_score.max()), (0, 1))
-
-        # highest/lowest score
-        highest = pitches == max(pitches)
-        lowest = pitches == min(pitches)
-        ambitus_score = (highest | lowest).astype(float)
-
-        # leap score
-        diff = np.diff(pitches)
-        diff = np.insert(diff, 0, 0)
-        leaps = -np.ones(pitches.shape)
-        index = np.where(diff >= 7)
-        leaps[index] = notes[index]
-        values, counts = np.unique(leaps, return_counts=True)
-        leap_score = np.array([counts[np.where(values == n)] for n in leaps]).astype(
-            float
-        )
-        leap_score = leap_score.reshape(-1)
-        leap_score[np.where(leaps == -1)] = 0
-        if leap_score.min() != leap_score.max():
-            leap_score = np.interp(
-                leap_score, (leap_score.min(), leap_score.max()), (0, 1)
-            )
+
+def ocanainn_scores(
+    tunes: list[tune.Tune],
+) -> list[tuple[np.array, np.array, np.array, np.array, np.array]]:
+    """
+    Computes the individual components for the ocanainn score of many tunes at once (see `IntensityContour.ocanainn_scores()`).
+    The notes of all tunes are counted together in a single pass, then each tune is normalized individually.
+
+    :param tunes: the input tunes.
+
+    :return: for each tune, the frequency score, the beat score, the ambitus score, the leap score and the length score.
+    """
+    tables = [t.note_table for t in tunes]
+    sizes = np.array([len(table) for table in tables])
+    starts = np.cumsum(sizes) - sizes
+    tune_ids = np.repeat(np.arange(len(tables)), sizes)
+
+    pitches = np.concatenate([table.pitches for table in tables])
+    notes = np.concatenate([table.pitch_classes for table in tables])
+    beat_positions = np.concatenate([table.beat_positions for table in tables])
+
+    # frequency score
+    frequency_score = _count_classes(notes, tune_ids, len(tables))
+
+    # strong beat
+    beat_position = abs(beat_positions - np.round(beat_positions))
+    beats = np.where(beat_position <= lu.TRIGGER_DELTA, notes, -1)
+    beat_score = _count_classes(beats, tune_ids, len(tables))
+    beat_score[beats == -1] = 0
+
+    # highest/lowest score
+    highest = pitches == np.repeat(np.maximum.reduceat(pitches, starts), sizes)
+    lowest = pitches == np.repeat(np.minimum.reduceat(pitches, starts), sizes)
+    ambitus_score = (highest | lowest).astype(float)
+
+    # leap score, without leaps between tunes
+    diff = np.diff(pitches, prepend=0)
+    diff[starts] = 0
+    leaps = np.where(diff >= 7, notes, -1)
+    leap_score = _count_classes(leaps, tune_ids, len(tables))
+    leap_score[leaps == -1] = 0
+
+    scores = []
+    for table, start, size in zip(tables, starts, sizes):
+        notes_slice = slice(start, start + size)
+
+        frequency = frequency_score[notes_slice]
+        frequency = np.interp(frequency, (frequency.min(), frequency.max()), (0, 1))
+
+        beat = beat_score[notes_slice]
+        beat = np.interp(beat, (beat.min(), beat.max()), (0, 1))
+
+        leap = leap_score[notes_slice]
+        if leap.min() != leap.max():
+            leap = np.interp(leap, (leap.min(), leap.max()), (0, 1))
 
         # long score
-        timings = timings[note_offs] - timings[note_ons]
-        values, counts = np.unique(timings, return_counts=True)
-        index = np.argmax(counts)
-        val = values[index]
-        length_score = (timings > val).astype(float)
+        values, counts = np.unique(table.lengths, return_counts=True)
+        val = values[np.argmax(counts)]
+        length_score = (table.lengths > val).astype(float)
 
-        return frequency_score, beat_score, ambitus_score, leap_score, length_score
+        scores.append((frequency, beat, ambitus_score[notes_slice], leap, length_score))
+    return scores
 
 
 class MessageLengthContour(Contour):
@@ -449,11 +509,7 @@ class MessageLengthContour(Contour):
         :param midi: the input tune object.
         """
 
-        note_events = midi.filter(lambda x: lu.is_note(x))
-        timings = np.array([msg.time for msg in note_events])
-        note_ons = np.array([lu.is_note_on(msg) for msg in note_events])
-        note_offs = np.array([lu.is_note_off(msg) for msg in note_events])
-        self._contour = timings[note_offs] - timings[note_ons]
+        self._contour = midi.note_table.lengths.copy()
 
 
 class PitchDifferenceContour(Contour):
@@ -466,9 +522,7 @@ class PitchDifferenceContour(Contour):
         self,
         midi: tune.Tune,
     ) -> None:
-        note_events = midi.filter(lambda x: "note" in x.type)
-        pitches = np.array([msg.note for msg in note_events if lu.is_note_on(msg)])
-        diff = np.diff(pitches)
+        diff = np.diff(midi.note_table.pitches)
         diff = np.insert(diff, 0, 0)
         self._contour = diff
 
@@ -486,11 +540,7 @@ class PitchContour(Contour):
         shift: bool = True,
         scale: bool = True,
     ) -> None:
-        note_events = midi.filter(lambda x: "note" in x.type)
-        pitches = np.array(
-            [msg.note for msg in note_events if lu.is_note_on(msg)]
-        ).astype(float)
-        self._contour = pitches
+        self._contour = midi.note_table.pitches.astype(float)
 
         if savgol or shift or scale:
             self._contour = self.scale_and_savgol(
@@ -512,6 +562,7 @@ class PatternContour(Contour):
         std_scale: float = 1,
         normalize: bool = False,
         period: float = 0.5,
+        rng: np.random.Generator = None,
     ) -> None:
         """
         Create the contour by repeating the input weights over the specified period.
@@ -519,56 +570,549 @@ class PatternContour(Contour):
 
         :param mean: the pattern to repeat.
         :param std: the std of the pattern to repeat, for every item.
+        :param std_scale: the factor multiplying the stds.
+        :param normalize: whether or not to normalize the pattern so that its mean is 1 in every bar.
         :param period: the length of the pattern, in bars.
+        :param rng: the random generator. If None, the global numpy random state is used.
+        """
+        self._contour = patterns(
+            midi, mean, std, std_scales=(std_scale,), normalize=normalize, rng=rng
+        )[0]
+
+
+def patterns(
+    midi: tune.Tune,
+    mean: np.array = np.array([1]),
+    std: np.array = np.array([0]),
+    std_scales: tuple[float, ...] = None,
+    seeds: list[int | np.random.Generator] = None,
+    normalize: bool = False,
+    rng: np.random.Generator = None,
+) -> np.ndarray:
+    """
+    Sample several variants of a repeating pattern contour at once (see `PatternContour`).
+    Each variant has its own std scale and, optionally, its own random seed.
+    If no seeds are given, all variants are drawn from the random generator in a single call.
+
+    :param midi: the input tune.
+    :param mean: the pattern to repeat.
+    :param std: the std of the pattern to repeat, for every item.
+    :param std_scales: the factor multiplying the stds, for every variant. A single value is used for all variants. If None, the stds are not scaled.
+    :param seeds: the random seed or generator of every variant. If None, the random generator is used.
+    :param normalize: whether or not to normalize each variant so that its mean is 1 in every bar.
+    :param rng: the random generator used without seeds. If None, the global numpy random state is used.
+
+    :return: the sampled patterns, with shape (variants, notes).
+    """
+    assert len(mean) == len(std)
+
+    # retrieve time info
+    summed_timings = midi.note_table.onsets
+    size = len(summed_timings)
+
+    pattern_means, pattern_stds = _pattern_distribution(
+        summed_timings, midi.bar_duration, mean, std
+    )
+
+    if std_scales is None:
+        std_scales = (1,)
+    std_scales = np.asarray(std_scales, dtype=float)
+    n_variants = max(len(std_scales), 1 if seeds is None else len(seeds))
+    std_scales = np.broadcast_to(std_scales, (n_variants,))
+
+    if seeds is None:
+        if rng is None:
+            rng = np.random
+        pattern = rng.normal(
+            loc=pattern_means,
+            scale=std_scales[:, np.newaxis] * pattern_stds,
+            size=(n_variants, size),
+        )
+    else:
+        pattern = np.stack(
+            [
+                np.random.default_rng(seed).normal(
+                    loc=pattern_means, scale=scale * pattern_stds, size=size
+                )
+                for seed, scale in zip(seeds, std_scales)
+            ]
+        )
+
+    if normalize:
+        _normalize_bars(pattern, summed_timings, midi.bar_duration)
+
+    return pattern
+
+
+def _pattern_distribution(
+    onsets: np.ndarray, bar_duration: float, mean: np.array, std: np.array
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the mean and std of a repeating pattern at every note.
+
+    :param onsets: the onset of every note.
+    :param bar_duration: the duration of a bar, i.e. of the pattern.
+    :param mean: the pattern to repeat.
+    :param std: the std of the pattern to repeat, for every item.
+
+    :return: the mean and the std of every note.
+    """
+    pattern_indexes = np.round(
+        len(mean) * (onsets % bar_duration) / bar_duration
+    ).astype(int) % len(mean)
+    diff = np.diff(pattern_indexes)
+    gaps = np.flatnonzero(diff > 1)
+
+    pattern_means = mean[pattern_indexes].astype(float)
+    pattern_stds = std[pattern_indexes].astype(float)
+
+    # notes spanning several pattern items take their average
+    if len(gaps) > 0:
+        # average of every run of items, by start and length
+        # items are summed from the start of each run, in the same order as np.mean
+        items = np.arange(len(mean))[:, np.newaxis] + np.arange(len(mean))
+        in_pattern = items < len(mean)
+        items %= len(mean)
+        lengths = np.arange(1, len(mean) + 1)
+        run_means = np.cumsum(np.where(in_pattern, mean[items], 0), axis=1) / lengths
+        run_stds = np.cumsum(np.where(in_pattern, std[items], 0), axis=1) / lengths
+        pattern_means[gaps] = run_means[pattern_indexes[gaps], diff[gaps] - 1]
+        pattern_stds[gaps] = run_stds[pattern_indexes[gaps], diff[gaps] - 1]
+
+    return pattern_means, pattern_stds
+
+
+def _normalize_bars(
+    pattern: np.ndarray, onsets: np.ndarray, bar_duration: float
+) -> None:
+    """
+    Normalize sampled patterns in place so that their mean is 1 in every bar.
+
+    :param pattern: the sampled patterns, with shape (variants, notes).
+    :param onsets: the onset of every note.
+    :param bar_duration: the duration of a bar.
+    """
+    # notes are sorted, so each bar is a contiguous segment
+    bars = onsets // bar_duration
+    starts = np.flatnonzero(np.diff(bars, prepend=np.nan))
+    lengths = np.diff(np.append(starts, len(onsets)))
+
+    # bars with the same number of notes are summed together,
+    # giving the same rounding as summing each bar on its own
+    bar_sums = np.zeros((len(pattern), len(starts)))
+    for length in np.unique(lengths):
+        same_length = np.flatnonzero(lengths == length)
+        indexes = starts[same_length, np.newaxis] + np.arange(length)
+        bar_sums[:, same_length] = pattern[:, indexes].sum(axis=-1)
+
+    pattern /= np.repeat(bar_sums, lengths, axis=1)
+    pattern *= np.repeat(lengths, lengths)
+
+
+class _RunningStats:
+    """The running minimum, maximum and mean of the values of a streaming contour."""
+
+    def __init__(self):
+        self.min = np.inf
+        self.max = -np.inf
+        self._sum = 0.0
+        self._count = 0
+
+    def update(self, array: np.ndarray) -> None:
+        """
+        Update the statistics with new values.
+
+        :param array: the new values.
+        """
+        self.min = min(self.min, array.min())
+        self.max = max(self.max, array.max())
+        self._sum += array.sum()
+        self._count += len(array)
+
+    def get_state(self) -> tuple:
+        """
+        :return: the statistics, to be restored with `set_state()`.
+        """
+        return self.min, self.max, self._sum, self._count
+
+    def set_state(self, state: tuple) -> None:
+        """
+        Restore the statistics.
+
+        :param state: a state returned by `get_state()`.
+        """
+        self.min, self.max, self._sum, self._count = state
+
+    @property
+    def mean(self) -> float:
+        """
+        :return: the mean of all the values seen so far.
+        """
+        return self._sum / self._count
+
+    def scale(self, array: np.ndarray) -> np.ndarray:
+        """
+        Scale an array in place so that all the values seen so far range between 0 and 1.
+
+        :param array: the array to scale.
+
+        :return: the scaled array.
+        """
+        array -= self.min
+        if self.max > self.min:
+            array /= self.max - self.min
+        return array
+
+
+class _CausalSavgol:
+    """A Savitzky-Golay filter only using past values, applied to consecutive windows of a stream."""
+
+    def __init__(self, window: int = 15, order: int = 3):
+        """
+        Initialize the class.
+
+        :param window: the length of the filter window.
+        :param order: the order of the fitted polynomial.
+        """
+        # fit the last values of the window, evaluate at the last one
+        self._coeffs = savgol_coeffs(window, order, pos=window - 1, use="dot")
+        self._history = None
+
+    def reset(self) -> None:
+        """
+        Forget past values, e.g. after jumping to another part of the stream.
+        """
+        self._history = None
+
+    def get_state(self) -> np.ndarray | None:
+        """
+        :return: the past values used by the filter, to be restored with `set_state()`.
+        """
+        # never modified in place, no need to copy
+        return self._history
+
+    def set_state(self, state: np.ndarray | None) -> None:
+        """
+        Restore the past values used by the filter.
+
+        :param state: a state returned by `get_state()`.
+        """
+        self._history = state
+
+    def filter(self, array: np.ndarray) -> np.ndarray:
+        """
+        Filter the next window of the stream.
+
+        :param array: the next window.
+
+        :return: the filtered window.
+        """
+        if self._history is None:
+            # as the offline filter, pad the start with the mean
+            self._history = np.full(len(self._coeffs) - 1, array.mean())
+        padded = np.concatenate((self._history, array))
+        self._history = padded[len(array) :]
+        windows = np.lib.stride_tricks.sliding_window_view(padded, len(self._coeffs))
+        return windows @ self._coeffs
+
+
+class StreamingContour(Contour):
+    """
+    A contour computed one window at a time, just ahead of the play head.
+    Each window holds a repetition of the tune, so memory and setup time do not depend on the number of repetitions.
+    Windows are computed in order: random components, normalization statistics and filters carry over from one window to the next.
+    """
+
+    def __init__(self):
+        super().__init__()
+        # notes per window and in the whole tune
+        self._window_size = 0
+        self._length = 0
+        # index of the window held by the contour
+        self._window = -1
+
+        # running statistics and filter used by `scale_and_savgol()`
+        self._raw_stats = _RunningStats()
+        self._scaled_stats = _RunningStats()
+        self._shift_stats = _RunningStats()
+        self._savgol = _CausalSavgol()
+
+    def _set_windows(self, midi: tune.Tune) -> tune.Tune:
+        """
+        Set the window size and the length of the contour.
+
+        :param midi: the input tune.
+
+        :return: the first repetition of the tune, i.e. the first window.
+        """
+        single = midi.single_repetition()
+        self._window_size = len(single.note_table)
+        self._length = self._window_size * midi.repeats
+        return single
+
+    def _next_window(self) -> np.ndarray:
+        """
+        Compute the values of the next window.
+
+        :return: the values of the window.
+        """
+        raise NotImplementedError
+
+    def _restart(self) -> None:
+        """
+        Restart the stream, so that the next window does not continue the previous one.
+        Running statistics are kept.
+        """
+        self._savgol.reset()
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        window, i = divmod(index, self._window_size)
+        if window != self._window:
+            raise InvalidIndexError(
+                f"Index {index} is outside of the current window of the contour."
+            )
+        return self._contour[i]
+
+    def jump(self, index: int) -> None:
+        if index >= self._length:
+            raise InvalidIndexError(
+                f"Cannot jump to index {index} with contour length {self._length}"
+            )
+        self._index = index
+
+    def next(self) -> float:
+        if self._window_size == 0:
+            raise UncomputedContourError(
+                "Contour is not computed. Call calculate() first."
+            )
+
+        self._index += 1
+
+        if self._index < 0 or self._index >= self._length:
+            raise InvalidIndexError(
+                f"Cannot index contour with length {self._length} with index {self._index}."
+            )
+
+        window, i = divmod(self._index, self._window_size)
+        if window != self._window:
+            if window != self._window + 1:
+                self._restart()
+            self._contour = self._next_window()
+            self._window = window
+        return self._contour[i]
+
+    def reset(self) -> None:
+        super().reset()
+        self._window = -1
+        self._restart()
+
+    def _stream_state(self):
+        """
+        :return: the state of the stream, i.e. the running statistics and the history of the filter.
+        """
+        return (
+            self._raw_stats.get_state(),
+            self._scaled_stats.get_state(),
+            self._shift_stats.get_state(),
+            self._savgol.get_state(),
+        )
+
+    def _set_stream_state(self, state) -> None:
+        """
+        Restore the state of the stream.
+
+        :param state: a state returned by `_stream_state()`.
+        """
+        raw, scaled, shift, savgol = state
+        self._raw_stats.set_state(raw)
+        self._scaled_stats.set_state(scaled)
+        self._shift_stats.set_state(shift)
+        self._savgol.set_state(savgol)
+
+    def get_state(self):
+        # rewinding the stream recomputes the following windows as they were
+        return self._index, self._window, self._contour, self._stream_state()
+
+    def set_state(self, state) -> None:
+        self._index, self._window, self._contour, stream = state
+        self._set_stream_state(stream)
+
+    def scale_and_savgol(
+        self, array: np.ndarray, savgol: bool = True, shift: bool = False, scale=False
+    ) -> np.ndarray:
+        """
+        Streaming version of `Contour.scale_and_savgol()` for the next window.
+        Extremes and means are the ones of all the windows computed so far and the Savitzky-Golay filter only uses past values.
+
+        :param array: the next window of the contour.
+        :param savgol: whether or not to apply the savgol filter.
+        :param scale: whether or not to rescale the array to use the full range.
+        :param shift: whether or not to shift the filtered array so that its mean is close to 0.5.
+
+        :return: the processed window.
+        """
+        self._raw_stats.update(array)
+        array = self._raw_stats.scale(array)
+
+        if savgol:
+            array = self._savgol.filter(array)
+
+        if scale:
+            self._scaled_stats.update(array)
+            array = self._scaled_stats.scale(array)
+
+        if shift:
+            self._shift_stats.update(array)
+            array /= 2 * self._shift_stats.mean
+
+        array[array < 0] = 0
+        array[array > 1] = 1
+
+        return array
+
+
+class PeriodicContour(StreamingContour):
+    """A contour repeating the same values at every repetition of the tune."""
+
+    def calculate(self, midi: tune.Tune, contour: Contour) -> None:
+        """
+        Repeat a contour computed for the first repetition of the tune (see `tune.Tune.single_repetition()`).
+
+        :param midi: the input tune.
+        :param contour: the contour of the first repetition.
+        """
+        self._set_windows(midi)
+        self._contour = contour._contour
+
+    def _next_window(self) -> np.ndarray:
+        return self._contour
+
+    def __getitem__(self, index):
+        return self._contour[index % self._window_size]
+
+
+class StreamingIntensityContour(StreamingContour):
+    """A streaming version of `IntensityContour`, with running normalization and causal filtering."""
+
+    def calculate(
+        self,
+        midi: tune.Tune,
+        weights: np.array = None,
+        random_weight: float = 0,
+        savgol: bool = True,
+        shift: bool = False,
+        scale: bool = False,
+        rng: np.random.Generator = None,
+    ) -> None:
+        """
+        Prepare the contour: O'Canainn components are computed once, random components are drawn for each window.
+
+        :param midi: the input tune.
+        :param weights: the weights for the components, respectively frequency score, beat score, ambitus score, leap score and length score.
+        :param random_weight: the weight of the random component over the sum of the weighted O'Canainn scores.
+        :param savgol: whether or not to apply a final savgol filtering step (recommended).
+        :param shift: whether or not to apply a final shifting step to bring the mean of the array close to 0.5.
+        :param scale: whether or not to rescale the array to use the full range.
+        :param rng: the random generator. If None, the global numpy random state is used.
+        """
+        single = self._set_windows(midi)
+        self._scores = weighted_scores(ocanainn_scores([single])[0], weights)
+        self._random_weight = random_weight
+        self._rng = np.random if rng is None else rng
+        self._options = {"savgol": savgol, "shift": shift, "scale": scale}
+
+    def _next_window(self) -> np.ndarray:
+        window = self._scores.copy()
+        if self._random_weight != 0:
+            window *= 1 - self._random_weight
+            window += (
+                self._rng.uniform(0, 1, size=self._window_size) * self._random_weight
+            )
+        return self.scale_and_savgol(window, **self._options)
+
+
+class StreamingPatternContour(StreamingContour):
+    """A streaming version of `PatternContour`, sampling the pattern for each window."""
+
+    def calculate(
+        self,
+        midi: tune.Tune,
+        mean: np.array = np.array([1]),
+        std: np.array = np.array([0]),
+        std_scale: float = 1,
+        normalize: bool = False,
+        period: float = 0.5,
+        rng: np.random.Generator = None,
+    ) -> None:
+        """
+        Prepare the contour: the distribution of every note is computed once, the pattern is sampled for each window.
+
+        :param mean: the pattern to repeat.
+        :param std: the std of the pattern to repeat, for every item.
+        :param std_scale: the factor multiplying the stds.
+        :param normalize: whether or not to normalize the pattern so that its mean is 1 in every bar.
+        :param period: the length of the pattern, in bars.
+        :param rng: the random generator. If None, the global numpy random state is used.
         """
         assert len(mean) == len(std)
 
-        # retrieve pitch and time info
-        note_events = midi.filter(lambda x: "note" in x.type)
-        timings = np.array([msg.time for msg in note_events])
-        pitches = np.array([msg.note for msg in note_events if lu.is_note_on(msg)])
-
-        # cumulative time
-        note_ons = np.array([lu.is_note_on(msg) for msg in note_events])
-        note_offs = np.array([not lu.is_note_on(msg) for msg in note_events])
-        summed_timings = np.cumsum(timings)
-        summed_timings -= midi.offset
-        summed_timings = summed_timings[note_ons]
-
-        bar_position = summed_timings / midi.bar_duration
-
-        pattern_indexes = np.round(
-            len(mean) * (summed_timings % midi.bar_duration) / midi.bar_duration
-        ).astype(int) % len(mean)
-        diff = np.diff(pattern_indexes)
-        index_diff = np.argwhere(diff > 1)
-
-        pattern_means = mean[pattern_indexes].astype(float)
-        pattern_stds = std[pattern_indexes].astype(float)
-
-        for index in index_diff:
-            source_index = pattern_indexes[index]
-            add_indexes = np.arange(source_index, source_index + diff[index])
-            pattern_means[index] = np.mean(mean[add_indexes])
-            pattern_stds[index] = np.mean(std[add_indexes])
-
-        pattern = np.random.normal(
-            loc=pattern_means, scale=std_scale * pattern_stds, size=len(pattern_means)
+        single = self._set_windows(midi)
+        self._onsets = single.note_table.onsets
+        self._bar_duration = midi.bar_duration
+        self._means, self._stds = _pattern_distribution(
+            self._onsets, self._bar_duration, mean, std
+        )
+        self._stds *= std_scale
+        self._normalize = normalize
+        self._rng = np.random if rng is None else rng
+
+    def _next_window(self) -> np.ndarray:
+        pattern = self._rng.normal(
+            loc=self._means, scale=self._stds, size=(1, self._window_size)
         )
+        if self._normalize:
+            _normalize_bars(pattern, self._onsets, self._bar_duration)
+        return pattern[0]
 
-        if normalize:
-            bars = summed_timings // midi.bar_duration
 
-            for i in np.unique(bars):
+class _StreamingCombination(StreamingContour):
+    """A streaming contour combining the windows of other streaming contours."""
 
-                indexes = np.argwhere(bars == i)
-                min_i = min(indexes)
-                max_i = min(max(indexes) + 1, len(summed_timings) - 1)
-                bar_sum = summed_timings[max_i] - summed_timings[min_i]
-                pattern[indexes] /= pattern[indexes].sum()
-                pattern[indexes] *= len(indexes)
+    def __init__(
+        self,
+        contours: list[StreamingContour],
+        combine: Callable[[list[np.ndarray]], np.ndarray],
+    ):
+        """
+        Initialize the class.
+
+        :param contours: the contours to combine. They must all have the same windows.
+        :param combine: the function combining the windows of the contours.
+        """
+        super().__init__()
+        self._contours = contours
+        self._combine = combine
+        self._window_size = contours[0]._window_size
+        self._length = contours[0]._length
+
+    def _next_window(self) -> np.ndarray:
+        return self._combine([c._next_window() for c in self._contours])
+
+    def _restart(self) -> None:
+        for c in self._contours:
+            c._restart()
 
-        self._contour = pattern
+    def _stream_state(self):
+        return super()._stream_state(), [c._stream_state() for c in self._contours]
+
+    def _set_stream_state(self, state) -> None:
+        own, contours = state
+        super()._set_stream_state(own)
+        for c, contour_state in zip(self._contours, contours):
+            c._set_stream_state(contour_state)
 
 
 def multiply(contours: list[Contour]):
@@ -579,6 +1123,9 @@ def multiply(contours: list[Contour]):
 
     :return: a new contour holding the product of the input contours.
     """
+    if any(isinstance(c, StreamingContour) for c in contours):
+        return _StreamingCombination(contours, lambda windows: np.prod(windows, axis=0))
+
     new_contour = Contour()
     result = np.ones(len(contours[0]))
     for c in contours:
@@ -597,8 +1144,19 @@ def weighted_sum(contours: list[Contour], weights: np.ndarray):
 
     :return: a new contour holding the weighted sum of the input contours.
     """
-    result = np.zeros(len(contours[0]))
     weights /= np.sum(weights)
+
+    if any(isinstance(c, StreamingContour) for c in contours):
+
+        def combine(windows: list[np.ndarray]) -> np.ndarray:
+            result = np.zeros(len(windows[0]))
+            for window, w in zip(windows, weights):
+                result += window * w
+            return result
+
+        return _StreamingCombination(contours, combine)
+
+    result = np.zeros(len(contours[0]))
     for c, w in zip(contours, weights):
         result += c._contour * w
 
@@ -0,0 +1,197 @@
+import mido
+from mido.messages.checks import check_value
+
+# midi status bytes for channel messages
+_STATUS = {
+    "note_off": 0x80,
+    "note_on": 0x90,
+    "control_change": 0xB0,
+    "pitchwheel": 0xE0,
+}
+
+# data of each channel message
+_DATA = {
+    "note_off": ("channel", "note", "velocity"),
+    "note_on": ("channel", "note", "velocity"),
+    "control_change": ("channel", "control", "value"),
+    "pitchwheel": ("channel", "pitch"),
+}
+
+
+class Event:
+    """
+    A lightweight midi event used throughout the performance pipeline.
+    Mido messages are only created when an event leaves the groover (see `to_message()`), or never if the output accepts raw bytes (see `bytes()`).
+    Default values mirror the ones of mido.
+    """
+
+    __slots__ = (
+        "type",
+        "time",
+        "channel",
+        "note",
+        "velocity",
+        "control",
+        "value",
+        "pitch",
+        "tempo",
+        "source",
+    )
+
+    def __init__(
+        self,
+        type: str,
+        time: float = 0,
+        channel: int = 0,
+        note: int = 0,
+        velocity: int = 64,
+        control: int = 0,
+        value: int = 0,
+        pitch: int = 0,
+        tempo: int = 500000,
+        source: mido.Message | mido.MetaMessage = None,
+    ):
+        """
+        Initialize the class.
+
+        :param type: the message type, as in mido.
+        :param time: the delta time of the event in seconds.
+        :param channel: the midi channel.
+        :param note: the note number, for note events.
+        :param velocity: the velocity, for note events.
+        :param control: the control number, for control changes.
+        :param value: the control value, for control changes.
+        :param pitch: the pitch bend value, for pitchwheel events.
+        :param tempo: the tempo in microseconds per quarter, for tempo changes.
+        :param source: the original mido message, for any other message type.
+        """
+        self.type = type
+        self.time = time
+        self.channel = channel
+        self.note = note
+        self.velocity = velocity
+        self.control = control
+        self.value = value
+        self.pitch = pitch
+        self.tempo = tempo
+        self.source = source
+
+    @classmethod
+    def from_message(cls, msg: mido.Message | mido.MetaMessage) -> "Event":
+        """
+        Create an event from a mido message. The message is not copied.
+
+        :param msg: the input message.
+
+        :return: the corresponding event.
+        """
+        if msg.type == "note_on" or msg.type == "note_off":
+            return cls(
+                msg.type,
+                time=msg.time,
+                channel=msg.channel,
+                note=msg.note,
+                velocity=msg.velocity,
+            )
+        return cls(msg.type, time=msg.time, source=msg)
+
+    def copy(self) -> "Event":
+        """
+        :return: a shallow copy of this event.
+        """
+        new = Event.__new__(Event)
+        for name in Event.__slots__:
+            setattr(new, name, getattr(self, name))
+        return new
+
+    @property
+    def is_meta(self) -> bool:
+        """
+        :return: whether or not the event is a meta message.
+        """
+        if self.type == "set_tempo":
+            return True
+        return self.source is not None and self.source.is_meta
+
+    def _check(self) -> None:
+        """
+        Check the data of a channel event as mido does, since encoding skips mido's checks.
+        Out of range values would otherwise be sent as other midi bytes.
+
+        :raises TypeError: if a value is not an integer.
+        :raises ValueError: if a value is out of range.
+        """
+        for name in _DATA.get(self.type, ()):
+            check_value(name, getattr(self, name))
+
+    def bytes(self) -> list[int]:
+        """
+        Encode the event as raw midi bytes.
+        Meta messages are encoded as they would be in a midi file.
+
+        :return: the bytes of the event.
+        """
+        if self.source is not None:
+            return self.source.bytes()
+        if self.type == "set_tempo":
+            return [0xFF, 0x51, 0x03] + list(self.tempo.to_bytes(3, "big"))
+        status = _STATUS.get(self.type)
+        if status is None:
+            return self.to_message().bytes()
+        self._check()
+        status |= self.channel
+        if self.type == "control_change":
+            return [status, self.control, self.value]
+        if self.type == "pitchwheel":
+            pitch = self.pitch + 8192
+            return [status, pitch & 0x7F, pitch >> 7]
+        return [status, self.note, self.velocity]
+
+    def to_message(self) -> mido.Message | mido.MetaMessage:
+        """
+        Convert the event to a mido message.
+        Only the data of channel messages is checked (see `_check()`), the message is created without mido's other checks.
+
+        :return: the corresponding mido message.
+        """
+        if self.source is not None:
+            msg = self.source.copy()
+            msg.time = self.time
+            return msg
+        self._check()
+        if self.type == "note_on" or self.type == "note_off":
+            return mido.Message(
+                self.type,
+                skip_checks=True,
+                channel=self.channel,
+                note=self.note,
+                velocity=self.velocity,
+                time=self.time,
+            )
+        if self.type == "control_change":
+            return mido.Message(
+                self.type,
+                skip_checks=True,
+                channel=self.channel,
+                control=self.control,
+                value=self.value,
+                time=self.time,
+            )
+        if self.type == "pitchwheel":
+            return mido.Message(
+                self.type,
+                skip_checks=True,
+                channel=self.channel,
+                pitch=self.pitch,
+                time=self.time,
+            )
+        if self.type == "set_tempo":
+            return mido.MetaMessage(
+                self.type, skip_checks=True, tempo=self.tempo, time=self.time
+            )
+        raise ValueError(
+            f"Cannot convert event of type {self.type} without a source message."
+        )
+
+    def __repr__(self) -> str:
+        return repr(self.to_message())
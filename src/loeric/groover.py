@@ -1,11 +1,10 @@
-import copy
 import json
 import os
-import random
 import threading
 import time
 from collections import defaultdict
-from collections.abc import Callable
+from collections.abc import Callable, Iterator
+from contextlib import AbstractContextManager, ExitStack, contextmanager
 from typing import List
 
 import jsonmerge
@@ -13,8 +12,12 @@ import mido
 import music21 as m21
 import numpy as np
 
+from . import cache as cc
 from . import contour as cnt
+from . import event as ev
 from . import loeric_utils as lu
+from . import plan as pp
+from . import rng as rn
 from . import tune as tu
 
 CUT = "cut"
@@ -47,6 +50,8 @@ class Groover:
             intensity_control: int = 1,
             human_impact_control: int = 11,
             syncing: bool = False,
+            contour_cache: cc.ContourCache = None,
+            streaming: bool = False,
     ):
         """
         Initialize the groover class by setting user-defined parameters and creating the contours.
@@ -62,6 +67,8 @@ class Groover:
         :param seed: the random seed of the performance.
         :param config_file: the path to the configuration file (must be a JSON file).
         :param syncing: whether or not synchronization with multiple LOERIC istances is active.
+        :param contour_cache: the persistent cache of computed contours. If None, contours are always computed.
+        :param streaming: whether or not contours are computed one repetition at a time during the performance, so that memory and setup time do not depend on the number of repetitions. The contour cache is not used.
         """
 
         # tune
@@ -127,6 +134,11 @@ class Groover:
         self._initial_human_impact = human_impact
         self._did_swing = False
         self._syncing = syncing
+        self._contour_cache = contour_cache
+        self._streaming = streaming
+
+        # functions called before control changes and jumps
+        self._listeners = []
 
         # merge base configuration with command line values
         dir_path = os.path.dirname(os.path.realpath(__file__))
@@ -149,9 +161,8 @@ class Groover:
         Generate all parameter settings following the current configuration.
         """
 
-        # random seed
-        random.seed(self._config["values"]["seed"])
-        np.random.seed(self._config["values"]["seed"])
+        # random stream of this performance
+        self._random = rn.BlockRandom(self._config["values"]["seed"])
 
         # set parameters
         if self._config["values"]["bpm"] is None:
@@ -164,17 +175,17 @@ class Groover:
         # table for pitch errors
         self._pitch_errors = defaultdict(int)
 
-        self._max_ornament_length = 0
-        for o in self._config["ornamentation"]:
-            self._max_ornament_length = max(
-                self._max_ornament_length, self._config["ornamentation"][o]["length"]
-            )
-
         # legato
         self._legato_amount = (
                 self._config["values"]["legato_max"] - self._config["values"]["legato_min"]
         )
 
+        # slide positions from 1 to 0, for each number of pitch bend steps
+        self._bend_positions = [None] + [
+            np.arange(r, -1, -1) / r
+            for r in range(1, self._config["values"]["bend_resolution"] + 1)
+        ]
+
         # droning
         self._drone_notes = np.array(self._config["drone"]["strings"])
         self._free_drone_notes = np.array(self._config["drone"]["free_strings"])
@@ -187,7 +198,87 @@ class Groover:
         self._tempo_lock = threading.Lock()
         self._last_clock_time = None
 
-        # create contours
+        # control messages sent, by controller: (value, performance time)
+        self._last_emitted = {}
+        self._suppressed_messages = 0
+
+        # create contours, or retrieve them from the cache
+        if self._streaming:
+            # computed while performing, never cached
+            self._calculate_streaming_contours()
+        else:
+            cached = None
+            if self._contour_cache is not None:
+                cache_key = self._contour_cache.key(self._tune, self._config)
+                cached = self._contour_cache.load(cache_key, self._random.generator)
+
+            if cached is None:
+                self._calculate_contours()
+                if self._contour_cache is not None:
+                    self._contour_cache.store(
+                        cache_key,
+                        {name: c._contour for name, c in self._contours.items()},
+                        self._random.generator,
+                    )
+            else:
+                self._contours = {}
+                for name, values in cached.items():
+                    self._contours[name] = cnt.Contour()
+                    self._contours[name]._contour = values
+
+        # object holding each contour's value in a given moment
+        self._contour_values = {}
+
+        for contour_name in self._config["control_2_contour"]:
+            self._contour_values[contour_name] = 0.5
+
+        # init all contours
+        for contour_name in self._contours:
+            # init the human contours
+            self._contour_values[contour_name] = 0.5
+            self._contour_values[f"{contour_name}_intensity"] = 0.5
+            self._contour_values[f"{contour_name}_human_impact"] = (
+                self._initial_human_impact
+            )
+
+        # static per-event information
+        self._plan = pp.PerformancePlan()
+        self._plan.compile(self._tune, self._contours, self._config)
+        self._row = self._plan.row(self._note_index)
+
+        # approach notes for ornaments
+        self._above_approach, self._below_approach = self._approach_tables()
+
+    def _approach_tables(self) -> tuple[list[int], list[int]]:
+        """
+        Compute the notes used to approach every midi note from above and from below.
+        Configuration rules take precedence over the scale of the tune's key.
+
+        :return: the above and below approach notes, indexed by midi note number.
+        """
+        notes = np.arange(128)
+        above = np.array(lu.above_approach_scale)[
+            self._tune.semitones_from_tonic(notes - self._transpose_semitones)
+        ] + notes
+        below = np.array(lu.below_approach_scale)[
+            self._tune.semitones_from_tonic(notes)
+        ] + notes
+        above = above.tolist()
+        below = below.tolist()
+
+        for table, rules in [
+            (above, self._config["approach_from_above"]),
+            (below, self._config["approach_from_below"]),
+        ]:
+            for note, note_name in enumerate(lu.midi_note_names):
+                if note_name in rules:
+                    table[note] = m21.pitch.Pitch(rules[note_name]).midi
+        return above, below
+
+    def _calculate_contours(self) -> None:
+        """
+        Compute all the contours of the performance from the tune and the configuration.
+        """
         self._contours = {}
 
         # velocity contour
@@ -199,6 +290,7 @@ class Groover:
             savgol=self._config["velocity"]["savgol"],
             scale=self._config["velocity"]["scale"],
             shift=self._config["velocity"]["shift"],
+            rng=self._random.generator,
         )
 
         # pattern contour
@@ -208,6 +300,7 @@ class Groover:
             mean=np.array(self._config["velocity"]["pattern_means"]),
             std=np.array(self._config["velocity"]["pattern_stds"]),
             period=self._config["velocity"]["period"],
+            rng=self._random.generator,
         )
 
         velocity_pitch_contour = cnt.PitchContour()
@@ -251,6 +344,7 @@ class Groover:
             savgol=self._config["tempo"]["savgol"],
             scale=self._config["tempo"]["scale"],
             shift=self._config["tempo"]["shift"],
+            rng=self._random.generator,
         )
         tempo_phrasing_contour = cnt.PhraseContour()
         tempo_phrasing_contour.calculate(
@@ -304,6 +398,7 @@ class Groover:
             std_scale=self._config["tempo"]["std_scale"],
             period=self._config["tempo"]["period"],
             normalize=True,
+            rng=self._random.generator,
         )
 
         # ornament contour
@@ -315,6 +410,7 @@ class Groover:
             savgol=self._config["ornament"]["savgol"],
             scale=self._config["ornament"]["scale"],
             shift=self._config["ornament"]["shift"],
+            rng=self._random.generator,
         )
 
         ornament_phrasing_contour = cnt.PhraseContour()
@@ -364,20 +460,151 @@ class Groover:
             allowed_chords=np.array(self._config["harmony"]["allowed_chords"]),
         )
 
-        # object holding each contour's value in a given moment
-        self._contour_values = {}
+    def _calculate_streaming_contours(self) -> None:
+        """
+        Prepare all the contours of the performance for streaming (see `contour.StreamingContour`).
+        Contours only depending on the notes are computed once on the first repetition of the tune and repeated.
+        Contours with random components are computed one repetition at a time, just ahead of the play head.
+        """
+        self._contours = {}
+        single = self._tune.single_repetition()
 
-        for contour_name in self._config["control_2_contour"]:
-            self._contour_values[contour_name] = 0.5
+        def periodic(contour: cnt.Contour) -> cnt.PeriodicContour:
+            periodic_contour = cnt.PeriodicContour()
+            periodic_contour.calculate(self._tune, contour)
+            return periodic_contour
 
-        # init all contours
-        for contour_name in self._contours:
-            # init the human contours
-            self._contour_values[contour_name] = 0.5
-            self._contour_values[f"{contour_name}_intensity"] = 0.5
-            self._contour_values[f"{contour_name}_human_impact"] = (
-                self._initial_human_impact
-            )
+        # phrasing contour, shared by velocity and tempo
+        phrasing_contour = cnt.PhraseContour()
+        phrasing_contour.calculate(single)
+        self._contours["phrasing"] = periodic(phrasing_contour)
+
+        # velocity contour
+        velocity_intensity_contour = cnt.StreamingIntensityContour()
+        velocity_intensity_contour.calculate(
+            self._tune,
+            weights=np.array(self._config["velocity"]["weights"]),
+            random_weight=self._config["velocity"]["random"],
+            savgol=self._config["velocity"]["savgol"],
+            scale=self._config["velocity"]["scale"],
+            shift=self._config["velocity"]["shift"],
+            rng=self._random.generator,
+        )
+
+        self._contours["velocity_pattern"] = cnt.StreamingPatternContour()
+        self._contours["velocity_pattern"].calculate(
+            self._tune,
+            mean=np.array(self._config["velocity"]["pattern_means"]),
+            std=np.array(self._config["velocity"]["pattern_stds"]),
+            period=self._config["velocity"]["period"],
+            rng=self._random.generator,
+        )
+
+        velocity_pitch_contour = cnt.PitchContour()
+        velocity_pitch_contour.calculate(single, savgol=True, shift=True, scale=True)
+
+        self._contours["velocity"] = cnt.weighted_sum(
+            [
+                velocity_intensity_contour,
+                periodic(velocity_pitch_contour),
+                self._contours["phrasing"],
+            ],
+            np.array(
+                [
+                    1
+                    - self._config["velocity"]["high_loud_weight"]
+                    - self._config["velocity"]["phrase_weight"],
+                    self._config["velocity"]["high_loud_weight"],
+                    self._config["velocity"]["phrase_weight"],
+                ]
+            ),
+        )
+
+        # tempo contour
+        tempo_intensity_contour = cnt.StreamingIntensityContour()
+        tempo_intensity_contour.calculate(
+            self._tune,
+            weights=np.array(self._config["tempo"]["weights"]),
+            random_weight=self._config["tempo"]["random"],
+            savgol=self._config["tempo"]["savgol"],
+            scale=self._config["tempo"]["scale"],
+            shift=self._config["tempo"]["shift"],
+            rng=self._random.generator,
+        )
+
+        self._contours["tempo"] = cnt.weighted_sum(
+            [tempo_intensity_contour, self._contours["phrasing"]],
+            np.array(
+                [
+                    1 - self._config["tempo"]["phrase_weight"],
+                    self._config["tempo"]["phrase_weight"],
+                ]
+            ),
+        )
+
+        self._contours["tempo_pattern"] = cnt.StreamingPatternContour()
+        self._contours["tempo_pattern"].calculate(
+            self._tune,
+            mean=np.array(self._config["tempo"]["pattern_means"]),
+            std=np.array(self._config["tempo"]["pattern_stds"]),
+            std_scale=self._config["tempo"]["std_scale"],
+            period=self._config["tempo"]["period"],
+            normalize=True,
+            rng=self._random.generator,
+        )
+
+        # ornament contour
+        ornament_intensity_contour = cnt.StreamingIntensityContour()
+        ornament_intensity_contour.calculate(
+            self._tune,
+            weights=np.array(self._config["ornament"]["weights"]),
+            random_weight=self._config["ornament"]["random"],
+            savgol=self._config["ornament"]["savgol"],
+            scale=self._config["ornament"]["scale"],
+            shift=self._config["ornament"]["shift"],
+            rng=self._random.generator,
+        )
+
+        ornament_phrasing_contour = cnt.PhraseContour()
+        ornament_phrasing_contour.calculate(
+            single,
+            phrase_levels=self._config["values"]["phrase_levels"],
+            phrase_exp=self._config["ornament"]["phrase_exp"],
+        )
+
+        self._contours["ornament"] = cnt.weighted_sum(
+            [ornament_intensity_contour, periodic(ornament_phrasing_contour)],
+            np.array(
+                [
+                    1 - self._config["ornament"]["phrase_weight"],
+                    self._config["ornament"]["phrase_weight"],
+                ]
+            ),
+        )
+
+        # note properties
+        message_length_contour = cnt.MessageLengthContour()
+        message_length_contour.calculate(single)
+        self._contours["message length"] = periodic(message_length_contour)
+
+        pitch_difference_contour = cnt.PitchDifferenceContour()
+        pitch_difference_contour.calculate(single)
+        self._contours["pitch difference"] = periodic(pitch_difference_contour)
+
+        pitch_contour = cnt.PitchContour()
+        pitch_contour.calculate(single, savgol=False, shift=False, scale=False)
+        self._contours["pitch contour"] = periodic(pitch_contour)
+
+        harmony_contour = cnt.HarmonicContour()
+        harmony_contour.calculate(
+            single,
+            np.array(
+                self._config["harmony"]["chord_score"],
+            ),
+            chords_per_bar=self._config["harmony"]["chords_per_bar"],
+            allowed_chords=np.array(self._config["harmony"]["allowed_chords"]),
+        )
+        self._contours["harmony"] = periodic(harmony_contour)
 
     def check_midi_control(self) -> Callable[[], None]:
         """
@@ -437,7 +664,97 @@ class Groover:
         if contour_name not in self._contour_values:
             raise UnknownContourError
 
-        self._contour_values[contour_name] = value
+        if self._contour_values[contour_name] == value:
+            return
+        with self._changing():
+            self._contour_values[contour_name] = value
+
+    def add_listener(
+        self, callback: Callable[[], AbstractContextManager[None]]
+    ) -> None:
+        """
+        Register a context manager factory to hold around a control change (contour value or tempo) or a jump to another song position.
+        The change is applied inside the context, so that listeners can pause whatever uses the groover until it is complete.
+        Events performed ahead of time are stale after such changes.
+
+        :param callback: the function returning the context manager.
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(
+        self, callback: Callable[[], AbstractContextManager[None]]
+    ) -> None:
+        """
+        Unregister a function registered with `add_listener()`.
+
+        :param callback: the function to unregister.
+        """
+        self._listeners.remove(callback)
+
+    @contextmanager
+    def _changing(self) -> Iterator[None]:
+        """
+        Hold the contexts of all listeners while the performance changes.
+        """
+        with ExitStack() as stack:
+            for callback in list(self._listeners):
+                stack.enter_context(callback())
+            yield
+
+    def get_state(self) -> dict:
+        """
+        Return the state of the performance, i.e. everything that changes when events are performed.
+        Values set by human control and external tempo are not part of the state.
+
+        :return: the state, to be restored with `set_state()`.
+        """
+        with self._note_index_lock:
+            return {
+                "note_index": self._note_index,
+                "row": self._row,
+                "performance_time": self._performance_time,
+                "offset": self._offset,
+                "delay": self._delay,
+                "delay_max": self._delay_max,
+                "did_swing": self._did_swing,
+                "tempo": self._tempo,
+                "last_played_drones": list(self._last_played_drones),
+                "pitch_errors": self._pitch_errors.copy(),
+                "contours": {
+                    name: contour.get_state()
+                    for name, contour in self._contours.items()
+                },
+                "contour_values": {
+                    name: self._contour_values[name] for name in self._contours
+                },
+                "random_state": self._random.get_state(),
+                "last_emitted": self._last_emitted.copy(),
+                "suppressed_messages": self._suppressed_messages,
+            }
+
+    def set_state(self, state: dict) -> None:
+        """
+        Restore the state of the performance, so that the following events are performed again as they were after the state was taken.
+
+        :param state: a state returned by `get_state()`.
+        """
+        with self._note_index_lock:
+            self._note_index = state["note_index"]
+            self._row = state["row"]
+            self._performance_time = state["performance_time"]
+            self._offset = state["offset"]
+            self._delay = state["delay"]
+            self._delay_max = state["delay_max"]
+            self._did_swing = state["did_swing"]
+            self._tempo = state["tempo"]
+            self._last_played_drones = list(state["last_played_drones"])
+            self._pitch_errors = state["pitch_errors"].copy()
+            for name, contour_state in state["contours"].items():
+                self._contours[name].set_state(contour_state)
+            self._contour_values.update(state["contour_values"])
+            self._random.set_state(state["random_state"])
+            self._last_emitted = state["last_emitted"].copy()
+            self._suppressed_messages = state["suppressed_messages"]
 
     '''
     def has_next(self):
@@ -458,6 +775,7 @@ class Groover:
             if self._note_index >= len(self._tune):
                 return None
             note = self._tune[self._note_index]
+            self._row = self._plan[self._note_index]
             # update performance time
             self._performance_time += note.time
             return note
@@ -469,15 +787,17 @@ class Groover:
         :param pos: the position to jump to.
         """
 
-        with self._note_index_lock:
-            if pos > self._tune._max_songpos:
-                print(
-                    f"Cannot jump to position {pos} with max pos {self._tune._max_songpos}"
-                )
-                return
+        if pos > self._tune.max_songpos:
+            print(
+                f"Cannot jump to position {pos} with max pos {self._tune.max_songpos}"
+            )
+            return
+
+        with self._changing(), self._note_index_lock:
             self._note_index, contour_index = self._tune.index_map[pos]
+            self._row = self._plan[self._note_index]
             # update performance time
-            self._performance_time = self._tune.duration_map[pos]
+            self._performance_time = self._plan.onset(self._note_index)
             # update all contours
             for contour_name in self._contours:
                 self._contours[contour_name].jump(contour_index - 1)
@@ -488,8 +808,18 @@ class Groover:
         """
 
         self._last_clock_time = None
-        with self._tempo_lock:
-            self._external_tempo = None
+        self._set_external_tempo(None)
+
+    def _set_external_tempo(self, tempo: int | None) -> None:
+        """
+        Set the tempo requested by external control, holding the listeners if it changes.
+
+        :param tempo: the requested tempo in microseconds per quarter, or None to follow the tune's tempo.
+        """
+        if self._external_tempo == tempo:
+            return
+        with self._changing(), self._tempo_lock:
+            self._external_tempo = tempo
 
     def set_tempo(self, tempo: int) -> None:
         """
@@ -497,8 +827,7 @@ class Groover:
 
         :param tempo: the requested tempo in bpms.
         """
-        with self._tempo_lock:
-            self._external_tempo = mido.bpm2tempo(tempo)
+        self._set_external_tempo(mido.bpm2tempo(tempo))
 
     def set_clock(self) -> None:
         """
@@ -515,21 +844,85 @@ class Groover:
             if new_tempo > lu.MAX_TEMPO:
                 new_tempo = None
 
-            with self._tempo_lock:
-                self._external_tempo = new_tempo
+            self._set_external_tempo(new_tempo)
         self._last_clock_time = now
 
-    def perform(self, message: mido.Message) -> list[mido.Message]:
+    @property
+    def suppressed_messages(self) -> int:
+        """
+        :return: the number of control change and tempo messages not sent because their value did not change enough.
+        """
+        return self._suppressed_messages
+
+    def _slide_bends(
+        self, channel: int, bend: float, duration: float
+    ) -> list[ev.Event]:
+        """
+        Generate the pitchwheel messages of a slide, from the given pitch bend to no bend.
+        The slide is split in "bend_resolution" steps or, in adaptive mode, in as many steps as needed to send at most "bend_max_rate" messages per second.
+
+        :param channel: the midi channel of the slide.
+        :param bend: the initial pitch bend.
+        :param duration: the duration of the slide in seconds.
+
+        :return: the pitchwheel messages.
+        """
+        resolution = self._config["values"]["bend_resolution"]
+        if self._config["values"]["bend_adaptive"]:
+            resolution = max(
+                1,
+                min(resolution, int(duration * self._config["values"]["bend_max_rate"])),
+            )
+        step = duration / resolution
+
+        # the slide is faster at the start
+        mult = self._random.uniform(0.25, 0.5)
+        curve = (self._bend_positions[resolution] ** mult * bend).astype(int)
+        return [
+            ev.Event("pitchwheel", channel=channel, pitch=p, time=step)
+            for p in curve.tolist()
+        ]
+
+    def _should_emit(self, key: int | str, value: float, threshold: float) -> bool:
+        """
+        Decide whether or not to send a control message, following the "control_emission" configuration.
+        With change-only emission, a message is only sent if its value changed by at least the threshold since the last one sent for the same controller and the minimum interval has passed, or if the maximum interval has passed.
+
+        :param key: the controller, i.e. a control number or "tempo".
+        :param value: the value of the message.
+        :param threshold: the minimum change of value to send a message.
+
+        :return: True if the message should be sent. Otherwise, it is counted as suppressed.
+        """
+        emission = self._config["control_emission"]
+        now = self._performance_time
+        last = self._last_emitted.get(key)
+        if emission["change_only"] and last is not None:
+            last_value, last_time = last
+            elapsed = now - last_time
+            # jumps may move the performance time backwards
+            expired = elapsed < 0 or (
+                emission["max_interval"] > 0 and elapsed >= emission["max_interval"]
+            )
+            changed = value != last_value and abs(value - last_value) >= threshold
+            if not expired and (not changed or elapsed < emission["min_interval"]):
+                self._suppressed_messages += 1
+                return False
+
+        self._last_emitted[key] = (value, now)
+        return True
+
+    def perform(self, message: mido.Message) -> list[ev.Event]:
         """
         'Perform' a single note event by affecting its timing, pitch, velocity and adding ornaments.
 
         :param message: the midi message to perform.
 
-        :return: the list of midi messages corresponding to the input message's performance.
+        :return: the list of events corresponding to the input message's performance.
         """
 
-        # work on a deepcopy to avoid side effects
-        new_message = copy.deepcopy(message)
+        # work on a lightweight event to avoid side effects
+        new_message = ev.Event.from_message(message)
 
         # check if note on event
         is_note_on = lu.is_note_on(new_message)
@@ -557,7 +950,7 @@ class Groover:
 
         if lu.is_note_off(new_message):
             # randomize end time and legato
-            mult = np.random.normal(
+            mult = self._random.normal(
                 loc=self._config["values"]["legato_min"]
                 + self._legato_amount * self._contour_values["phrasing"],
                 scale=0.0,
@@ -587,25 +980,33 @@ class Groover:
             # apply swing
             self._offset += self._apply_swing()
 
+        # tempo for all the resulting messages
+        tempo = self.current_tempo
+
         notes = []
 
         # add contour information as MIDI CC
+        emission = self._config["control_emission"]
         for contour_name in self._config["contour_2_control"]:
-            notes.append(
-                mido.Message(
-                    "control_change",
-                    channel=self._config["values"]["midi_channel"],
-                    control=self._config["contour_2_control"][contour_name],
-                    value=round(self._contour_values[contour_name] * 127),
-                    time=0,
+            control = self._config["contour_2_control"][contour_name]
+            value = min(127, max(0, round(self._contour_values[contour_name] * 127)))
+            if self._should_emit(control, value, emission["cc_threshold"]):
+                notes.append(
+                    ev.Event(
+                        "control_change",
+                        channel=self._config["values"]["midi_channel"],
+                        control=control,
+                        value=value,
+                        time=0,
+                    )
                 )
-            )
 
         if not self._syncing:
             # add explicit tempo information
-            notes.append(
-                mido.MetaMessage("set_tempo", tempo=self.current_tempo, time=0)
-            )
+            if self._should_emit(
+                "tempo", mido.tempo2bpm(tempo), emission["tempo_threshold_bpm"]
+            ):
+                notes.append(ev.Event("set_tempo", tempo=tempo, time=0))
 
         notes_to_add = [new_message]
         # modify the note
@@ -624,9 +1025,10 @@ class Groover:
 
         # make sure time is not negative
         # and scale things according to tempo
+        tempo_ratio = tempo / self._tune.tempo
         new_notes = []
         for note in notes:
-            note.time = self._duration_of(max(0, note.time))
+            note.time = tempo_ratio * max(0, note.time)
 
             # if it's a note message
             if lu.is_note(note):
@@ -638,12 +1040,10 @@ class Groover:
                 bend = int(
                     self._config["values"]["pitch_deviation_cents"]
                     * 0.01
-                    * np.random.normal(loc=0, scale=0.33)
+                    * self._random.normal(loc=0, scale=0.33)
                     * 8192
                 )
-                new_notes.append(
-                    mido.Message("pitchwheel", channel=note.channel, pitch=bend)
-                )
+                new_notes.append(ev.Event("pitchwheel", channel=note.channel, pitch=bend))
             new_notes.append(note)
 
         notes = new_notes
@@ -666,20 +1066,14 @@ class Groover:
         :return: the computed offset for the next note
         """
 
-        duration = self._contour_values["message length"]
-
-        x = 0.25 * self._performance_time / self._tune.quarter_duration
-        # duration normalized so that quarter note = 0.25
-        d = (duration / self._tune.quarter_duration) * 0.25
         p = self._current_swing
 
         # the base unit to consider for swing
         # u = 0.125 = quaver
         u = 0.125
 
-        right_duration = d - u > -0.012
-        right_time = abs((x % (2 * u)) - u) < 0.012
-        swing_it = right_time and right_duration
+        # quaver on the right position, precomputed in the plan
+        swing_it = self._row is not None and self._row["swing"]
 
         t = 0
         # on  on  on  on
@@ -708,14 +1102,13 @@ class Groover:
 
         :return: the input notes, with an added drone.
         """
-        note_duration = self._tune.bar_duration / self._config["drone"]["notes_per_bar"]
-        should_play = self._performance_time % note_duration <= lu.TRIGGER_DELTA
+        should_play = self._row is not None and self._row["drone"]
 
         if should_play and is_note_on:
             for drone in self._last_played_drones:
                 notes.insert(
                     0,
-                    mido.Message(
+                    ev.Event(
                         type="note_off",
                         channel=self._config["drone"]["midi_channel"],
                         note=drone,
@@ -731,7 +1124,7 @@ class Groover:
                 if self._config["drone"]["transpose"]:
                     drone += self._transpose_semitones
 
-                delay = random.uniform(0, self._config["drone"]["delay_range"])
+                delay = self._random.uniform(0, self._config["drone"]["delay_range"])
 
                 multiplier = self._config["drone"]["velocity_multiplier"]
                 velocity = self._current_velocity
@@ -744,7 +1137,7 @@ class Groover:
 
                 notes.insert(
                     1 + list_offset,
-                    mido.Message(
+                    ev.Event(
                         type="note_on",
                         channel=self._config["drone"]["midi_channel"],
                         note=drone,
@@ -828,11 +1221,11 @@ class Groover:
 
         return drone[1:]
 
-    def get_end_notes(self) -> list[mido.Message]:
+    def get_end_notes(self) -> list[ev.Event]:
         """
         Generate an end note for the tune based on its key.
 
-        :return: the midi messages containing the end note
+        :return: the events containing the end note
         """
         # get root and range
         root = int(self._contour_values["harmony"] % 12)
@@ -865,21 +1258,21 @@ class Groover:
         w = abs(pitches - last_note).astype(float)
         w /= max(w)
         w = 1 - w
-        end_pitch = random.choices(pitches, weights=w, k=1)[0]
+        end_pitch = self._random.choice(pitches, p=w)
         end_pitch += self._transpose_semitones
 
         # get duration (quarter note)
         duration = self._eight_duration * 4
 
         # create msgs
-        on_msg = mido.Message(
+        on_msg = ev.Event(
             "note_on",
             channel=self._midi_channel,
             note=end_pitch,
             time=0,
             velocity=self._current_velocity,
         )
-        off_msg = mido.Message(
+        off_msg = ev.Event(
             "note_off",
             channel=self._midi_channel,
             note=end_pitch,
@@ -952,17 +1345,7 @@ class Groover:
 
         :return: the note used the approach the given note from above.
         """
-        note_name = m21.pitch.Pitch(midi=note_number).nameWithOctave
-        # use configuration
-        if note_name in self._config["approach_from_above"]:
-            pitch = m21.pitch.Pitch(self._config["approach_from_above"][note_name])
-            return pitch.midi
-        # use normal scale
-        else:
-            index = self._tune.semitones_from_tonic(
-                note_number - self._transpose_semitones
-            )
-            return lu.above_approach_scale[index] + note_number
+        return self._above_approach[note_number]
 
     def approach_from_below(self, note_number: int, tune: tu.Tune) -> int:
         """
@@ -974,23 +1357,15 @@ class Groover:
 
         :return: the note used the approach the given note from below.
         """
-        note_name = m21.pitch.Pitch(midi=note_number).nameWithOctave
-        # use configuration
-        if note_name in self._config["approach_from_below"]:
-            pitch = m21.pitch.Pitch(self._config["approach_from_below"][note_name])
-            return pitch.midi
-        # use normal scale
-        else:
-            index = self._tune.semitones_from_tonic(note_number)
-            return lu.below_approach_scale[index] + note_number
+        return self._below_approach[note_number]
 
     def generate_ornament(
-            self, message: mido.Message, ornament_type: str
-    ) -> list[mido.Message]:
+            self, message: ev.Event, ornament_type: str
+    ) -> list[ev.Event]:
         """
         Generate the sequence of notes corresponding to the chosen ornament.
 
-        :param message: the midi message to ornament.
+        :param message: the event to ornament.
         :param ornament_type: the type of ornament to generate.
 
         :return: the list of midi events corresponding to the chosen ornament.
@@ -1003,7 +1378,7 @@ class Groover:
             if ornament_type == CUT:
                 # generate a cut
                 cut_note = self.approach_from_above(message.note, self._tune)
-                cut = mido.Message(
+                cut = ev.Event(
                     "note_on",
                     note=cut_note,
                     velocity=int(
@@ -1019,7 +1394,7 @@ class Groover:
                 ornaments.append(cut)
                 # note off
                 ornaments.append(
-                    mido.Message(
+                    ev.Event(
                         "note_off",
                         channel=cut.channel,
                         note=cut.note,
@@ -1045,9 +1420,9 @@ class Groover:
                 )
 
                 # first note
-                original_0 = copy.deepcopy(message)
+                original_0 = message.copy()
                 original_0.velocity = self._current_velocity
-                or_0_off = mido.Message(
+                or_0_off = ev.Event(
                     "note_off",
                     note=message.note,
                     channel=message.channel,
@@ -1057,14 +1432,14 @@ class Groover:
 
                 # calculate cut
                 upper_pitch = self.approach_from_above(message.note, self._tune)
-                upper = mido.Message(
+                upper = ev.Event(
                     "note_on",
                     note=upper_pitch,
                     channel=message.channel,
                     time=0,
                     velocity=cut_velocity,
                 )
-                upper_off = mido.Message(
+                upper_off = ev.Event(
                     "note_off",
                     note=upper_pitch,
                     channel=message.channel,
@@ -1073,10 +1448,10 @@ class Groover:
                 )
 
                 # change original note
-                original_1 = copy.deepcopy(message)
+                original_1 = message.copy()
                 original_1.time = 0
                 original_1.velocity = self._current_velocity
-                or_1_off = mido.Message(
+                or_1_off = ev.Event(
                     "note_off",
                     note=message.note,
                     channel=message.channel,
@@ -1086,14 +1461,14 @@ class Groover:
 
                 # calculate cut
                 lower_pitch = self.approach_from_below(message.note, self._tune)
-                lower = mido.Message(
+                lower = ev.Event(
                     "note_on",
                     note=lower_pitch,
                     channel=message.channel,
                     time=0,
                     velocity=cut_velocity,
                 )
-                lower_off = mido.Message(
+                lower_off = ev.Event(
                     "note_off",
                     note=lower_pitch,
                     channel=message.channel,
@@ -1123,7 +1498,7 @@ class Groover:
 
             elif ornament_type == SLIDE:
                 # append original note
-                original = copy.deepcopy(message)
+                original = message.copy()
                 # original.time = 0
                 original.velocity = self._current_velocity
                 ornaments.append(original)
@@ -1133,28 +1508,13 @@ class Groover:
                 bend = max(min(4096.0 * diff, 8191), -8192)
 
                 # calculate duration
-                resolution = self._config["values"]["bend_resolution"]
                 slide_time = message_length / 4
                 self._offset += slide_time
-                duration = slide_time / resolution
 
                 # append messages
-                mult = random.uniform(0.25, 0.5)
-                for i in range(resolution, -1, -1):
-                    p = i / resolution
-                    p **= mult
-                    p *= bend
-                    p = int(p)
-                    ornaments.append(
-                        mido.Message(
-                            "pitchwheel",
-                            channel=message.channel,
-                            pitch=p,
-                            time=duration,
-                        )
-                    )
+                ornaments.extend(self._slide_bends(message.channel, bend, slide_time))
                 ornaments.append(
-                    mido.Message("pitchwheel", channel=message.channel, pitch=0, time=0)
+                    ev.Event("pitchwheel", channel=message.channel, pitch=0, time=0)
                 )
             elif ornament_type == DROP:
                 pass
@@ -1162,7 +1522,7 @@ class Groover:
                 max_limit = self._config["values"]["max_pitch_error"]
                 min_limit = self._config["values"]["min_pitch_error"]
                 # generate error
-                value = random.randint(min_limit, max_limit)
+                value = self._random.randint(min_limit, max_limit)
 
                 # correct if diatonic errors are required
                 if self._config["values"]["diatonic_errors"]:
@@ -1187,12 +1547,12 @@ class Groover:
                 # record error for that note for later note off event
                 self._pitch_errors[message.note] = value
                 # create the new message
-                new_message = copy.deepcopy(message)
+                new_message = message.copy()
                 new_message.note += value
                 ornaments.append(new_message)
 
-                perc = random.uniform(0.4, 0.9)
-                off_message = mido.Message(
+                perc = self._random.uniform(0.4, 0.9)
+                off_message = ev.Event(
                     "note_off",
                     note=new_message.note,
                     velocity=0,
@@ -1203,20 +1563,20 @@ class Groover:
         else:
             # print(ornament_type)
             # sample pitches
-            pitches = np.random.normal(
+            pitches = self._random.normal(
                 loc=self._config["ornamentation"][ornament_type]["pitches_mean"],
                 scale=self._config["ornamentation"][ornament_type]["pitches_std"],
                 size=len(self._config["ornamentation"][ornament_type]["pitches_mean"]),
             )
             # sample velocities
-            velocities = np.random.normal(
+            velocities = self._random.normal(
                 loc=self._config["ornamentation"][ornament_type]["velocities_mean"],
                 scale=self._config["ornamentation"][ornament_type]["velocities_std"],
                 size=len(pitches),
             )
 
             # sample durations
-            durations = np.random.normal(
+            durations = self._random.normal(
                 loc=self._config["ornamentation"][ornament_type]["durations_mean"],
                 scale=self._config["ornamentation"][ornament_type]["durations_std"],
                 size=len(pitches),
@@ -1266,7 +1626,7 @@ class Groover:
                 # or if sliding and first message
                 if not self._config["ornamentation"][ornament_type]["slide"] or i == 0:
                     ornaments.append(
-                        mido.Message(
+                        ev.Event(
                             "note_on",
                             note=new_pitch,
                             velocity=min(
@@ -1286,38 +1646,23 @@ class Groover:
                 if diff != 0 and self._config["ornamentation"][ornament_type]["slide"]:
                     bend = max(min(4096.0 * diff, 8191), -8192)
 
-                    # calculate duration
-                    resolution = self._config["values"]["bend_resolution"]
-                    duration = overall_duration / resolution
-
                     # append messages
-                    mult = random.uniform(0.25, 0.5)
-                    for i in range(resolution, -1, -1):
-                        pb = i / resolution
-                        pb **= mult
-                        pb *= bend
-                        pb = int(pb)
-                        ornaments.append(
-                            mido.Message(
-                                "pitchwheel",
-                                channel=message.channel,
-                                pitch=pb,
-                                time=duration,
-                            )
-                        )
-                        overall_duration -= duration
+                    bends = self._slide_bends(message.channel, bend, overall_duration)
+                    ornaments.extend(bends)
+                    overall_duration -= sum(b.time for b in bends)
 
                 # add a note off message if not sliding
-                # or if sliding and last message
+                # or if sliding and last message, also when the last message bends
                 if (
                     not self._config["ornamentation"][ornament_type]["slide"]
                     or i == len(pitches) - 1
                 ):
                     ornaments.append(
-                        mido.Message(
+                        ev.Event(
                             "note_off",
                             note=new_pitch,
-                            time=overall_duration,
+                            # the bends last one step longer than the message
+                            time=max(0, overall_duration),
                         )
                     )
 
@@ -1335,127 +1680,39 @@ class Groover:
 
         return ornaments
 
-    def choose_ornament(self, message: mido.Message) -> str:
+    def choose_ornament(self, message: ev.Event) -> str:
         """
         Evaluate the ornament specific rules and chooose how the note will be ornamented.
 
-        :param message: the midi message to ornament.
+        :param message: the event to ornament.
 
         :return: the chosen ornament type.
         """
         options = []
         options_prob = []
 
-        is_beat = self._is_on_a_beat()
         if self._config["values"]["use_old_ornaments"]:
-            message_length = self._contour_values["message length"]
-
-            if message_length >= 0.75 * self._eight_duration and (
-                is_beat or self._contour_values["pitch difference"] == 0
-            ):
-                options.append(CUT)
-                options_prob.append(self._config["probabilities"]["cut"])
-
-            # value of a dotted quarter
-            if message_length - 3 * self._eight_duration > -0.01:
-                # return ROLL
-                options.append(ROLL)
-                options_prob.append(self._config["probabilities"]["roll"])
-
-            if (
-                is_beat and message_length > self._slide_duration
-            ) or self._contour_values["pitch difference"] >= self._config["values"][
-                "slide_pitch_threshold"
+            # eligibility is precomputed in the plan
+            eligible = 0 if self._row is None else self._row["ornaments"]
+            for bit, ornament in [
+                (pp.CUT_BIT, CUT),
+                (pp.ROLL_BIT, ROLL),
+                (pp.SLIDE_BIT, SLIDE),
+                (pp.DROP_BIT, DROP),
+                (pp.ERROR_BIT, ERROR),
             ]:
-                options.append(SLIDE)
-                options_prob.append(self._config["probabilities"]["slide"])
-
-            if not is_beat:
-                options.append(DROP)
-                options_prob.append(self._config["probabilities"]["drop"])
-
-            if not is_beat:
-                options.append(ERROR)
-                options_prob.append(self._config["probabilities"]["error"])
+                if eligible & bit:
+                    options.append(ornament)
+                    options_prob.append(self._config["probabilities"][ornament])
         else:
-
-            # create pattern from source notes
-            contour_index = self._contours["message length"]._index
-            case_len = 0
-            case_i = 0
-            tune_notes = []
-            first_pitch = 0
-            # iterate until needed
-            while case_len < self._max_ornament_length:
-                index = min(
-                    contour_index + case_i,
-                    len(self._contours["message length"]) - 1,
-                )
-                # obtain pitch
-                p = self._contours["pitch contour"][index]
-
-                # save first pitch
-                if case_i == 0:
-                    first_pitch = p
-
-                # obtain duration
-                d = self._contours["message length"][index] / self._eight_duration
-
-                # update length counter
-                case_len += d
-
-                # add note
-                tune_notes.append([float(p - first_pitch), float(np.round(d * 4) / 4)])
-
-                case_i += 1
-
-            # for each ornament
-            for ornament in self._config["ornamentation"]:
-                cases = self._config["ornamentation"][ornament]["cases"]
-
-                # check elegibility for every listed case
-                for c in cases:
-                    elegible = True
-                    # on a beat
-                    if c == "beat":
-                        elegible = elegible and is_beat
-                    elif c == "not beat":
-                        elegible = elegible and not is_beat
-                    else:
-                        case_notes = c
-
-                        tune_i = 0
-                        for note in case_notes:
-
-                            # target pitch
-                            pitch = note[0]
-
-                            # target duration
-                            duration = note[1]
-
-                            # actual pitch & duration
-                            pitch_difference = tune_notes[tune_i][0]
-                            message_length = tune_notes[tune_i][1]
-                            tune_i += 1
-
-                            # check
-                            elegible = elegible and pitch_difference == pitch
-
-                            elegible = (
-                                elegible and abs(message_length - duration) <= 0.01
-                            )
-
-                            # if one fails, move on
-                            if not elegible:
-                                break
-                    # if found a case, move to next ornament
-                    if elegible:
-                        options.append(ornament)
-                        options_prob.append(
-                            self._config["ornamentation"][ornament]["probability"]
-                        )
-                        break
-                    # else check another case
+            # cases are matched in the plan
+            eligible = 0 if self._row is None else int(self._row["ornament_cases"])
+            for bit, ornament in enumerate(self._config["ornamentation"]):
+                if eligible & (1 << bit):
+                    options.append(ornament)
+                    options_prob.append(
+                        self._config["ornamentation"][ornament]["probability"]
+                    )
 
         prob_sum = sum(options_prob)
         if prob_sum == 0:
@@ -1467,14 +1724,14 @@ class Groover:
             options_prob = np.array(options_prob).astype(float)
             options_prob /= options_prob.sum()
 
-        return np.random.choice(options, p=options_prob)
+        return self._random.choice(options, p=options_prob)
 
     def can_generate_ornament(self) -> bool:
         """
         :return: whether or not to generate an ornament given the current ornament contour.
         """
         prob = self._contour_values["ornament"]
-        return random.choices([True, False], weights=[prob, 1 - prob], k=1)[0]
+        return self._random.random() < prob
 
     def _duration_of(self, time: float) -> float:
         """
@@ -1501,6 +1758,9 @@ class Groover:
 
         :return: True if we are on a beat.
         """
+        if self._row is not None:
+            return bool(self._row["beat"])
+
         beat_position = (
                                 self._performance_time % self._tune._bar_duration
                         ) / self._tune._beat_duration
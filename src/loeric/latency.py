@@ -0,0 +1,219 @@
+import csv
+import json
+import os
+import threading
+
+import numpy as np
+
+# message types with separate statistics, all others are counted as "other"
+KINDS = ["note_on", "note_off", "control_change", "pitchwheel", "other"]
+
+# percentiles reported by summaries
+PERCENTILES = [50, 90, 99, 100]
+
+
+class LatencyRecorder:
+    """
+    Record when each message was scheduled and actually sent, to tell scheduling problems from musical timing.
+    Records are kept in a preallocated ring buffer, so that recording does not allocate memory during playback.
+    When the buffer is full, the oldest records are overwritten.
+    Summary lines are computed and printed by a separate thread (see `start()`), never by the thread sending the messages.
+    """
+
+    def __init__(self, capacity: int = 2**16, summary_interval: float = 0):
+        """
+        Initialize the class.
+
+        :param capacity: the maximum number of records kept.
+        :param summary_interval: how often a summary line is printed while recording, in seconds. If 0, no summary is printed while recording.
+        """
+        self._capacity = capacity
+        self._summary_interval = summary_interval
+
+        self._kinds = np.zeros(capacity, dtype=np.uint8)
+        self._scheduled = np.zeros(capacity, dtype=np.float64)
+        self._sent = np.zeros(capacity, dtype=np.float64)
+        # total number of records, including overwritten ones
+        self._count = 0
+        # records since the last summary line
+        self._summary_start = 0
+        self._kind_index = {kind: i for i, kind in enumerate(KINDS)}
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __len__(self) -> int:
+        return min(self._count, self._capacity)
+
+    @property
+    def dropped(self) -> int:
+        """
+        :return: the number of records overwritten because the buffer was full.
+        """
+        return self._count - len(self)
+
+    def record(self, kind: str, scheduled: float, sent: float) -> None:
+        """
+        Record a sent message.
+
+        :param kind: the type of the message.
+        :param scheduled: when the message should have been sent, in seconds since the start of the performance.
+        :param sent: when the message was actually sent, in seconds since the start of the performance.
+        """
+        i = self._count % self._capacity
+        self._kinds[i] = self._kind_index.get(kind, len(KINDS) - 1)
+        self._scheduled[i] = scheduled
+        self._sent[i] = sent
+        self._count += 1
+
+    def start(self) -> None:
+        """
+        Start printing a summary line of the new records every summary interval, if there is one.
+        """
+        if self._summary_interval <= 0:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._print_summaries, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop printing summary lines.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _print_summaries(self) -> None:
+        while not self._stopped.wait(self._summary_interval):
+            count = self._count
+            # nothing was sent, e.g. while playback is paused
+            if count == self._summary_start:
+                continue
+            print(self.summary(since=self._summary_start, until=count))
+            self._summary_start = count
+
+    def _records(
+        self, since: int = 0, until: int = None
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Return the records in chronological order.
+
+        :param since: the total number of records before the first one to return. Overwritten records are skipped.
+        :param until: the total number of records up to the last one to return. If None, all records are returned.
+
+        :return: the kind index, the scheduled time and the send time of each record.
+        """
+        if until is None:
+            until = self._count
+        start = max(since, until - self._capacity)
+        order = np.arange(start, until) % self._capacity
+        return self._kinds[order], self._scheduled[order], self._sent[order]
+
+    def lateness(self, kind: str = None, since: int = 0) -> np.ndarray:
+        """
+        :param kind: the type of the messages, one of `KINDS`. If None, all messages are included.
+        :param since: the total number of records before the first one to include.
+
+        :return: how late each message was sent in seconds, in chronological order.
+        """
+        kinds, scheduled, sent = self._records(since)
+        lateness = sent - scheduled
+        if kind is None:
+            return lateness
+        return lateness[kinds == KINDS.index(kind)]
+
+    def percentiles(
+        self, since: int = 0, until: int = None
+    ) -> dict[str, dict[str, float]]:
+        """
+        Compute the percentiles of the lateness by message type.
+
+        :param since: the total number of records before the first one to include.
+        :param until: the total number of records up to the last one to include. If None, all records are included.
+
+        :return: the number of messages and the percentiles of their lateness in seconds, by message type. Types without messages are omitted.
+        """
+        kinds, scheduled, sent = self._records(since, until)
+        lateness = sent - scheduled
+        stats = {}
+        for i, kind in enumerate([None] + KINDS):
+            values = lateness if kind is None else lateness[kinds == i - 1]
+            if len(values) == 0:
+                continue
+            stats["all" if kind is None else kind] = dict(
+                count=len(values),
+                **{
+                    f"p{p}": v
+                    for p, v in zip(
+                        PERCENTILES, np.percentile(values, PERCENTILES).tolist()
+                    )
+                },
+            )
+        return stats
+
+    def histogram(
+        self, kind: str = None, bins: list[float] = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Compute the histogram of the lateness.
+
+        :param kind: the type of the messages, one of `KINDS`. If None, all messages are included.
+        :param bins: the edges of the bins in seconds. If None, bins are 0.5ms wide from 0 to 10ms.
+
+        :return: the number of messages in each bin and the edges of the bins. Messages outside the bins are counted in the first or last one.
+        """
+        if bins is None:
+            bins = np.linspace(0, 0.01, 21)
+        bins = np.asarray(bins)
+        lateness = np.clip(self.lateness(kind), bins[0], bins[-1])
+        return np.histogram(lateness, bins)
+
+    def summary(self, since: int = 0, until: int = None) -> str:
+        """
+        :param since: the total number of records before the first one to include.
+        :param until: the total number of records up to the last one to include. If None, all records are included.
+
+        :return: a single line with the percentiles of the lateness by message type, in milliseconds.
+        """
+        parts = []
+        for kind, s in self.percentiles(since, until).items():
+            values = "/".join(f"{s[f'p{p}'] * 1000:.2f}" for p in PERCENTILES)
+            parts.append(f"{kind} {values} ({s['count']})")
+        if len(parts) == 0:
+            return "[LATENCY]\tno messages"
+        labels = "/".join(f"p{p}" if p < 100 else "max" for p in PERCENTILES)
+        return f"[LATENCY]\t{labels} ms: " + ", ".join(parts)
+
+    def dump(self, filename: str) -> None:
+        """
+        Save the records to a file, as CSV or JSON depending on the extension.
+        The JSON file also holds the percentiles by message type.
+
+        :param filename: the path to the output file, ending with .csv or .json.
+        """
+        kinds, scheduled, sent = self._records()
+        names = [KINDS[k] for k in kinds.tolist()]
+        rows = zip(
+            names, scheduled.tolist(), sent.tolist(), (sent - scheduled).tolist()
+        )
+
+        if os.path.splitext(filename)[1].casefold() == ".json":
+            with open(filename, "w") as f:
+                json.dump(
+                    {
+                        "dropped": self.dropped,
+                        "percentiles": self.percentiles(),
+                        "messages": [
+                            dict(zip(["type", "scheduled", "sent", "lateness"], row))
+                            for row in rows
+                        ],
+                    },
+                    f,
+                    indent=4,
+                )
+        else:
+            with open(filename, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["type", "scheduled", "sent", "lateness"])
+                writer.writerows(rows)
@@ -1,12 +1,14 @@
 import mido
-import muspy as mp
 import numpy as np
-import music21 as m21
 
 # how to approach a note from above or below in a major scale
 above_approach_scale = [2, 1, 2, 1, 1, 2, 1, 2, 1, 2, 1, 1]
 below_approach_scale = [-1, -1, -2, -1, -2, -1, -1, -2, -1, -2, -1, -2]
 
+# note names with octave of every midi note, spelled as in music21
+_pitch_names = ["C", "C#", "D", "E-", "E", "F", "F#", "G", "G#", "A", "B-", "B"]
+midi_note_names = [f"{_pitch_names[n % 12]}{n // 12 - 1}" for n in range(128)]
+
 # calculated as the shortest "possible" length of a note
 # given the latest guinnes world record for
 # most notes played in a minute on a piano
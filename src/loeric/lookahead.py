@@ -0,0 +1,152 @@
+import threading
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+import mido
+
+from . import event as ev
+from . import groover as gr
+
+
+class Lookahead:
+    """
+    A bounded queue of performed events between the groover (producer) and the player (consumer).
+    A producer thread performs tune events ahead of playback, so that slow calls to `Groover.perform()` do not delay the messages being played.
+    During a control change or a jump, the producer is paused, the groover is rewound to the state following the last event returned to the player and queued events are discarded, so that the performance is the same as without lookahead.
+    """
+
+    def __init__(self, groover: gr.Groover, size: int = 16):
+        """
+        Initialize the class.
+
+        :param groover: the groover performing the tune.
+        :param size: the maximum number of tune events performed ahead of playback. If 0, events are performed by the consumer when requested.
+        """
+        self._groover = groover
+        self._size = size
+
+        # (groover state before performing, tune event, performed events)
+        self._queue = deque()
+        self._condition = threading.Condition()
+        # whether the producer is performing an event
+        self._performing = False
+        # number of changes of the groover in progress, during which the producer waits
+        self._changes = 0
+        # whether the end of the tune has been queued
+        self._finished = False
+        self._stopped = False
+        # exception raised by the producer, raised again by the consumer
+        self._error = None
+        self._thread = None
+
+    def start(self) -> None:
+        """
+        Start performing events ahead of playback.
+        """
+        if self._size <= 0:
+            return
+        self._groover.add_listener(self._rewind)
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the producer thread. Events still queued are discarded.
+        """
+        if self._thread is None:
+            return
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self._thread.join()
+        self._thread = None
+        self._groover.remove_listener(self._rewind)
+
+    def next(self) -> tuple[mido.Message, list[ev.Event]] | None:
+        """
+        Return the next tune event and its performance, waiting for the producer if needed.
+        Repetition markers (sysex messages) are not performed.
+
+        :return: the tune event and the performed events, or None at the end of the tune.
+        """
+        if self._thread is None:
+            message, events = self._perform_next()
+        else:
+            with self._condition:
+                while len(self._queue) == 0 and not self._stopped:
+                    if self._error is not None:
+                        raise self._error
+                    self._condition.wait()
+                if self._stopped:
+                    return None
+                _, message, events = self._queue.popleft()
+                self._condition.notify_all()
+
+        if message is None:
+            return None
+        return message, events
+
+    def _perform_next(self) -> tuple[mido.Message | None, list[ev.Event]]:
+        """
+        Perform the next event of the tune.
+
+        :return: the tune event and the performed events. The tune event is None at the end of the tune.
+        """
+        message = self._groover.next_event()
+        if message is None or message.type == "sysex":
+            return message, []
+        return message, self._groover.perform(message)
+
+    @contextmanager
+    def _rewind(self) -> Iterator[None]:
+        """
+        Discard the queued events, restore the state of the groover before the first of them and pause the producer until the context exits.
+        Held by the groover around a control change or a jump.
+        """
+        with self._condition:
+            self._changes += 1
+            while self._performing:
+                self._condition.wait()
+            if len(self._queue) > 0:
+                self._groover.set_state(self._queue[0][0])
+                self._queue.clear()
+            self._finished = False
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._changes -= 1
+                self._condition.notify_all()
+
+    def _produce(self) -> None:
+        """
+        Perform events ahead of playback until stopped.
+        """
+        while True:
+            with self._condition:
+                while not self._stopped and (
+                    len(self._queue) >= self._size
+                    or self._finished
+                    or self._changes > 0
+                ):
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                self._performing = True
+
+            try:
+                state = self._groover.get_state()
+                message, events = self._perform_next()
+            except Exception as e:
+                with self._condition:
+                    self._performing = False
+                    self._error = e
+                    self._condition.notify_all()
+                return
+
+            with self._condition:
+                self._performing = False
+                self._queue.append((state, message, events))
+                self._finished = message is None
+                self._condition.notify_all()
@@ -0,0 +1,362 @@
+import mido
+import numpy as np
+
+from . import contour as cnt
+from . import loeric_utils as lu
+from . import tune as tu
+
+# event kinds
+OTHER = 0
+NOTE_ON = 1
+NOTE_OFF = 2
+SONGPOS = 3
+SYSEX = 4
+
+# bits for old-style ornament eligibility
+CUT_BIT = 1
+ROLL_BIT = 2
+SLIDE_BIT = 4
+DROP_BIT = 8
+ERROR_BIT = 16
+
+# new-style ornaments are numbered in configuration order, one bit each
+MAX_ORNAMENTS = 64
+
+PLAN_DTYPE = np.dtype(
+    [
+        ("time", np.float64),
+        ("onset", np.float64),
+        ("kind", np.int8),
+        ("pitch", np.int16),
+        ("contour_index", np.int32),
+        ("duration", np.float64),
+        ("pitch_difference", np.float64),
+        ("beat", np.bool_),
+        ("drone", np.bool_),
+        ("swing", np.bool_),
+        ("ornaments", np.uint8),
+        ("ornament_cases", np.uint64),
+    ]
+)
+
+
+class PerformancePlan:
+    """
+    A columnar, precompiled view of a tune holding everything that does not depend on live human control.
+    Each row corresponds to an event of the tune, in the same order as the tune's events.
+    Only the rows of the first repetitions are stored, as long as the following ones repeat them (see `compile()`).
+    """
+
+    def __init__(self):
+        """
+        Initialize the class.
+        """
+        self._table = None
+        self._size = 0
+        # duration and number of notes of the stored rows
+        self._block_duration = 0.0
+        self._block_notes = 0
+        # length and pitch difference of the last note of the stored rows
+        self._last_note = (0.0, 0.0)
+        # first row of the last repetition and its ornament cases
+        self._end = 0
+        self._end_cases = None
+
+    def __len__(self) -> int:
+        """
+        The number of rows in this plan.
+        """
+        return self._size
+
+    def __getitem__(self, index: int):
+        """
+        The row at the given index.
+        """
+        row = self.row(index)
+        if row is None:
+            raise IndexError(f"Index {index} out of range for plan of size {len(self)}")
+        return row
+
+    def row(self, index: int):
+        """
+        Return the row at the given index, or None if the index is out of range.
+        Rows after the stored ones are derived from the stored row at the same position, shifted by the duration and notes of the previous blocks.
+
+        :param index: the event index.
+
+        :return: the row at the given index, or None.
+        """
+        if not 0 <= index < self._size:
+            return None
+        block, i = divmod(index, len(self._table))
+        row = self._table[i]
+        if block == 0 and index < self._end:
+            return row
+
+        row = row.copy()
+        if block > 0:
+            row["onset"] += block * self._block_duration
+            if row["contour_index"] < 0:
+                # the previous note is the last one of the previous block
+                row["duration"], row["pitch_difference"] = self._last_note
+            row["contour_index"] += block * self._block_notes
+        if index >= self._end:
+            row["ornament_cases"] = self._end_cases[index - self._end]
+        return row
+
+    def compile(
+        self,
+        tune: tu.Tune,
+        contours: dict[str, cnt.Contour],
+        config: dict,
+    ) -> None:
+        """
+        Compile the plan for the given tune, contours and (merged) configuration.
+        The following static properties are computed for every event:
+
+        * its onset, i.e. the performance time once the event has been reached;
+        * its kind (note on, note off, songpos, sysex or other) and pitch;
+        * the contour index that is current when the event is performed;
+        * the duration and pitch difference of the corresponding note;
+        * whether it falls on a beat, on a drone onset or on a swung quaver;
+        * which old-style ornaments it is eligible for;
+        * which new-style ornaments have a matching case (see `match_ornament_cases()`).
+
+        Rows are only stored for the shortest block of repetitions after which the events of the tune (see `tune.Tune.period`), the contour values and the beat, drone and swing grids all repeat.
+        If the contours hold the whole tune, e.g. when they are not streamed, the whole tune is stored.
+
+        :param tune: the input tune.
+        :param contours: the contours computed for the tune. Must contain the "message length" and "pitch difference" contours.
+        :param config: the merged configuration.
+        """
+        size = len(tune)
+
+        # the stored repetitions of the tune are repeated identically, read their events
+        period_size = tune.period_size
+        # the last period can be incomplete
+        periods = -(-size // period_size)
+        kinds = np.zeros(period_size, dtype=np.int8)
+        pitches = -np.ones(period_size, dtype=np.int16)
+        times = np.zeros(period_size, dtype=np.float64)
+        for i in range(period_size):
+            msg = tune[i]
+            times[i] = msg.time
+            if lu.is_note_on(msg):
+                kinds[i] = NOTE_ON
+            elif lu.is_note_off(msg):
+                kinds[i] = NOTE_OFF
+            elif msg.type == "songpos":
+                kinds[i] = SONGPOS
+            elif msg.type == "sysex":
+                kinds[i] = SYSEX
+            if lu.is_note(msg):
+                pitches[i] = msg.note
+
+        # periodic contours only hold the first repetition
+        lengths = np.asarray(contours["message length"]._contour, dtype=float)
+        differences = np.asarray(contours["pitch difference"]._contour, dtype=float)
+        period_notes = np.count_nonzero(kinds == NOTE_ON)
+        drone_duration = tune.bar_duration / config["drone"]["notes_per_bar"]
+        grids = [tune.beat_duration, drone_duration, tune.quarter_duration]
+
+        def repeats_after(block: int) -> bool:
+            duration = block * times.sum()
+            return all(abs(duration / g - round(duration / g)) < 1e-6 for g in grids)
+
+        if period_notes % len(lengths) == 0:
+            block = next((b for b in range(1, periods) if repeats_after(b)), periods)
+        else:
+            block = periods
+        block_size = block * period_size
+        table = np.zeros(block_size, dtype=PLAN_DTYPE)
+
+        times = np.tile(times, block)
+        kinds = np.tile(kinds, block)
+        table["time"] = times
+        table["kind"] = kinds
+        table["pitch"] = np.tile(pitches, block)
+
+        # same accumulation order as the groover's performance time
+        onsets = np.cumsum(np.concatenate(([-tune.offset], times)))[1:]
+        table["onset"] = onsets
+
+        # index of the contour value in use at each event
+        note_ons = kinds == NOTE_ON
+        contour_index = np.cumsum(note_ons) - 1
+        table["contour_index"] = contour_index
+
+        # note properties, repeated until the next note on
+        valid = contour_index >= 0
+        durations = np.zeros(block_size)
+        durations[valid] = lengths[contour_index[valid] % len(lengths)]
+        table["duration"] = durations
+        pitch_difference = np.zeros(block_size)
+        pitch_difference[valid] = differences[contour_index[valid] % len(differences)]
+        table["pitch_difference"] = pitch_difference
+
+        # beats
+        beat_position = (onsets % tune.bar_duration) / tune.beat_duration
+        beats = np.abs(beat_position - np.round(beat_position)) <= lu.TRIGGER_DELTA
+        table["beat"] = beats
+
+        # drone onsets
+        table["drone"] = onsets % drone_duration <= lu.TRIGGER_DELTA
+
+        # swing on quavers, see Groover._apply_swing
+        u = 0.125
+        x = 0.25 * onsets / tune.quarter_duration
+        d = (durations / tune.quarter_duration) * 0.25
+        right_duration = d - u > -0.012
+        right_time = np.abs((x % (2 * u)) - u) < 0.012
+        table["swing"] = right_time & right_duration & note_ons
+
+        # old-style ornament eligibility, see Groover.choose_ornament
+        eight_duration = 30 / mido.tempo2bpm(tune.tempo)
+        slide_duration = eight_duration * config["values"]["slide_eight_fraction"]
+        ornaments = np.zeros(block_size, dtype=np.uint8)
+        ornaments[
+            (durations >= 0.75 * eight_duration) & (beats | (pitch_difference == 0))
+        ] |= CUT_BIT
+        ornaments[durations - 3 * eight_duration > -0.01] |= ROLL_BIT
+        ornaments[
+            (beats & (durations > slide_duration))
+            | (pitch_difference >= config["values"]["slide_pitch_threshold"])
+        ] |= SLIDE_BIT
+        ornaments[~beats] |= DROP_BIT | ERROR_BIT
+        ornaments[~note_ons] = 0
+        table["ornaments"] = ornaments
+
+        # new-style ornament eligibility, the notes following the last ones of a repetition are the first ones of the next repetition
+        notes = len(tune.note_table)
+        wrap = len(lengths) < notes
+        table["ornament_cases"] = match_ornament_cases(
+            contours,
+            config["ornamentation"],
+            eight_duration,
+            contour_index,
+            beats,
+            wrap=wrap,
+        )
+        table["ornament_cases"][~note_ons] = 0
+
+        self._table = table
+        self._size = size
+        self._block_duration = times.sum()
+        self._block_notes = block * period_notes
+        self._last_note = (lengths[-1], differences[-1])
+
+        # the notes of the last repetition are not followed by other ones
+        self._end = size
+        self._end_cases = None
+        if wrap:
+            # the last repetition starts with its marker
+            markers = np.flatnonzero(kinds[:period_size] == SYSEX)
+            last_period, last_repetition = divmod(tune.repeats - 1, tune.period)
+            self._end = last_period * period_size + markers[last_repetition]
+            end = slice(
+                self._end % block_size, self._end % block_size + size - self._end
+            )
+            end_cases = match_ornament_cases(
+                contours,
+                config["ornamentation"],
+                eight_duration,
+                contour_index[end] % len(lengths),
+                beats[end],
+            )
+            end_cases[~note_ons[end]] = 0
+            self._end_cases = end_cases
+
+    def onset(self, index: int) -> float:
+        """
+        :param index: the event index.
+
+        :return: the performance time once the given event has been reached.
+        """
+        return float(self[index]["onset"])
+
+
+def match_ornament_cases(
+    contours: dict[str, cnt.Contour],
+    ornamentation: dict,
+    eight_duration: float,
+    contour_index: np.ndarray,
+    beats: np.ndarray,
+    wrap: bool = False,
+) -> np.ndarray:
+    """
+    Match the cases of the new-style ornaments against every note of the tune, see Groover.choose_ornament.
+    A case is either "beat", "not beat" or a list of notes, each given as a pitch difference from the first note and a duration in eighths.
+    The notes following each note of the tune are compared with a case until its cumulated duration reaches the length of the longest ornament.
+    Comparisons are shared by all the cases holding the same note at the same position.
+
+    :param contours: the contours computed for the tune. Must contain the "message length" and "pitch contour" contours.
+    :param ornamentation: the new-style ornaments of the configuration.
+    :param eight_duration: the duration of an eighth note at the tune's tempo, in seconds.
+    :param contour_index: the index of the note of each event.
+    :param beats: whether or not each event falls on a beat.
+    :param wrap: whether or not the contours repeat, so that the notes following the last ones are the first ones. Otherwise the last note is repeated.
+
+    :return: for each event, a mask where bit i is set if a case of the i-th ornament matches.
+    """
+    if len(ornamentation) > MAX_ORNAMENTS:
+        raise ValueError(f"Cannot match more than {MAX_ORNAMENTS} ornaments.")
+
+    # periodic contours only hold the first repetition
+    lengths = np.asarray(contours["message length"]._contour, dtype=float)
+    pitches = np.asarray(contours["pitch contour"]._contour, dtype=float)
+    notes = len(lengths)
+    max_length = max([o["length"] for o in ornamentation.values()], default=0)
+
+    # index of the i-th note following each note of the contours
+    def following(i: int) -> np.ndarray:
+        index = np.arange(notes) + i
+        if wrap:
+            return index % notes
+        return np.minimum(index, notes - 1)
+
+    first_pitches = pitches[following(0)]
+    # (pitch difference, rounded duration, whether the note is compared) of the i-th following note
+    window = []
+    # cumulated duration of the previous notes
+    length = np.zeros(notes)
+    # comparisons by (position, pitch difference, duration)
+    matches = {}
+
+    def match(i: int, pitch: float, duration: float) -> np.ndarray:
+        while len(window) <= i:
+            index = following(len(window))
+            durations = lengths[index] / eight_duration
+            window.append(
+                (
+                    pitches[index] - first_pitches,
+                    np.round(durations * 4) / 4,
+                    length < max_length,
+                )
+            )
+            length[:] = length + durations
+        key = (i, pitch, duration)
+        if key not in matches:
+            differences, rounded, compared = window[i]
+            matches[key] = (
+                compared & (differences == pitch) & (np.abs(rounded - duration) <= 0.01)
+            )
+        return matches[key]
+
+    valid = contour_index >= 0
+    masks = np.zeros(len(contour_index), dtype=np.uint64)
+    for bit, ornament in enumerate(ornamentation.values()):
+        eligible = np.zeros(len(contour_index), dtype=bool)
+        note_eligible = np.zeros(notes, dtype=bool)
+        for case in ornament["cases"]:
+            if case == "beat":
+                eligible |= beats
+            elif case == "not beat":
+                eligible |= ~beats
+            else:
+                case_eligible = np.ones(notes, dtype=bool)
+                for i, (pitch, duration) in enumerate(case):
+                    case_eligible &= match(i, pitch, duration)
+                note_eligible |= case_eligible
+        eligible[valid] |= note_eligible[contour_index[valid] % notes]
+        masks[eligible] |= np.uint64(1 << bit)
+    return masks
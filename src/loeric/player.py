@@ -1,7 +1,104 @@
+from __future__ import annotations
+
 import time
+from collections.abc import Callable
+from typing import TYPE_CHECKING
+
 import mido
-import music21 as m21
-import muspy as mp
+
+from . import event as ev
+from . import latency as lt
+
+if TYPE_CHECKING:
+    import music21 as m21
+    import muspy as mp
+
+
+def raw_sender(midi_out) -> Callable[[list[int]], None] | None:
+    """
+    Return a function sending raw midi bytes to the given port, if the port supports it.
+    Only ports exposing a public `send_bytes` method accept raw bytes, events are converted to mido messages for the others.
+
+    :param midi_out: the output midi port.
+
+    :return: a function accepting raw midi bytes, or None if the port only accepts mido messages.
+    """
+    if midi_out is None:
+        return None
+    return getattr(midi_out, "send_bytes", None)
+
+
+class SleepScheduler:
+    """
+    Wait for events by sleeping against the wall clock, as mido does when playing a midi file.
+    Accuracy depends on the granularity of the OS sleep and on wall clock adjustments.
+    """
+
+    def start(self) -> None:
+        """
+        Start the clock of the performance.
+        """
+        self._start_time = time.time()
+
+    def now(self) -> float:
+        """
+        :return: the time elapsed since the start of the performance in seconds.
+        """
+        return time.time() - self._start_time
+
+    def wait(self, deadline: float) -> None:
+        """
+        Wait until the given time.
+
+        :param deadline: the time to wait for, in seconds since the start of the performance.
+        """
+        duration = deadline - self.now()
+        if duration > 0.0:
+            time.sleep(duration)
+
+
+class DeadlineScheduler(SleepScheduler):
+    """
+    Wait for events with absolute deadlines on a monotonic clock.
+    The scheduler sleeps until shortly before each deadline, then spins until the deadline is reached.
+    A longer spin improves precision at the cost of CPU time.
+    """
+
+    def __init__(self, spin: float = 0.002):
+        """
+        Initialize the class.
+
+        :param spin: how long before each deadline the scheduler stops sleeping and starts spinning, in seconds.
+        """
+        self._spin = spin
+
+    def start(self) -> None:
+        self._start_time = time.perf_counter()
+
+    def now(self) -> float:
+        return time.perf_counter() - self._start_time
+
+    def wait(self, deadline: float) -> None:
+        deadline += self._start_time
+        remaining = deadline - time.perf_counter()
+        if remaining > self._spin:
+            time.sleep(remaining - self._spin)
+        while time.perf_counter() < deadline:
+            pass
+
+
+def get_scheduler(name: str, spin: float = 0.002) -> SleepScheduler:
+    """
+    Create a scheduler from a command line option.
+
+    :param name: the scheduler, "sleep" or "deadline".
+    :param spin: the spin time of the deadline scheduler, in seconds.
+
+    :return: the scheduler.
+    """
+    if name == "deadline":
+        return DeadlineScheduler(spin)
+    return SleepScheduler()
 
 
 class Player:
@@ -15,6 +112,8 @@ class Player:
         save: bool,
         midi_out,
         verbose: bool = False,
+        scheduler: SleepScheduler = None,
+        latency: lt.LatencyRecorder = None,
     ):
         """
         Initialize the class.
@@ -24,6 +123,8 @@ class Player:
         :param time_signature: the performance's time signature.
         :param save: whether or not to save the performance to a midi file
         :param midi_out: the output midi port.
+        :param scheduler: the scheduler timing the messages sent to the port. If None, a `SleepScheduler` is used.
+        :param latency: the recorder of how late each message is sent to the port. If None, lateness is not recorded.
         """
         self._key_signature = key_signature
         self._time_signature = time_signature
@@ -31,6 +132,9 @@ class Player:
         self._midi_out = midi_out
         self._tempo = tempo
         self._verbose = verbose
+        self._send_bytes = raw_sender(midi_out)
+        self._scheduler = scheduler if scheduler is not None else SleepScheduler()
+        self._latency = latency
 
         if self._saving:
             self._midi_performance = mido.MidiFile(type=0)
@@ -59,15 +163,16 @@ class Player:
         # obtained from
         # mido/mido/midifiles/midifiles.py:423-424
         # to minimize drifting
-        self._start_time = time.time()
+        self._scheduler.start()
         self._input_time = 0.0
 
-    def play(self, messages: list[mido.Message]) -> None:
+    def play(self, messages: list[ev.Event | mido.Message]) -> None:
         """
         Play the messages in input and append them to the generated performance.
         If no midi port has been specified, the messages will only be saved.
+        Events are converted to mido messages only if needed by the output port or for saving.
 
-        :param messages: the midi messages to play.
+        :param messages: the events or midi messages to play.
         """
 
         for msg in messages:
@@ -75,27 +180,35 @@ class Player:
             # obtained from
             # mido/mido/midifiles/midifiles.py:427-430
             self._input_time += msg.time
-            playback_time = time.time() - self._start_time
-            duration_to_next_event = self._input_time - playback_time
 
             if self._midi_out is not None:
                 if not msg.is_meta:
                     # obtained from
                     # mido/mido/midifiles/midifiles.py:432-433
-                    if duration_to_next_event > 0.0:
-                        time.sleep(duration_to_next_event)
+                    self._scheduler.wait(self._input_time)
 
                     # don't send songpos messages
                     # but do wait if between pauses
                     if msg.type == "songpos":
                         pass
-                    else:
+                    elif not isinstance(msg, ev.Event):
                         self._midi_out.send(msg)
+                    elif self._send_bytes is not None:
+                        self._send_bytes(msg.bytes())
+                    else:
+                        self._midi_out.send(msg.to_message())
+
+                    if self._latency is not None and msg.type != "songpos":
+                        self._latency.record(
+                            msg.type, self._input_time, self._scheduler.now()
+                        )
 
                     if self._verbose:
                         print("[INFO]\t", msg)
 
             if self._saving:
+                if isinstance(msg, ev.Event):
+                    msg = msg.to_message()
                 self._midi_track.append(msg)
 
     def reset(self) -> None:
@@ -0,0 +1,72 @@
+from . import event as ev
+from . import groover as gr
+from . import player as pl
+from . import tune as tu
+
+
+class OfflineRenderer:
+    """
+    The class responsible for rendering a whole performance to a midi file without real-time playback.
+    Events are performed one at a time by the groover, as in real-time playback: their timing, velocity and ornaments depend on random draws and on the state left by the previous events.
+    The performance is saved by a player without output port, so the file is the same as the one saved during playback.
+    """
+
+    def __init__(
+        self,
+        groover: gr.Groover,
+        tune: tu.Tune,
+    ):
+        """
+        Initialize the class.
+
+        :param groover: the groover performing the tune.
+        :param tune: the tune to perform.
+        """
+        self._groover = groover
+        self._tune = tune
+        self._events = []
+
+    def render(self, end_note: bool = True) -> list[ev.Event]:
+        """
+        Perform the whole tune with the groover, as the player thread does when there is no output port.
+        The same random draws happen in the same order as in real-time playback, so the result only depends on the seed.
+
+        :param end_note: whether or not to play an end note after all repetitions.
+
+        :return: the performed events, with delta times in seconds.
+        """
+        events = []
+        while True:
+            message = self._groover.next_event()
+            if message is None:
+                break
+
+            # repetition markers are never played
+            if message.type == "sysex":
+                continue
+            events.extend(self._groover.perform(message))
+
+        if end_note:
+            self._groover.reset_contours()
+            self._groover.advance_contours()
+            events.extend(self._groover.get_end_notes())
+
+        self._events = events
+        return events
+
+    def save(self, filename: str) -> None:
+        """
+        Save the rendered performance as a midi file, as the player does at the end of playback.
+
+        :param filename: the path to the output midi file.
+        """
+        player = pl.Player(
+            tempo=self._groover.tempo,
+            key_signature=self._tune.key_signature,
+            time_signature=self._tune.time_signature,
+            save=True,
+            midi_out=None,
+        )
+        player.init_playback()
+        player.play(self._events)
+        player.save(filename)
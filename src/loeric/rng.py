@@ -0,0 +1,142 @@
+import math
+from collections.abc import Sequence
+
+import numpy as np
+
+
+class BlockRandom:
+    """
+    A seeded random stream owned by a single performance.
+    Uniform and normal values are drawn from a numpy Generator in blocks, so that drawing a single value does not go through numpy.
+    Array draws (e.g. for contours) can use the generator directly.
+    """
+
+    def __init__(self, seed: int = None, block_size: int = 1024):
+        """
+        Initialize the class.
+
+        :param seed: the random seed. If None, the stream is seeded from the OS.
+        :param block_size: how many values are drawn at once.
+        """
+        self.generator = np.random.default_rng(seed)
+        self._block_size = block_size
+        self._uniforms = []
+        self._uniform_index = 0
+        self._normals = []
+        self._normal_index = 0
+
+    def get_state(self) -> tuple:
+        """
+        :return: the state of the stream, to be restored with `set_state()`.
+        """
+        return (
+            self.generator.bit_generator.state,
+            self._uniforms,
+            self._uniform_index,
+            self._normals,
+            self._normal_index,
+        )
+
+    def set_state(self, state: tuple) -> None:
+        """
+        Restore the state of the stream, so that the following values are drawn again.
+
+        :param state: a state returned by `get_state()`.
+        """
+        (
+            self.generator.bit_generator.state,
+            self._uniforms,
+            self._uniform_index,
+            self._normals,
+            self._normal_index,
+        ) = state
+
+    def random(self) -> float:
+        """
+        :return: a value drawn uniformly in [0, 1).
+        """
+        if self._uniform_index == len(self._uniforms):
+            # blocks are replaced, never modified, so that states can share them
+            self._uniforms = self.generator.random(self._block_size).tolist()
+            self._uniform_index = 0
+        self._uniform_index += 1
+        return self._uniforms[self._uniform_index - 1]
+
+    def _standard_normals(self, size: int) -> list[float]:
+        """
+        :param size: the number of values.
+
+        :return: values drawn from the standard normal distribution.
+        """
+        values = []
+        while len(values) < size:
+            if self._normal_index == len(self._normals):
+                self._normals = self.generator.standard_normal(
+                    self._block_size
+                ).tolist()
+                self._normal_index = 0
+            end = min(len(self._normals), self._normal_index + size - len(values))
+            values.extend(self._normals[self._normal_index : end])
+            self._normal_index = end
+        return values
+
+    def uniform(self, low: float = 0.0, high: float = 1.0) -> float:
+        """
+        :param low: the lower bound.
+        :param high: the upper bound.
+
+        :return: a value drawn uniformly in [low, high).
+        """
+        return low + (high - low) * self.random()
+
+    def normal(
+        self, loc: float | np.ndarray = 0.0, scale: float | np.ndarray = 1.0, size=None
+    ) -> float | np.ndarray:
+        """
+        Draw values from a normal distribution.
+
+        :param loc: the mean of the distribution, for every value if an array.
+        :param scale: the standard deviation of the distribution, for every value if an array.
+        :param size: the number of values. If None, a single value is returned.
+
+        :return: the drawn value or values.
+        """
+        if size is None:
+            return loc + scale * self._standard_normals(1)[0]
+        values = np.array(self._standard_normals(size))
+        return np.asarray(loc) + np.asarray(scale) * values
+
+    def randint(self, low: int, high: int) -> int:
+        """
+        :param low: the lower bound.
+        :param high: the upper bound, included.
+
+        :return: an integer drawn uniformly in [low, high].
+        """
+        return low + int(self.random() * (high - low + 1))
+
+    def choice(self, options: Sequence, p: Sequence[float] = None):
+        """
+        Choose one of the given options.
+
+        :param options: the options to choose from.
+        :param p: the weight of each option, not necessarily normalized. If None, all options have the same weight.
+
+        :return: the chosen option.
+        """
+        if p is None:
+            return options[int(self.random() * len(options))]
+        weight_sum = sum(p)
+        if not 0 < weight_sum < math.inf:
+            raise ValueError("The sum of the weights must be positive and finite")
+        threshold = self.random() * weight_sum
+        total = 0
+        last = None
+        for option, weight in zip(options, p):
+            total += weight
+            if threshold < total:
+                return option
+            if weight > 0:
+                last = option
+        # rounding errors
+        return last
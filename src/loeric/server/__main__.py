@@ -1,7 +1,21 @@
-from loeric.server.server import start_server
-
+import argparse
 import faulthandler
 
+from loeric.server.server import start_server
+
 faulthandler.enable()
 
-start_server()
\ No newline at end of file
+parser = argparse.ArgumentParser(description="Start the LOERIC web server.")
+parser.add_argument(
+    "--server",
+    help="the server backend: 'threaded' (the default) handles each request in its own thread. Other names are passed to bottle (e.g. 'cheroot', 'aiohttp'), which must handle concurrent requests and stream responses without buffering them.",
+    type=str,
+    default="threaded",
+)
+parser.add_argument(
+    "--host", help="the address to listen on.", type=str, default="localhost"
+)
+parser.add_argument("--port", help="the port to listen on.", type=int, default=8080)
+args = parser.parse_args()
+
+start_server(args.server, args.host, args.port)
@@ -0,0 +1,149 @@
+import json
+import queue
+import threading
+from collections.abc import Callable, Iterator
+
+
+def delta(old: dict, new: dict) -> dict:
+    """
+    Compute the changes between two JSON-like documents.
+    Nested dictionaries are compared key by key, any other changed value is replaced as a whole.
+
+    :param old: the previous document.
+    :param new: the current document.
+
+    :return: the changed keys with their new values. Removed keys have a None value.
+    """
+    changes = {}
+    for key, value in new.items():
+        if key not in old:
+            changes[key] = value
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            nested = delta(old[key], value)
+            if len(nested) > 0:
+                changes[key] = nested
+        elif value != old[key]:
+            changes[key] = value
+    for key in old:
+        if key not in new:
+            changes[key] = None
+    return changes
+
+
+def _format(event: str, data: dict) -> str:
+    """
+    :return: the given data as a server-sent event.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class StateChannel:
+    """
+    Push the server state and the live contour values of the musicians to the clients as server-sent events.
+    A thread polls both periodically and only sends what changed since the last poll.
+    Clients receive the full documents as "state_full" and "contours_full" events, followed by "state" and "contours" events with the changes to merge into them.
+    """
+
+    # events queued for a client before it is considered too slow and sent the full documents again
+    MAX_QUEUED = 64
+
+    def __init__(
+        self,
+        get_state: Callable[[], dict],
+        get_contours: Callable[[], dict],
+        interval: float = 0.05,
+    ):
+        """
+        Initialize the class.
+
+        :param get_state: the function returning the server state.
+        :param get_contours: the function returning the contour values by musician id.
+        :param interval: how often the state and contour values are polled, in seconds.
+        """
+        self._get = {"state": get_state, "contours": get_contours}
+        self._interval = interval
+        self._documents = {"state": {}, "contours": {}}
+        self._clients: list[queue.Queue] = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """
+        Start polling the state.
+        """
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop polling the state and close the streams of all clients.
+        """
+        self._stopped.set()
+        with self._lock:
+            for client in self._clients:
+                self._put(client, None)
+
+    def publish(self) -> None:
+        """
+        Send the changes of the state and of the contour values to all clients.
+        """
+        with self._lock:
+            for event, get in self._get.items():
+                document = get()
+                changes = delta(self._documents[event], document)
+                self._documents[event] = document
+                if len(changes) == 0:
+                    continue
+                message = _format(event, changes)
+                for client in self._clients:
+                    self._put(client, message)
+
+    def subscribe(self) -> Iterator[str]:
+        """
+        Stream the events of a new client until the channel is stopped or the client disconnects.
+
+        :return: the server-sent events, with comments to keep the connection alive.
+        """
+        client = queue.Queue(self.MAX_QUEUED)
+        with self._lock:
+            self._resync(client)
+            self._clients.append(client)
+        try:
+            while not self._stopped.is_set():
+                try:
+                    message = client.get(timeout=15)
+                except queue.Empty:
+                    message = ": keep-alive\n\n"
+                if message is None:
+                    break
+                yield message
+        finally:
+            with self._lock:
+                self._clients.remove(client)
+
+    def _put(self, client: queue.Queue, message: str | None) -> None:
+        """
+        Queue a message for a client.
+        If the client is too slow, its pending deltas are replaced by the full documents.
+        """
+        try:
+            client.put_nowait(message)
+        except queue.Full:
+            self._resync(client)
+            if message is None:
+                client.put_nowait(None)
+
+    def _resync(self, client: queue.Queue) -> None:
+        """
+        Replace the pending messages of a client with the full documents.
+        """
+        while not client.empty():
+            client.get_nowait()
+        for event, document in self._documents.items():
+            client.put_nowait(_format(f"{event}_full", document))
+
+    def _poll(self) -> None:
+        while not self._stopped.wait(self._interval):
+            self.publish()
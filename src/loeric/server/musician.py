@@ -12,6 +12,7 @@ from mido import Message
 from mido.ports import BaseOutput, BaseInput, EchoPort
 
 from loeric import (loeric_utils as lu)
+from loeric.cache import ContourCache
 from loeric.groover import Groover
 from loeric.player import Player
 from loeric.server.listener import ListenerThread
@@ -31,12 +32,22 @@ class State(Enum):
 _state = State.STOPPED
 _lock = threading.Lock()
 _play_event = threading.Event()
+# contours shared by all musicians, created on first use
+_contour_cache: ContourCache | None = None
 
 
 def get_state() -> State:
     return _state
 
 
+def get_contour_cache() -> ContourCache:
+    global _contour_cache
+    with _lock:
+        if _contour_cache is None:
+            _contour_cache = ContourCache()
+    return _contour_cache
+
+
 def play_all():
     _update(State.PLAYING)
 
@@ -125,7 +136,8 @@ class Musician:
                 config_files=[f"{dir_path}/musician/{self.name.lower()}.json",
                               f"{dir_path}/instrument/{self.instrument.lower()}.json",
                               #f"{dir_path}/tune_type/{self.tune.type.lower()}.json",
-                              f"{dir_path}/tune/{splitext(self.tune.name.lower())[0]}.json"]
+                              f"{dir_path}/tune/{splitext(self.tune.name.lower())[0]}.json"],
+                contour_cache=get_contour_cache(),
             )
 
             self.control_out.set_groover(groover)
@@ -188,6 +200,9 @@ class Musician:
                 player.play(new_messages)
 
             _update(State.STOPPED)
+            print(
+                f"{self.name}: suppressed {groover.suppressed_messages} unchanged control and tempo messages."
+            )
             if listener is not None:
                 listener.stop = True
 
@@ -1,19 +1,22 @@
 import json
+from concurrent.futures import ThreadPoolExecutor
 from os import listdir, getcwd, rename, remove
 from os.path import isfile, join, splitext
 from random import shuffle
-from threading import Thread
+from threading import Thread, Lock, Event
 from typing import List
 
 import mido
 import tinysoundfont
-from bottle import Bottle, run, static_file, request, response, HTTPResponse, abort
+from bottle import Bottle, run, static_file, request, response, HTTPResponse, abort, ServerAdapter
 from mido import MidiFile, Message
 from muspy import KeySignature
 from muspy.outputs.midi import PITCH_NAMES
 from nanoid import generate
 from pyaudio import PyAudio
 
+from loeric.cache import TuneCache
+from loeric.server.channel import StateChannel
 from loeric.server.musician import Musician, get_state, play_all, stop_all, pause_all
 from loeric.server.synthout import SynthOutput
 from loeric.synchronize import sync_loeric, exiting as sync_stop, load_sync_config
@@ -21,10 +24,16 @@ from loeric.tune import Tune
 
 track_dir = join(getcwd(), "static/midi")
 temp_dir = join(getcwd(), "static/temp")
+tune_cache = TuneCache()
 
 app = Bottle()
 
+# slow operations (parsing tunes, probing devices) run one at a time on this thread, so that requests don't wait for them
+worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="loeric-worker")
+
 tune: Tune
+# the track being parsed, if any
+loading_track: str | None = None
 musicians: list[Musician] = []
 names = ["Aoife", "Caoimhe", "Saoirse", "Ciara", "Niamh", "Róisín", "Cara", "Clodagh", "Aisling", "Éabha",
          "Conor", "Sean", "Oisín", "Patrick", "Cian", "Liam", "Darragh", "Eoin", "Caoimhín", "Cillian"]
@@ -50,6 +59,7 @@ def list_audio():
             name = audio.get_device_info_by_host_api_device_index(0, i).get("name")
             audio_list[name] = i
 
+    audio.terminate()
     return audio_list
 
 
@@ -71,9 +81,56 @@ def list_tracks() -> List[str]:
             isfile(join(track_dir, f)) and splitext(f)[1].casefold() in filetypes]
 
 
-@app.get('/api/state')
-def state():
-    response.set_header('Access-Control-Allow-Origin', '*')
+class Inventory:
+    """
+    Cached lists of the MIDI ports, audio devices and tracks offered to the client.
+    Probing devices is slow, so they are refreshed periodically in a background thread or on request, not for every state.
+    """
+
+    def __init__(self, interval: float = 10):
+        self._interval = interval
+        self._options = None
+        self._lock = Lock()
+        self._stopped = Event()
+        self._thread = None
+
+    def refresh(self, devices: bool = True):
+        with self._lock:
+            if devices or self._options is None:
+                options = {
+                    'inputs': mido.get_input_names(),
+                    'outputs': mido.get_output_names(),
+                    'instruments': list(instruments.keys()),
+                    'audio': list_audio(),
+                }
+            else:
+                options = dict(self._options)
+            options['trackList'] = list_tracks()
+            # replaced, never modified, so that readers don't need the lock
+            self._options = options
+
+    def options(self) -> dict:
+        if self._options is None:
+            self.refresh()
+        return self._options
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = Thread(target=self._refresh_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _refresh_loop(self):
+        while not self._stopped.wait(self._interval):
+            self.refresh()
+
+
+inventory = Inventory()
+
+
+def current_state() -> dict:
     return {
         'musicians': list(map(lambda m: m.__json__(), musicians)),
         'state': get_state().name,
@@ -82,24 +139,67 @@ def state():
             'time': f"{tune.time_signature.numerator}/{tune.time_signature.denominator}",
             'key': key_to_str(tune.key_signature),
             'tempo': mido.tempo2bpm(tune.tempo, [tune.time_signature.numerator, tune.time_signature.denominator]),
+            'loading': loading_track,
         },
-        'options': {
-            'inputs': mido.get_input_names(),
-            'outputs': mido.get_output_names(),
-            'instruments': list(instruments.keys()),
-            'trackList': list_tracks(),
-            'audio': list_audio()
-        },
+        'options': inventory.options(),
     }
 
 
+def current_contours() -> dict:
+    contours = {}
+    for musician in musicians:
+        groover = musician.control_out.groover
+        if groover is not None:
+            contours[musician.id] = {name: round(float(value), 3) for name, value in
+                                     dict(groover._contour_values).items()}
+    return contours
+
+
+channel = StateChannel(current_state, current_contours)
+
+
+@app.get('/api/state')
+def state():
+    response.set_header('Access-Control-Allow-Origin', '*')
+    return current_state()
+
+
+@app.get('/api/events')
+def events():
+    response.content_type = 'text/event-stream'
+    response.set_header('Cache-Control', 'no-cache')
+    response.set_header('Access-Control-Allow-Origin', '*')
+    return channel.subscribe()
+
+
+@app.get('/api/refresh')
+def refresh():
+    # the new options are pushed through the event stream
+    worker.submit(inventory.refresh)
+    return state()
+
+
 def __set_track(track: str):
     track_list = list_tracks()
     if track in track_list:
-        global tune
-        tune = Tune(join(track_dir, track), 1)
+        global loading_track
+        loading_track = track
+        worker.submit(__load_track, track)
+
+
+def __load_track(track: str):
+    global tune, loading_track
+    try:
+        new_tune = Tune(join(track_dir, track), 1, tune_cache)
+        tune = new_tune
         for musician in musicians:
             musician.tune = tune
+    except Exception as e:
+        print(f"Could not load {track}: {e}")
+    finally:
+        # a later request may be loading another track
+        if loading_track == track:
+            loading_track = None
 
 
 @app.get('/api/play')
@@ -154,22 +254,36 @@ def instrument_change():
     return state()
 
 
-@app.put('/api/control')
-def control_change():
-    global musicians
-    print(request.forms)
-    musician_id = request.forms.id
-    control = int(request.forms.control)
-    new_value = int(request.forms.value)
-
+# control requests are the fast path: they never wait for the worker and don't return the state
+def __send_control(musician_id: str, control: int, value: int):
     for musician in musicians:
         if musician.id == musician_id:
             if musician.midi_out is not None:
-                musician.control_out.send(Message("control_change", channel=0, control=control, value=new_value))
+                musician.control_out.send(Message("control_change", channel=0, control=control, value=value))
+
+
+@app.put('/api/control')
+def control_change():
+    print(request.forms)
+    __send_control(request.forms.id, int(request.forms.control), int(request.forms.value))
 
     return state()
 
 
+@app.post('/api/controls')
+def controls_change():
+    # only the last value of each control is applied, the new state is pushed through the event stream
+    changes = {}
+    for change in json.loads(request.body.read()):
+        changes[(change['id'], int(change['control']))] = int(change['value'])
+    for (musician_id, control), value in changes.items():
+        __send_control(musician_id, control, value)
+
+    res = HTTPResponse(status=204)
+    res.set_header('Access-Control-Allow-Origin', '*')
+    return res
+
+
 @app.put('/api/output')
 def output_change():
     global musicians
@@ -180,6 +294,7 @@ def output_change():
         if musician.id == musician_id:
             if new_output == 'create_output':
                 musician.midi_in = mido.open_output(f"Loeric Virtual Out {musician.id}", virtual=True)
+                worker.submit(inventory.refresh)
             elif new_output == 'synth':
                 musician.midi_in = SynthOutput(f"Loeric Synth {musician.id}", synth, index)
             else:
@@ -254,6 +369,7 @@ def upload_track():
         track = mido_source.tracks[0]
         track_file = join(track_dir, track.name + '.mid')
         rename(temp_file, track_file)
+        inventory.refresh(devices=False)
 
         __set_track(track.name + '.mid')
     except:
@@ -273,7 +389,31 @@ def get_static(filepath):
     return static_file(filepath, root="static/site")
 
 
-def start_server():
+class ThreadingWSGIRefServer(ServerAdapter):
+    """
+    The WSGIRef server, handling each request in its own thread so that event streams don't block other requests.
+    """
+
+    def run(self, handler):
+        from socketserver import ThreadingMixIn
+        from wsgiref.simple_server import WSGIServer, make_server
+
+        class Server(ThreadingMixIn, WSGIServer):
+            daemon_threads = True
+
+        server = make_server(self.host, self.port, handler, Server)
+        self.port = server.server_port
+        server.serve_forever()
+
+
+def get_server(name: str) -> type[ServerAdapter] | str:
+    # any other name is resolved by bottle, event streams need a server handling concurrent requests without buffering
+    if name == 'threaded':
+        return ThreadingWSGIRefServer
+    return name
+
+
+def start_server(server: str = 'threaded', host: str = 'localhost', port: int = 8080):
     global soundfont_id
     soundfont_id = synth.sfload("static/sound/FluidR3_GM.sf2")
     track_list = [f for f in listdir(track_dir) if isfile(join(track_dir, f)) and splitext(f)[1].casefold() == '.mid']
@@ -281,8 +421,14 @@ def start_server():
         track = track_list[0]
         if track in track_list:
             global tune
-            tune = Tune(join(track_dir, track), 1)
+            tune = Tune(join(track_dir, track), 1, tune_cache)
             add_musician()
 
-    run(app, host='localhost', port=8080)
+    inventory.refresh()
+    inventory.start()
+    channel.start()
+    run(app, server=get_server(server), host=host, port=port)
+    channel.stop()
+    inventory.stop()
+    worker.shutdown(wait=False, cancel_futures=True)
     synth.stop()
@@ -1,6 +1,5 @@
 import mido
 import os
-import pandas as pd
 import numpy as np
 import re
 import threading
@@ -48,6 +47,8 @@ def update_tempo(tempo):
 
 def sync_intensity(inports, outports):
     global songpos_wait, last_tempo, switch_timer, fix_sync_duration, stop_sync_duration, exiting, all_dead, config
+    import pandas as pd
+
     all_dead.acquire()
     shell_print("Intensity Sync ON.")
     int_dict = defaultdict(int)
@@ -1,4 +1,6 @@
-from collections.abc import Callable
+import copy
+import hashlib
+from collections.abc import Callable, Iterator, Mapping
 from os.path import basename
 from typing import Generator
 
@@ -8,13 +10,159 @@ import muspy as mp
 import numpy as np
 from muspy import KeySignature
 
+from . import cache as ch
 from . import loeric_utils as lu
 
+# the largest position of a midi songpos message
+MAX_SONGPOS = 16383
+
+
+class NoteTable:
+    """
+    A columnar view of the notes of a tune, extracted once and shared by all contours.
+    Times are in seconds, cumulative times start from the end of the pickup bar.
+    Only the notes of the first repetition are stored, the columns of the whole tune are derived from them on access.
+    Arrays are read-only: contours must copy them before modifying them.
+    """
+
+    def __init__(self, tune: "Tune"):
+        """
+        Initialize the class.
+
+        :param tune: the tune to extract the notes from.
+        """
+        # repetitions are identical, extract the notes of the first one
+        note_events = tune.single_repetition().filter(lu.is_note)
+        self._repeats = tune.repeats
+        self._bar_duration = tune.bar_duration
+        self._beat_duration = tune.beat_duration
+
+        # delta time of each note event (note ons and note offs)
+        self._timings = np.array([msg.time for msg in note_events], dtype=float)
+        self._note_on_mask = np.array([lu.is_note_on(msg) for msg in note_events])
+        self._duration = self._timings.sum()
+
+        # cumulative time of each note event
+        summed_timings = np.cumsum(self._timings)
+        summed_timings -= tune.offset
+        self._onsets = summed_timings[self._note_on_mask]
+        self._offsets = summed_timings[~self._note_on_mask]
+
+        # note properties, one per note on
+        self._pitches = np.array(
+            [msg.note for msg in note_events if lu.is_note_on(msg)], dtype=int
+        )
+
+    def _repeat(self, array: np.ndarray) -> np.ndarray:
+        """
+        Derive a column of the whole tune from the one of the first repetition: the i-th row is row i % len(array).
+
+        :param array: the column of the first repetition.
+
+        :return: the read-only column of the whole tune.
+        """
+        if self._repeats > 1:
+            array = array[np.arange(len(array) * self._repeats) % len(array)]
+        array = array.view()
+        array.setflags(write=False)
+        return array
+
+    def _repeat_times(self, array: np.ndarray) -> np.ndarray:
+        """
+        Derive cumulative times of the whole tune from the ones of the first repetition, shifted by the duration of the previous repetitions.
+
+        :param array: the cumulative times of the first repetition.
+
+        :return: the read-only cumulative times of the whole tune.
+        """
+        repeated = self._repeat(array)
+        if self._repeats > 1:
+            shifts = np.repeat(np.arange(self._repeats) * self._duration, len(array))
+            repeated = shifts + repeated
+            repeated.setflags(write=False)
+        return repeated
+
+    @property
+    def timings(self) -> np.ndarray:
+        """
+        :return: the delta time of each note event.
+        """
+        return self._repeat(self._timings)
+
+    @property
+    def note_on_mask(self) -> np.ndarray:
+        """
+        :return: whether or not each note event is a note on.
+        """
+        return self._repeat(self._note_on_mask)
+
+    @property
+    def note_off_mask(self) -> np.ndarray:
+        """
+        :return: whether or not each note event is a note off.
+        """
+        return self._repeat(~self._note_on_mask)
+
+    @property
+    def onsets(self) -> np.ndarray:
+        """
+        :return: the cumulative time of each note on.
+        """
+        return self._repeat_times(self._onsets)
+
+    @property
+    def offsets(self) -> np.ndarray:
+        """
+        :return: the cumulative time of each note off.
+        """
+        return self._repeat_times(self._offsets)
+
+    @property
+    def pitches(self) -> np.ndarray:
+        """
+        :return: the pitch of each note.
+        """
+        return self._repeat(self._pitches)
+
+    @property
+    def pitch_classes(self) -> np.ndarray:
+        """
+        :return: the pitch class of each note.
+        """
+        return self._repeat(self._pitches % 12)
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """
+        :return: the length of each note, i.e. the delta time of its note off minus the one of its note on.
+        """
+        lengths = (
+            self._timings[~self._note_on_mask] - self._timings[self._note_on_mask]
+        )
+        return self._repeat(lengths)
+
+    @property
+    def beat_positions(self) -> np.ndarray:
+        """
+        :return: the position of each note in its bar, in beats.
+        """
+        beat_positions = (self.onsets % self._bar_duration) / self._beat_duration
+        beat_positions.setflags(write=False)
+        return beat_positions
+
+    def __len__(self) -> int:
+        """
+        The number of notes in the table.
+        """
+        return len(self._pitches) * self._repeats
+
 
 class Tune:
     """A wrapper for a midi file."""
 
-    def __init__(self, filename: str, repeats: int):
+    def __init__(
+            self, filename: str, repeats: int, tune_cache: "ch.TuneCache" = None
+    ):
         """
         Initialize the class. A number of properties is computed:
 
@@ -24,42 +172,60 @@ class Tune:
 
         :param filename: the path to the midi file.
         :param repeats: how many times the tune should be repeated.
+        :param tune_cache: the persistent cache of parsed tunes. If None, the file is always parsed.
 
         """
         self._filename = filename
-        if filename.endswith(".mid"):
-            mido_source = mp.read_midi(filename)
-        elif filename.endswith(".abc"):
-            mido_source = mp.read_abc(filename)
+        self._repeats = repeats
+        with open(filename, "rb") as f:
+            self._digest = hashlib.sha1(f.read()).hexdigest()
+
+        cached = None
+        if tune_cache is not None:
+            cache_key = tune_cache.key(self._digest)
+            cached = tune_cache.load(cache_key)
+
+        if cached is None:
+            # a single repetition is stored, the others are derived on the fly
+            self._source_events = self._read_source()
+            self._source_arrays = None
+
+            # some stats about midi
+            self._lowest_pitch = min(
+                [msg.note for msg in self._source if msg.type in ["note_on", "note_off"]]
+            )
+            self._highest_pitch = max(
+                [msg.note for msg in self._source if msg.type in ["note_on", "note_off"]]
+            )
+
+            # time signature
+            self._time_signature = self._get_time_signature()
+
+            # tempo in microseconds per quarter
+            self._tempo = self._get_original_tempo()
+        else:
+            metadata, arrays = cached
+            # the source is only decoded if needed, see `_source`
+            self._source_events = None
+            self._source_arrays = (
+                arrays["source_times"],
+                arrays["source_offsets"],
+                arrays["source_data"],
+            )
+            self._key_signature = KeySignature.from_dict(metadata["key_signature"])
+            self._lowest_pitch = metadata["lowest_pitch"]
+            self._highest_pitch = metadata["highest_pitch"]
+            self._time_signature = m21.meter.TimeSignature()
+            (
+                self._time_signature.numerator,
+                self._time_signature.denominator,
+            ) = metadata["time_signature"]
+            self._tempo = metadata["tempo"]
 
-        # key signature
-        self._key_signature = mido_source.key_signatures[0]
         self._root = self._key_signature.root
         self._fifths = lu.number_of_fifths[
             (self._root + lu.mode_offset[self._key_signature.mode]) % 12
             ]
-        mido_source = mido_source.to_mido(use_note_off_message=True)
-
-        # load midi notes and repeat them
-        self._orig_midi = []
-        for i in range(repeats):
-            # should find another way to handle repetitions
-            self._orig_midi.append(mido.Message("sysex", data=[i]))
-            self._orig_midi.extend(list(mido_source))
-
-        # some stats about midi
-        self._lowest_pitch = min(
-            [msg.note for msg in self._orig_midi if msg.type in ["note_on", "note_off"]]
-        )
-        self._highest_pitch = max(
-            [msg.note for msg in self._orig_midi if msg.type in ["note_on", "note_off"]]
-        )
-
-        # time signature
-        self._time_signature = self._get_time_signature()
-
-        # tempo in microseconds per quarter
-        self._tempo = self._get_original_tempo()
 
         # number of quarter notes per bar
         quarters_per_bar = (
@@ -69,20 +235,148 @@ class Tune:
         self._bar_duration = quarters_per_bar * self._quarter_duration
         self._beat_duration = self._bar_duration / self._time_signature.beatCount
 
-        # pickup bar
-        self._offset = self._get_performance_offset()
+        print("Sync every", quarters_per_bar / self._time_signature.beatCount)
+
+        if cached is None:
+            # pickup bar
+            self._offset = self._get_performance_offset()
+            self._repetition_beats = (
+                sum(m.time for m in self._source) / self._beat_duration
+            )
+        else:
+            self._offset = metadata["offset"]
+            self._repetition_beats = metadata["repetition_beats"]
+
+        # songpos messages follow the beats of the whole performance:
+        # their offsets repeat after the first repetitions lasting a whole number of beats, e.g. 3 repetitions of 98/3 beats
+        self._period = next(
+            (
+                k
+                for k in range(1, repeats)
+                if abs(
+                    k * self._repetition_beats - round(k * self._repetition_beats)
+                )
+                < 1e-6
+            ),
+            repeats,
+        )
+        if cached is not None and metadata["period"] == self._period:
+            # the cached repetitions are the same, reuse their events and songpos positions
+            self._midi = ch.decode_messages(
+                arrays["midi_times"], arrays["midi_offsets"], arrays["midi_data"]
+            )
+            self._period_index_map = dict(
+                enumerate(map(tuple, arrays["songpos_map"].tolist()))
+            )
+            self._repetition_starts = list(
+                map(tuple, arrays["repetition_starts"].tolist())
+            )
+            self._period_notes = self._repetition_starts[-1][2]
+        else:
+            self._midi = self._interleave_songpos(self._period)
+            self._map_songpos()
+            if tune_cache is not None:
+                self._store(tune_cache, cache_key)
 
         # to keep track of the performance
         self._performance_time = -self._offset
 
+        if self.max_songpos > MAX_SONGPOS:
+            raise ValueError(
+                f"Cannot repeat the tune {repeats} times: songpos positions would exceed {MAX_SONGPOS}."
+            )
+
+        # computed on first use
+        self._note_table = None
+        self._single_repetition = None
+
+        print(f"Playing:\t{filename}")
+        print(f"Meter:\t{self._time_signature}")
+        print(f"Key:\t{self._key_signature}")
+
+    def _store(self, tune_cache: "ch.TuneCache", cache_key: str) -> None:
+        """
+        Store the parsed tune in the tune cache, together with the stored repetitions and the properties derived from them.
+
+        :param tune_cache: the persistent cache of parsed tunes.
+        :param cache_key: the cache key of the tune.
+        """
+        if self._source_arrays is None:
+            source = ch.encode_messages(self._source)
+        else:
+            source = dict(zip(["times", "offsets", "data"], self._source_arrays))
+        arrays = {f"source_{name}": array for name, array in source.items()}
+        arrays.update(
+            {
+                f"midi_{name}": array
+                for name, array in ch.encode_messages(self._midi).items()
+            }
+        )
+        arrays["songpos_map"] = np.array(
+            [self._period_index_map[pos] for pos in range(len(self._period_index_map))],
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        arrays["repetition_starts"] = np.array(self._repetition_starts, dtype=np.int64)
+        metadata = {
+            "key_signature": dict(self._key_signature.to_ordered_dict()),
+            "offset": self._offset,
+            "lowest_pitch": self._lowest_pitch,
+            "highest_pitch": self._highest_pitch,
+            "time_signature": [
+                self._time_signature.numerator,
+                self._time_signature.denominator,
+            ],
+            "tempo": self._tempo,
+            "repetition_beats": self._repetition_beats,
+            "period": self._period,
+        }
+        tune_cache.store(cache_key, metadata, arrays)
+
+    @property
+    def _source(self) -> list[mido.Message]:
+        """
+        :return: the midi events of a single repetition of the tune, decoded from the tune cache on first use.
+        """
+        if self._source_events is None:
+            self._source_events = ch.decode_messages(
+                *self._source_arrays, integer_zeros=True
+            )
+        return self._source_events
+
+    def _read_source(self) -> list[mido.Message]:
+        """
+        Parse the tune file and retrieve its key signature.
+
+        :return: the midi events of a single repetition of the tune.
+        """
+        if self._filename.endswith(".mid"):
+            mido_source = mp.read_midi(self._filename)
+        elif self._filename.endswith(".abc"):
+            mido_source = mp.read_abc(self._filename)
+
+        # key signature
+        self._key_signature = mido_source.key_signatures[0]
+        return list(mido_source.to_mido(use_note_off_message=True))
+
+    def _interleave_songpos(self, repeats: int) -> list[mido.Message]:
+        """
+        Intertwine songpos messages every beat with the events of the first repetitions of the tune, each starting with its repetition marker.
+        The beat grid spans all the given repetitions.
+
+        :param repeats: the number of repetitions.
+
+        :return: the events of the repetitions with songpos messages, in time delta representation.
+        """
         # intertwine songpos messages every given interval
         # 16383 is the max value for songpos
         # every_n = max(6, round(len(self._midi) / 16383))
         every_duration = self._beat_duration
-        print("Sync every", quarters_per_bar / self._time_signature.beatCount)
 
         # obtain alla events
-        all_events = [m.copy() for m in self._orig_midi]
+        all_events = []
+        for i in range(repeats):
+            all_events.append(self._marker(i))
+            all_events.extend(m.copy() for m in self._source)
 
         # convert to cumulative time
         cumulative_time = 0
@@ -90,10 +384,9 @@ class Tune:
             cumulative_time += m.time
             all_events[i].time = cumulative_time
 
-        # arange songpos messages independently
-        songpos_timestamps = np.arange(
-            start=0, stop=cumulative_time, step=every_duration
-        )
+        # arange songpos messages independently, a beat ending with the tune does not start a new one
+        beats = int(np.ceil(cumulative_time / every_duration - 1e-6))
+        songpos_timestamps = np.arange(beats) * every_duration
         all_events.extend(
             [
                 mido.Message("songpos", pos=p, time=t)
@@ -112,21 +405,39 @@ class Tune:
         for i in range(len(all_events)):
             all_events[i].time = float(all_timestamps[i])
 
-        self.index_map = {}
+        return all_events
+
+    def _map_songpos(self) -> None:
+        """
+        Map the songpos positions of the stored repetitions to the following event and contour indexes.
+        The events, songpos positions and notes preceding each stored repetition are counted as well, to derive the ones of a last, incomplete period.
+        """
+        self._period_index_map = {}
+        self._repetition_starts = []
         contour_index = 0
-        for i, msg in enumerate(all_events):
+        for i, msg in enumerate(self._midi):
             if msg.type == "songpos":
                 # map songpos to next note and contour index
-                self.index_map[msg.pos] = (i, contour_index)
+                self._period_index_map[msg.pos] = (i, contour_index)
             elif lu.is_note_on(msg):
                 contour_index += 1
+            elif msg.type == "sysex":
+                self._repetition_starts.append(
+                    (i, len(self._period_index_map), contour_index)
+                )
+        self._period_notes = contour_index
+        self._repetition_starts.append(
+            (len(self._midi), len(self._period_index_map), contour_index)
+        )
 
-        self._midi = all_events
-        self._max_songpos = max(self.index_map.keys())
-
-        print(f"Playing:\t{filename}")
-        print(f"Meter:\t{self._time_signature}")
-        print(f"Key:\t{self._key_signature}")
+    def _extent(self) -> tuple[int, int, int]:
+        """
+        :return: the number of events, songpos positions and notes of the whole tune.
+        """
+        periods, rest = divmod(self._repeats, self._period)
+        period_extent = self._repetition_starts[-1]
+        rest_extent = self._repetition_starts[rest]
+        return tuple(periods * p + r for p, r in zip(period_extent, rest_extent))
 
     @property
     def beat_count(self) -> int:
@@ -163,10 +474,83 @@ class Tune:
         """
         return (self._lowest_pitch, self._highest_pitch)
 
+    @property
+    def index_map(self) -> "IndexMap":
+        """
+        :return: the event index and contour index following every songpos position.
+        """
+        return IndexMap(self)
+
+    @property
+    def max_songpos(self) -> int:
+        """
+        :return: the last songpos position of the tune.
+        """
+        return self._extent()[1] - 1
+
     @property
     def name(self) -> str:
         return basename(self._filename)
 
+    @property
+    def note_table(self) -> NoteTable:
+        """
+        :return: the table of the tune's notes, computed on first access.
+        """
+        if self._note_table is None:
+            self._note_table = NoteTable(self)
+        return self._note_table
+
+    @property
+    def period(self) -> int:
+        """
+        :return: the number of repetitions stored in the tune, the following ones are copies of them (see `__getitem__()`).
+        """
+        return self._period
+
+    @property
+    def period_size(self) -> int:
+        """
+        :return: the number of events of the stored repetitions.
+        """
+        return len(self._midi)
+
+    def single_repetition(self) -> "Tune":
+        """
+        Return a shallow copy of the tune holding only its first repetition.
+        The copy is meant for analysis, e.g. computing contours that repeat identically at each repetition.
+
+        :return: the tune restricted to its first repetition.
+        """
+        if self._repeats == 1:
+            return self
+        if self._single_repetition is None:
+            single = copy.copy(self)
+            single._repeats = 1
+            if self._period > 1:
+                # the events up to the marker of the second repetition
+                single._period = 1
+                single._midi = self._midi[: self._repetition_starts[1][0]]
+                single._map_songpos()
+            single._note_table = None
+            single._single_repetition = single
+            self._single_repetition = single
+        return self._single_repetition
+
+    @property
+    def digest(self) -> str:
+        """
+        :return: the SHA-1 digest of the tune's file content.
+        """
+        return self._digest
+
+    @property
+    def repeats(self) -> int:
+        """
+        :return: how many times the tune is repeated.
+        """
+        return self._repeats
+
     @property
     def key_signature(self) -> KeySignature:
         """
@@ -267,7 +651,7 @@ class Tune:
 
         :return: the first tempo change if there is any, else None.
         """
-        msg = self.filter(lambda x: x.type == "set_tempo")
+        msg = [m for m in self._source if m.type == "set_tempo"]
         if len(msg) == 0:
             return None
         return msg[0].tempo
@@ -281,7 +665,7 @@ class Tune:
         """
 
         # msg = [m for m in self._midi if m.type == "time_signature"][0]
-        msg = self.filter(lambda x: x.type == "time_signature")
+        msg = [m for m in self._source if m.type == "time_signature"]
         if len(msg) == 0:
             return None
         time_signature = m21.meter.TimeSignature()
@@ -298,7 +682,7 @@ class Tune:
         """
 
         # msg = [m for m in self._midi if m.type == "key_signature"]
-        msg = self.filter(lambda x: x.type == "key_signature")
+        msg = [m for m in self._source if m.type == "key_signature"]
         if len(msg) == 0:
             return None
         return msg[0].key
@@ -308,13 +692,21 @@ class Tune:
     ) -> list[mido.Message]:
         """
         Retrieve the midi events that fullfill the given filtering function.
-        This function acts on the raw representation of the input tune without any songpos/meta/sysex messages, but with explicit repetitions.
+        This function acts on the raw representation of the input tune without any songpos messages, but with explicit repetitions, each starting with a sysex marker.
+        Events of different repetitions are the same objects and must not be modified.
 
         :param filtering_function: the function filtering the midi events.
 
         :return: a list of midi events fullfilling the filtering function.
         """
-        return [msg for msg in self._orig_midi if filtering_function(msg)]
+        repetition = [msg for msg in self._source if filtering_function(msg)]
+        filtered = []
+        for i in range(self._repeats):
+            marker = self._marker(i)
+            if filtering_function(marker):
+                filtered.append(marker)
+            filtered.extend(repetition)
+        return filtered
 
     def events(self) -> Generator[mido.Message, None, None]:
         """
@@ -323,7 +715,9 @@ class Tune:
         :return: the sequence of midi events one by one
         """
         # for each note
-        for event in self._midi:
+        for i in range(len(self)):
+            event = self[i]
+
             # update the performance time
             self._performance_time += event.time
 
@@ -349,14 +743,74 @@ class Tune:
 
         :return: the number of midi messages in this tune.
         """
-        return len(self._midi)
+        return self._extent()[0]
 
     def __getitem__(self, idx: int) -> mido.Message:
         """
         Return the item in the midi event list corresponding to the given index.
 
+        Events of the first repetitions (see `period`) are stored, the ones of the following repetitions are copies with the repetition's marker and songpos positions.
+
         :param idx: the element index.
 
         :return: the midi message corresponding to that index.
         """
-        return self._midi[idx]
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError(f"Index {idx} out of range for tune of length {len(self)}")
+
+        period, idx = divmod(idx, len(self._midi))
+        msg = self._midi[idx]
+        if period == 0:
+            return msg
+        if msg.type == "sysex":
+            # sysex data bytes are 7 bits
+            return msg.copy(data=[(msg.data[0] + period * self._period) % 128])
+        if msg.type == "songpos":
+            return msg.copy(pos=msg.pos + period * len(self._period_index_map))
+        return msg.copy()
+
+    @staticmethod
+    def _marker(repetition: int) -> mido.Message:
+        """
+        :param repetition: the index of the repetition.
+
+        :return: the sysex message marking the start of the given repetition.
+        """
+        # sysex data bytes are 7 bits
+        return mido.Message("sysex", data=[repetition % 128])
+
+
+class IndexMap(Mapping):
+    """
+    The event index and contour index following every songpos position of a tune.
+    Positions are computed from the ones of the stored repetitions (see `Tune.period`).
+    """
+
+    def __init__(self, tune: Tune):
+        """
+        Initialize the class.
+
+        :param tune: the tune.
+        """
+        self._period_map = tune._period_index_map
+        self._events = len(tune._midi)
+        self._notes = tune._period_notes
+        self._positions = tune.max_songpos + 1
+
+    def __getitem__(self, pos: int) -> tuple[int, int]:
+        period, local_pos = divmod(pos, len(self._period_map))
+        if pos < 0 or pos >= self._positions:
+            raise KeyError(pos)
+        idx, contour_index = self._period_map[local_pos]
+        return (
+            idx + period * self._events,
+            contour_index + period * self._notes,
+        )
+
+    def __len__(self) -> int:
+        return self._positions
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(len(self)))
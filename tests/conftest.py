@@ -0,0 +1,36 @@
+import pytest
+
+# a jig with a pickup and a full last bar, so that a repetition is not a whole number of beats
+JIG = """X:1
+T:Test Jig
+M:6/8
+L:1/8
+Q:3/8=100
+K:G
+|:D|GAB AGE|GED DEG|ABA ABd|edB dBA|
+GAB AGE|GED DEG|ABA AGE|EDE G3:|
+"""
+
+REEL = """X:2
+T:Test Reel
+M:4/4
+L:1/8
+Q:1/4=200
+K:D
+|:FA (3AAA BAFA|dAFA BEE2|FA (3AAA BAFA|dfed BEE2:|
+|:fa (3aaa fagf|eBBA B2 (3efg|fa (3aaa fagf|edef B2 (3efg:|
+"""
+
+
+@pytest.fixture
+def jig(tmp_path) -> str:
+    path = tmp_path / "jig.abc"
+    path.write_text(JIG)
+    return str(path)
+
+
+@pytest.fixture
+def reel(tmp_path) -> str:
+    path = tmp_path / "reel.abc"
+    path.write_text(REEL)
+    return str(path)
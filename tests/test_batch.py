@@ -0,0 +1,17 @@
+import contextlib
+import io
+
+from loeric import batch as bt
+
+
+def test_worker_tunes_are_bounded(jig):
+    bt._get_tune.cache_clear()
+    with contextlib.redirect_stdout(io.StringIO()):
+        tune = bt._get_tune(jig, 1)
+        assert bt._get_tune(jig, 1) is tune
+        for repeats in range(2, bt.TUNE_CACHE_SIZE + 3):
+            bt._get_tune(jig, repeats)
+    info = bt._get_tune.cache_info()
+    assert info.currsize == bt.TUNE_CACHE_SIZE
+    assert info.hits == 1
+    bt._get_tune.cache_clear()
@@ -0,0 +1,56 @@
+import contextlib
+import io
+
+import pytest
+
+from loeric import cache as ch
+from loeric import tune as tu
+
+
+def test_keys_depend_on_formats(jig, tmp_path, monkeypatch):
+    with contextlib.redirect_stdout(io.StringIO()):
+        tune = tu.Tune(jig, 2)
+    contour_cache = ch.ContourCache(str(tmp_path / "contours"))
+    tune_cache = ch.TuneCache(str(tmp_path / "tunes"))
+    contour_key = contour_cache.key(tune, {})
+    tune_key = tune_cache.key(tune.digest)
+
+    monkeypatch.setattr(ch, "CONTOUR_FORMAT", ch.CONTOUR_FORMAT + 1)
+    assert contour_cache.key(tune, {}) != contour_key
+    assert tune_cache.key(tune.digest) == tune_key
+
+    monkeypatch.setattr(ch, "TUNE_FORMAT", ch.TUNE_FORMAT + 1)
+    assert tune_cache.key(tune.digest) != tune_key
+
+
+def state(tune: tu.Tune) -> dict:
+    return {
+        "midi": [(str(m), type(m.time)) for m in tune._midi],
+        "index_map": list(tune.index_map.items()),
+        "source": [str(m) for m in tune.filter(lambda m: True)],
+        "period": tune.period,
+        "length": len(tune),
+        "offset": tune.offset,
+        "pitches": (tune._lowest_pitch, tune._highest_pitch),
+        "time_signature": (
+            tune.time_signature.numerator,
+            tune.time_signature.denominator,
+            tune.time_signature.beatCount,
+        ),
+        "tempo": tune.tempo,
+        "key_signature": tune.key_signature.to_ordered_dict(),
+    }
+
+
+@pytest.mark.parametrize("repeats", [3, 100, 2])
+def test_warm_tunes_match_cold_ones(jig, tmp_path, repeats):
+    tune_cache = ch.TuneCache(str(tmp_path / "tunes"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        cold = tu.Tune(jig, 3, tune_cache=tune_cache)
+        warm = tu.Tune(jig, repeats, tune_cache=tune_cache)
+        expected = tu.Tune(jig, repeats)
+        uncached = tu.Tune(jig, 3)
+    # the stored repetitions are reused when the period is the same, without decoding the source
+    assert (warm._source_events is None) == (repeats != 2)
+    assert state(warm) == state(expected)
+    assert state(cold) == state(uncached)
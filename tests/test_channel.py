@@ -0,0 +1,105 @@
+import json
+import threading
+
+from loeric.server import channel as ch
+
+
+def events(messages: list[str]) -> list[tuple[str, dict]]:
+    parsed = []
+    for message in messages:
+        event, data = message.strip().split("\n")
+        parsed.append((event.removeprefix("event: "), json.loads(data[6:])))
+    return parsed
+
+
+def pending(client) -> list[str]:
+    messages = []
+    while not client.empty():
+        messages.append(client.get_nowait())
+    return messages
+
+
+def test_delta():
+    old = {"state": "playing", "track": {"name": "a", "tempo": 120}, "gone": 1}
+    new = {"state": "playing", "track": {"name": "b", "tempo": 120}, "new": [1]}
+    assert ch.delta(old, new) == {"track": {"name": "b"}, "new": [1], "gone": None}
+    assert ch.delta(new, new) == {}
+    # non-dictionary values are replaced as a whole
+    assert ch.delta({"a": [1, 2]}, {"a": [1, 3]}) == {"a": [1, 3]}
+    assert ch.delta({"a": {"b": 1}}, {"a": 2}) == {"a": 2}
+
+
+class Source:
+    def __init__(self):
+        self.state = {"state": "stopped", "tempo": 120}
+        self.contours = {}
+
+
+def subscribe(channel: ch.StateChannel):
+    """Subscribe a client and return its queue, with the stream left open."""
+    stream = channel.subscribe()
+    first = next(stream)
+    with channel._lock:
+        client = channel._clients[-1]
+    return stream, [first] + pending(client), client
+
+
+def test_clients_get_full_documents_then_changes():
+    source = Source()
+    channel = ch.StateChannel(lambda: source.state, lambda: source.contours)
+    channel.publish()
+    stream, initial, client = subscribe(channel)
+    assert events(initial) == [
+        ("state_full", {"state": "stopped", "tempo": 120}),
+        ("contours_full", {}),
+    ]
+
+    source.state = {"state": "playing", "tempo": 120}
+    channel.publish()
+    # unchanged documents are not sent
+    channel.publish()
+    assert events(pending(client)) == [("state", {"state": "playing"})]
+
+    channel.stop()
+    assert list(stream) == []
+    assert channel._clients == []
+
+
+def test_slow_clients_are_resynchronized():
+    source = Source()
+    channel = ch.StateChannel(lambda: source.state, lambda: source.contours)
+    stream, _, client = subscribe(channel)
+
+    for tempo in range(ch.StateChannel.MAX_QUEUED + 10):
+        source.state = {"state": "playing", "tempo": tempo}
+        channel.publish()
+
+    # the pending changes were replaced by the full documents, then the following changes were queued
+    messages = events(pending(client))
+    assert messages[0][0] == "state_full"
+    assert messages[1][0] == "contours_full"
+    state = messages[0][1]
+    for event, data in messages[2:]:
+        assert event == "state"
+        state.update(data)
+    assert state == source.state
+    stream.close()
+
+
+def test_stop_reaches_full_queues():
+    source = Source()
+    channel = ch.StateChannel(lambda: source.state, lambda: source.contours)
+    stream, _, client = subscribe(channel)
+    for tempo in range(ch.StateChannel.MAX_QUEUED):
+        source.state = {"tempo": tempo}
+        channel.publish()
+
+    done = threading.Event()
+
+    def drain():
+        list(stream)
+        done.set()
+
+    channel.stop()
+    threading.Thread(target=drain, daemon=True).start()
+    assert done.wait(1)
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from loeric import event as ev
+
+
+@pytest.mark.parametrize(
+    "event",
+    [
+        ev.Event("note_on", note=128),
+        ev.Event("note_off", velocity=-1),
+        ev.Event("pitchwheel", pitch=8192),
+        ev.Event("control_change", channel=16),
+    ],
+)
+def test_out_of_range_data_is_rejected(event):
+    with pytest.raises(ValueError):
+        event.bytes()
+    with pytest.raises(ValueError):
+        event.to_message()
+
+
+def test_data_must_be_integers():
+    with pytest.raises(TypeError):
+        ev.Event("note_on", velocity=64.0).bytes()
+    event = ev.Event("note_on", note=np.int64(60))
+    assert event.bytes() == event.to_message().bytes() == [0x90, 60, 64]
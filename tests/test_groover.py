@@ -0,0 +1,119 @@
+import contextlib
+import io
+import os
+
+import pytest
+
+from loeric import event as ev
+from loeric import groover as gr
+from loeric import tune as tu
+
+# new-style ornaments, with slides
+ORNAMENTS = os.path.join(
+    os.path.dirname(gr.__file__),
+    "loeric_config",
+    "performance",
+    "ornament",
+    "full.json",
+)
+
+
+@pytest.fixture
+def groover(jig) -> gr.Groover:
+    with contextlib.redirect_stdout(io.StringIO()):
+        tune = tu.Tune(jig, 1)
+        groover = gr.Groover(tune, seed=1, config_files=[ORNAMENTS])
+    groover.advance_contours()
+    return groover
+
+
+def ornament(groover: gr.Groover, ornament_type: str) -> list[ev.Event]:
+    message = ev.Event("note_on", note=60, velocity=80, time=0.1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return groover.generate_ornament(message, ornament_type)
+
+
+@pytest.mark.parametrize(
+    "duration, adaptive, steps",
+    [(0.001, True, 1), (0.05, True, 10), (1, True, 32), (0.05, False, 32)],
+)
+def test_bend_count_follows_slide_duration(groover, duration, adaptive, steps):
+    groover._config["values"]["bend_adaptive"] = adaptive
+    groover._config["values"]["bend_max_rate"] = 200
+    groover._config["values"]["bend_resolution"] = 32
+
+    bends = groover._slide_bends(0, -4096, duration)
+    assert len(bends) == steps + 1
+    assert all(b.time == pytest.approx(duration / steps) for b in bends)
+    # from the initial bend to no bend
+    assert bends[0].pitch == -4096
+    assert bends[-1].pitch == 0
+    assert all(abs(a.pitch) >= abs(b.pitch) for a, b in zip(bends, bends[1:]))
+
+
+def test_slide_sequence(groover):
+    events = ornament(groover, "slide")
+
+    # a single note, bent from one semitone below
+    assert [e.type for e in events] == ["note_on"] + ["pitchwheel"] * (
+        len(events) - 2
+    ) + ["note_off"]
+    assert events[0].note == events[-1].note == 60
+    assert events[0].time == 0.1
+    assert events[1].pitch == -4096
+    assert events[-2].pitch == 0
+    assert events[-1].time >= 0
+
+
+def test_bent_slides_end_with_a_note_off(groover):
+    # every item of a vibrato bends, the last one included
+    events = ornament(groover, "vibrato")
+
+    assert [e.type for e in events].count("note_on") == 1
+    assert [e.type for e in events].count("note_off") == 1
+    assert events[0].type == "note_on"
+    assert events[-1].type == "note_off"
+    assert events[-1].note == 60
+    assert all(e.time >= 0 for e in events)
+
+
+def emit(groover: gr.Groover, time: float, value: float, key="tempo") -> bool:
+    groover._performance_time = time
+    return groover._should_emit(key, value, threshold=1)
+
+
+def test_controls_are_only_sent_when_they_change(groover):
+    groover._config["control_emission"].update(
+        change_only=True, min_interval=0, max_interval=0
+    )
+    assert emit(groover, 0, 10)
+    assert not emit(groover, 0.1, 10.5)
+    assert emit(groover, 0.2, 11)
+    # changes are measured from the last value sent
+    assert not emit(groover, 0.3, 11.5)
+    assert not emit(groover, 0.4, 10.5)
+    # controllers are independent
+    assert emit(groover, 0.5, 10.5, key=7)
+    assert groover.suppressed_messages == 3
+
+
+def test_control_intervals(groover):
+    groover._config["control_emission"].update(
+        change_only=True, min_interval=0.5, max_interval=2
+    )
+    assert emit(groover, 0, 10)
+    # changed, but too soon
+    assert not emit(groover, 0.2, 20)
+    assert emit(groover, 0.5, 20)
+    # unchanged, but the maximum interval passed
+    assert not emit(groover, 2, 20)
+    assert emit(groover, 2.5, 20)
+    # jumps back in time
+    assert emit(groover, 1, 20)
+    assert groover.suppressed_messages == 2
+
+
+def test_controls_are_always_sent_without_change_only(groover):
+    groover._config["control_emission"].update(change_only=False)
+    assert all(emit(groover, 0, 10) for _ in range(3))
+    assert groover.suppressed_messages == 0
@@ -0,0 +1,115 @@
+import csv
+import json
+import time
+
+import mido
+import pytest
+
+from loeric import event as ev
+from loeric import latency as lt
+from loeric import player as pl
+
+
+class Output:
+    def __init__(self, scheduler):
+        self._scheduler = scheduler
+        self.sent = []
+
+    def send(self, msg):
+        self.sent.append((msg, self._scheduler.now()))
+
+
+def test_ring_buffer_keeps_the_latest_records():
+    recorder = lt.LatencyRecorder(capacity=4)
+    for i in range(6):
+        recorder.record("note_on", i, i + 0.001 * i)
+    assert len(recorder) == 4
+    assert recorder.dropped == 2
+    assert recorder.lateness().tolist() == pytest.approx([0.002, 0.003, 0.004, 0.005])
+    assert recorder.lateness(since=5).tolist() == pytest.approx([0.005])
+
+
+def test_percentiles_by_message_type(tmp_path):
+    recorder = lt.LatencyRecorder()
+    recorder.record("note_on", 0, 0.001)
+    recorder.record("note_on", 1, 1.003)
+    recorder.record("control_change", 2, 2.002)
+    recorder.record("sysex", 3, 3)
+
+    stats = recorder.percentiles()
+    assert set(stats) == {"all", "note_on", "control_change", "other"}
+    assert stats["all"]["count"] == 4
+    assert stats["note_on"]["p100"] == pytest.approx(0.003)
+    assert stats["control_change"]["p50"] == pytest.approx(0.002)
+
+    recorder.dump(str(tmp_path / "latency.json"))
+    dumped = json.loads((tmp_path / "latency.json").read_text())
+    assert [m["type"] for m in dumped["messages"]] == [
+        "note_on",
+        "note_on",
+        "control_change",
+        "other",
+    ]
+    recorder.dump(str(tmp_path / "latency.csv"))
+    with open(tmp_path / "latency.csv") as f:
+        assert len(list(csv.reader(f))) == 5
+
+
+def test_player_records_lateness_in_order():
+    scheduler = pl.DeadlineScheduler(spin=0.001)
+    recorder = lt.LatencyRecorder()
+    port = Output(scheduler)
+    player = pl.Player(
+        tempo=500000,
+        key_signature=None,
+        time_signature=None,
+        save=False,
+        midi_out=port,
+        scheduler=scheduler,
+        latency=recorder,
+    )
+    player.init_playback()
+    player.play(
+        [
+            ev.Event("note_on", note=60, velocity=64, time=0.002),
+            ev.Event("songpos", source=mido.Message("songpos", pos=1), time=0.001),
+            ev.Event("control_change", control=1, value=10, time=0.002),
+            ev.Event("note_off", note=60, time=0.003),
+        ]
+    )
+
+    # songpos messages are neither sent nor recorded
+    assert [m.type for m, _ in port.sent] == ["note_on", "control_change", "note_off"]
+    scheduled = [0.002, 0.005, 0.008]
+    sent = [t for _, t in port.sent]
+    assert sent == sorted(sent)
+    assert all(s >= d for s, d in zip(sent, scheduled))
+
+    kinds, recorded_scheduled, _ = recorder._records()
+    assert [lt.KINDS[k] for k in kinds.tolist()] == [
+        "note_on",
+        "control_change",
+        "note_off",
+    ]
+    assert recorded_scheduled.tolist() == pytest.approx(scheduled)
+    assert (recorder.lateness() >= 0).all()
+
+
+def test_summaries_are_printed_by_another_thread(capsys):
+    recorder = lt.LatencyRecorder(summary_interval=0.02)
+    recorder.record("note_on", 0, 0.001)
+    recorder.record("note_on", 1, 1.001)
+    # recording never prints
+    assert capsys.readouterr().out == ""
+
+    recorder.start()
+    time.sleep(0.1)
+    recorder.record("note_off", 2, 2.002)
+    time.sleep(0.1)
+    recorder.stop()
+
+    # one line for each batch of new records, none while nothing is sent
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 2
+    assert "note_on" in lines[0] and "(2)" in lines[0]
+    assert "note_off" in lines[1] and "note_on" not in lines[1]
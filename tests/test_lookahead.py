@@ -0,0 +1,104 @@
+import contextlib
+import io
+import threading
+import time
+
+import pytest
+
+from loeric import groover as gr
+from loeric import lookahead as lk
+from loeric import tune as tu
+
+SIZE = 8
+CHANGE_AT = 20
+
+# changes are applied by the main thread, and slowed down to leave time to the producer, if not paused, to perform with the old values
+DELAY = 0.05
+_applying = threading.Event()
+
+
+def _delay():
+    if _applying.is_set() and threading.current_thread() is threading.main_thread():
+        time.sleep(DELAY)
+
+
+class SlowLock:
+    def __init__(self, lock):
+        self._lock = lock
+
+    def __enter__(self):
+        _delay()
+        return self._lock.__enter__()
+
+    def __exit__(self, *args):
+        return self._lock.__exit__(*args)
+
+
+class SlowDict(dict):
+    def __setitem__(self, key, value):
+        _delay()
+        super().__setitem__(key, value)
+
+
+def perform(
+    source: str, size: int, change, change_at: int = CHANGE_AT, **options
+) -> list[str]:
+    """
+    Perform the whole tune through a lookahead queue, applying a change after some events.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        tune = tu.Tune(source, 2)
+        options = {"seed": 3, "random_weight": 0.2, "human_impact": 1, **options}
+        groover = gr.Groover(tune, **options)
+        groover._contour_values = SlowDict(groover._contour_values)
+        groover._tempo_lock = SlowLock(groover._tempo_lock)
+        groover._note_index_lock = SlowLock(groover._note_index_lock)
+    lookahead = lk.Lookahead(groover, size)
+    lookahead.start()
+
+    performed = []
+    while (item := lookahead.next()) is not None:
+        message, events = item
+        performed.append(f"{message} -> {events}")
+        if len(performed) == change_at and change is not None:
+            if size > 0:
+                # apply the change while the queue is full
+                deadline = time.monotonic() + 10
+                while len(lookahead._queue) < size and time.monotonic() < deadline:
+                    time.sleep(0.001)
+                assert len(lookahead._queue) == size
+            _applying.set()
+            try:
+                change(groover)
+            finally:
+                _applying.clear()
+    lookahead.stop()
+    return performed
+
+
+CHANGES = {
+    "contour": lambda g: g.set_contour_value("velocity_intensity", 1.0),
+    "tempo": lambda g: g.set_tempo(150),
+    "jump": lambda g: g.jump_to_pos(3),
+}
+
+
+@pytest.mark.parametrize("name", CHANGES)
+def test_change_with_full_queue(reel, name):
+    change = CHANGES[name]
+    expected = perform(reel, 0, change)
+    # the change has an effect on the performance
+    assert expected != perform(reel, 0, None)
+    assert perform(reel, SIZE, change) == expected
+
+
+def test_streaming_rewind_across_repetitions(reel):
+    change = CHANGES["contour"]
+    # the human part does not replace the streaming contours completely
+    options = {"streaming": True, "human_impact": 0.5}
+    performed = perform(reel, 0, None, **options)
+    # rewind from the first notes of the second repetition, whose contour windows are already computed, to the first one
+    second = [i for i, p in enumerate(performed) if p.startswith("sysex")][1]
+    change_at = second + 1
+    expected = perform(reel, 0, change, change_at, **options)
+    assert perform(reel, SIZE, change, change_at, **options) == expected
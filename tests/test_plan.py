@@ -0,0 +1,73 @@
+import contextlib
+import io
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from loeric import groover as gr
+from loeric import plan as pp
+from loeric import tune as tu
+
+REPEATS = 4
+
+# new-style ornaments with cases matching the following notes
+ORNAMENTS = os.path.join(
+    os.path.dirname(gr.__file__),
+    "loeric_config",
+    "performance",
+    "ornament",
+    "full.json",
+)
+
+# durations exact in floating point, so that onsets accumulated over the whole tune fall on the grids
+# the reel ends with a note only matching the cases repeating it at the end of the tune
+TUNES = {
+    "jig": """X:1
+T:Exact Jig
+M:6/8
+L:1/8
+Q:3/8=80
+K:G
+|:D|GAB AGE|GED DEG|ABA ABd|edB dBA|GAB AGE|GED DEG|ABA AGE|EDE G3:|
+""",
+    "reel": """X:2
+T:Exact Reel
+M:4/4
+L:1/8
+Q:1/4=120
+K:D
+|:FAAF BAFA|dAFA BEE2|FAAF BAFA|dfed BEEd:|
+""",
+}
+
+
+@pytest.mark.parametrize("name", TUNES)
+def test_derived_rows_match_the_whole_tune(tmp_path, name):
+    path = tmp_path / f"{name}.abc"
+    path.write_text(TUNES[name])
+    with contextlib.redirect_stdout(io.StringIO()):
+        tune = tu.Tune(str(path), REPEATS)
+        groover = gr.Groover(tune, seed=1, streaming=True, config_files=[ORNAMENTS])
+    plan = groover._plan
+    assert len(plan._table) < len(plan)
+
+    # the same contour values, held for the whole tune
+    contours = {
+        name: SimpleNamespace(
+            _contour=np.tile(groover._contours[name]._contour, REPEATS)
+        )
+        for name in ["message length", "pitch difference", "pitch contour"]
+    }
+    whole = pp.PerformancePlan()
+    whole.compile(tune, contours, groover._config)
+
+    assert len(plan) == len(whole) == len(tune)
+    for i in range(len(tune)):
+        row, expected = plan[i], whole[i]
+        for field in pp.PLAN_DTYPE.names:
+            if field == "onset":
+                assert row[field] == pytest.approx(expected[field], abs=1e-9)
+            else:
+                assert row[field] == expected[field], (i, field)
@@ -0,0 +1,62 @@
+import mido
+
+from loeric import event as ev
+from loeric import player as pl
+
+
+class Output:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, msg):
+        self.sent.append(msg)
+
+
+class BytesOutput(Output):
+    def send_bytes(self, data):
+        self.sent.append(data)
+
+
+def play(port) -> list:
+    player = pl.Player(
+        tempo=500000,
+        key_signature=None,
+        time_signature=None,
+        save=False,
+        midi_out=port,
+    )
+    player.init_playback()
+    player.play([ev.Event("note_on", note=60, velocity=64, time=0)])
+    return port.sent
+
+
+def test_raw_sender_uses_send_bytes():
+    port = BytesOutput()
+    assert pl.raw_sender(port) == port.send_bytes
+    assert play(port) == [[0x90, 60, 64]]
+
+
+def test_raw_sender_falls_back_to_send():
+    port = Output()
+    assert pl.raw_sender(port) is None
+    assert play(port) == [mido.Message("note_on", note=60, velocity=64)]
+
+
+def test_deadline_scheduler_reaches_deadlines():
+    scheduler = pl.DeadlineScheduler(spin=0.001)
+    scheduler.start()
+    for deadline in [0.002, 0.005, 0.01]:
+        scheduler.wait(deadline)
+        assert scheduler.now() >= deadline
+
+    # past deadlines are not waited for
+    before = scheduler.now()
+    scheduler.wait(0)
+    assert scheduler.now() - before < 0.001
+
+
+def test_get_scheduler():
+    scheduler = pl.get_scheduler("deadline", spin=0.003)
+    assert isinstance(scheduler, pl.DeadlineScheduler)
+    assert scheduler._spin == 0.003
+    assert type(pl.get_scheduler("sleep")) is pl.SleepScheduler
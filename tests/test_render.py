@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+import mido
+
+from loeric import event as ev
+from loeric import player as pl
+from loeric import render as rd
+
+TEMPO = 500000
+
+
+class ListGroover:
+    """A groover returning the given events as they are."""
+
+    tempo = TEMPO
+
+    def __init__(self, events: list[ev.Event]):
+        self._events = list(events)
+
+    def next_event(self):
+        if len(self._events) == 0:
+            return None
+        return self._events.pop(0)
+
+    def perform(self, event: ev.Event) -> list[ev.Event]:
+        return [event]
+
+
+def test_adjacent_songpos_match_player(tmp_path):
+    events = [
+        ev.Event("note_on", note=60, velocity=80, time=0),
+        ev.Event("songpos", source=mido.Message("songpos", pos=1), time=0.25),
+        ev.Event("songpos", source=mido.Message("songpos", pos=2), time=0.25),
+        ev.Event("note_off", note=60, time=0.1),
+        ev.Event("note_on", note=62, velocity=80, time=0),
+        ev.Event("note_on", note=64, velocity=80, time=0),
+    ]
+    time_signature = SimpleNamespace(numerator=6, denominator=8)
+
+    renderer = rd.OfflineRenderer(
+        ListGroover(events),
+        SimpleNamespace(key_signature=None, time_signature=time_signature),
+    )
+    renderer.render(end_note=False)
+    renderer.save(tmp_path / "rendered.mid")
+    rendered = (tmp_path / "rendered.mid").read_bytes()
+
+    player = pl.Player(
+        tempo=TEMPO,
+        key_signature=None,
+        time_signature=time_signature,
+        save=True,
+        midi_out=None,
+    )
+    player.init_playback()
+    player.play([e.copy() for e in events])
+    player.save(tmp_path / "player.mid")
+
+    assert rendered == (tmp_path / "player.mid").read_bytes()
+    # both songpos messages keep their status byte
+    assert rendered.count(b"\xf2") == 2
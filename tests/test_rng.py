@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from loeric import rng
+
+
+def draw(stream: rng.BlockRandom) -> list:
+    return [
+        stream.random(),
+        stream.uniform(2, 3),
+        stream.normal(1, 2),
+        stream.normal([0, 1, 2], 1, size=3).tolist(),
+        stream.randint(0, 10),
+        stream.choice("abc", p=[1, 0, 2]),
+        stream.generator.random(),
+    ]
+
+
+def test_seeded_streams_are_reproducible():
+    assert draw(rng.BlockRandom(3)) == draw(rng.BlockRandom(3))
+    assert draw(rng.BlockRandom(3)) != draw(rng.BlockRandom(4))
+
+
+@pytest.mark.parametrize("block_size", [1, 4, 1024])
+def test_state_replays_the_same_values(block_size):
+    stream = rng.BlockRandom(3, block_size=block_size)
+    # stop in the middle of the blocks
+    for _ in range(5):
+        draw(stream)
+    state = stream.get_state()
+    expected = [draw(stream) for _ in range(10)]
+
+    stream.set_state(state)
+    assert [draw(stream) for _ in range(10)] == expected
+
+    # the state can be restored on another stream
+    other = rng.BlockRandom(5, block_size=block_size)
+    other.set_state(state)
+    assert [draw(other) for _ in range(10)] == expected
+
+
+def test_normal_blocks_match_the_generator():
+    stream = rng.BlockRandom(3, block_size=4)
+    values = [stream.normal() for _ in range(10)]
+    generator = np.random.default_rng(3)
+    blocks = [generator.standard_normal(4) for _ in range(3)]
+    assert values == np.concatenate(blocks)[:10].tolist()
+
+
+def test_choice_bounds():
+    stream = rng.BlockRandom(3)
+    assert all(stream.choice("ab", p=[0, 1]) == "b" for _ in range(100))
+    assert all(0 <= stream.randint(2, 4) - 2 <= 2 for _ in range(100))
+    with pytest.raises(ValueError):
+        stream.choice("ab", p=[0, 0])
@@ -0,0 +1,125 @@
+import threading
+import time
+from urllib.request import urlopen
+
+import pytest
+
+pytest.importorskip("pyaudio")
+pytest.importorskip("tinysoundfont")
+
+from loeric.server import server as sv
+
+
+@pytest.fixture
+def probes(monkeypatch, tmp_path) -> dict:
+    """Count the device probes and serve tracks from a temporary directory."""
+    counts = {"audio": 0, "midi": 0}
+
+    def list_audio():
+        counts["audio"] += 1
+        return {"Microphone": 0}
+
+    def get_output_names():
+        counts["midi"] += 1
+        return ["Synth"]
+
+    monkeypatch.setattr(sv, "list_audio", list_audio)
+    monkeypatch.setattr(sv.mido, "get_input_names", lambda: ["Keyboard"])
+    monkeypatch.setattr(sv.mido, "get_output_names", get_output_names)
+    monkeypatch.setattr(sv, "track_dir", str(tmp_path))
+    (tmp_path / "reel.abc").write_text("")
+    return counts
+
+
+def test_inventory_probes_devices_once(probes, tmp_path):
+    inventory = sv.Inventory()
+    options = inventory.options()
+    assert options["audio"] == {"Microphone": 0}
+    assert options["outputs"] == ["Synth"]
+    assert options["trackList"] == ["reel.abc"]
+    assert inventory.options() is options
+    assert probes == {"audio": 1, "midi": 1}
+
+    # uploads only list the tracks again
+    (tmp_path / "jig.mid").write_text("")
+    inventory.refresh(devices=False)
+    assert sorted(inventory.options()["trackList"]) == ["jig.mid", "reel.abc"]
+    assert probes == {"audio": 1, "midi": 1}
+
+    inventory.refresh()
+    assert probes == {"audio": 2, "midi": 2}
+
+
+def test_inventory_refreshes_in_the_background(probes):
+    inventory = sv.Inventory(interval=0.01)
+    inventory.refresh()
+    inventory.start()
+    try:
+        for _ in range(100):
+            if probes["audio"] > 2:
+                break
+            time.sleep(0.01)
+    finally:
+        inventory.stop()
+    assert probes["audio"] > 2
+
+
+def test_threaded_server_serves_requests_concurrently():
+    app = sv.Bottle()
+    release = threading.Event()
+
+    @app.get("/slow")
+    def slow():
+        release.wait(5)
+        return "slow"
+
+    @app.get("/fast")
+    def fast():
+        return "fast"
+
+    assert sv.get_server("threaded") is sv.ThreadingWSGIRefServer
+    assert sv.get_server("waitress") == "waitress"
+    server = sv.ThreadingWSGIRefServer(host="127.0.0.1", port=0)
+    threading.Thread(target=server.run, args=(app,), daemon=True).start()
+    for _ in range(100):
+        if server.port != 0:
+            break
+        time.sleep(0.01)
+    url = f"http://127.0.0.1:{server.port}"
+
+    slow_response = []
+    slow_request = threading.Thread(
+        target=lambda: slow_response.append(urlopen(f"{url}/slow").read())
+    )
+    slow_request.start()
+    try:
+        # answered while the slow request is pending
+        assert urlopen(f"{url}/fast", timeout=2).read() == b"fast"
+        assert slow_response == []
+    finally:
+        release.set()
+    slow_request.join(5)
+    assert slow_response == [b"slow"]
+
+
+def test_tracks_are_parsed_off_the_request_path(probes, monkeypatch):
+    loaded = threading.Event()
+    started = threading.Event()
+
+    class Tune:
+        def __init__(self, *args):
+            started.set()
+            loaded.wait(5)
+            self.name = "reel"
+
+    monkeypatch.setattr(sv, "Tune", Tune)
+    monkeypatch.setattr(sv, "musicians", [])
+    monkeypatch.setattr(sv, "tune", None, raising=False)
+    sv.__dict__["__set_track"]("reel.abc")
+    assert started.wait(5)
+    # the request returned while the track is parsed
+    assert sv.loading_track == "reel.abc"
+    loaded.set()
+    sv.worker.submit(lambda: None).result(5)
+    assert sv.loading_track is None
+    assert sv.tune.name == "reel"
@@ -0,0 +1,77 @@
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+from loeric import loeric_utils as lu
+from loeric import tune as tu
+
+REPEATS = 3
+
+
+def load(source: str, repeats: int) -> tu.Tune:
+    with contextlib.redirect_stdout(io.StringIO()):
+        return tu.Tune(source, repeats)
+
+
+# the jig lasts 98/3 beats, its songpos offsets repeat every 3 repetitions
+@pytest.mark.parametrize(
+    "name, repeats, period",
+    [("jig", REPEATS, 3), ("jig", REPEATS + 1, 3), ("jig", 2, 2), ("reel", REPEATS, 1)],
+)
+def test_songpos_follow_the_beats_of_the_performance(request, name, repeats, period):
+    tune = load(request.getfixturevalue(name), repeats)
+    assert tune.period == period
+
+    time = 0
+    notes = 0
+    beats = []
+    for i in range(len(tune)):
+        msg = tune[i]
+        time += msg.time
+        if msg.type == "songpos":
+            assert msg.pos == len(beats)
+            assert tune.index_map[msg.pos] == (i, notes)
+            beats.append(time / tune.beat_duration)
+        elif lu.is_note_on(msg):
+            notes += 1
+
+    # a single beat grid, with a songpos on each beat starting before the end of the tune
+    np.testing.assert_allclose(beats, np.arange(len(beats)), atol=1e-9)
+    assert len(beats) == int(np.ceil(time / tune.beat_duration - 1e-6))
+    assert tune.max_songpos == len(beats) - 1
+
+
+def test_stored_size_does_not_depend_on_repeats(jig):
+    tune = load(jig, REPEATS)
+    long = load(jig, 100)
+    assert long.period == tune.period
+    assert len(long._midi) == len(tune._midi)
+    assert len(long._period_index_map) == len(tune._period_index_map)
+    assert len(long) == len(tune) * (100 // REPEATS) + len(load(jig, 1))
+    assert long.max_songpos == int(np.ceil(100 * 98 / 3)) - 1
+
+
+def test_single_repetition_starts_the_tune(jig):
+    tune = load(jig, REPEATS)
+    single = tune.single_repetition()
+    assert single.period == 1
+    assert [str(single[i]) for i in range(len(single))] == [
+        str(tune[i]) for i in range(len(single))
+    ]
+    assert tune[len(single)].type == "sysex"
+
+
+def test_note_table_repeats_the_first_repetition(jig):
+    table = load(jig, REPEATS).note_table
+    single = load(jig, 1).note_table
+    assert len(table) == REPEATS * len(single)
+    np.testing.assert_array_equal(table.pitches, np.tile(single.pitches, REPEATS))
+    np.testing.assert_array_equal(table.lengths, np.tile(single.lengths, REPEATS))
+    duration = single.timings.sum()
+    np.testing.assert_allclose(
+        table.onsets,
+        np.concatenate([single.onsets + k * duration for k in range(REPEATS)]),
+    )
+    assert not table.onsets.flags.writeable